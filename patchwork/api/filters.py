@@ -14,6 +14,7 @@ from django_filters import ModelMultipleChoiceFilter
 from django.forms import ModelMultipleChoiceField as BaseMultipleChoiceField
 from django.forms.widgets import MultipleHiddenInput
 from rest_framework import exceptions
+from rest_framework import filters
 
 from patchwork.api import utils
 from patchwork.models import Bundle
@@ -21,10 +22,12 @@ from patchwork.models import Check
 from patchwork.models import Cover
 from patchwork.models import Event
 from patchwork.models import Patch
+from patchwork.models import PatchFile
 from patchwork.models import Person
 from patchwork.models import Project
 from patchwork.models import Series
 from patchwork.models import State
+from patchwork.search import get_search_kwargs
 
 
 # custom backend
@@ -38,6 +41,43 @@ class DjangoFilterBackend(rest_framework.DjangoFilterBackend):
             return queryset.none()
 
 
+class SearchFilter(filters.SearchFilter):
+    """Search filter allowing views to stop using it in newer API versions.
+
+    Views can set ``search_fields_version`` to the API version from which
+    their filter set provides the search parameter instead.
+    """
+
+    def get_search_fields(self, view, request):
+        version = getattr(view, 'search_fields_version', None)
+        if version and utils.has_version(request, version):
+            return None
+
+        return super().get_search_fields(view, request)
+
+
+class OrderingFilter(filters.OrderingFilter):
+    """Ordering filter allowing views to order by other model fields.
+
+    Views can map the names of ``ordering_fields`` to the model fields to
+    order by using ``ordering_field_map``.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        field_map = getattr(view, 'ordering_field_map', {})
+        if not ordering or not field_map:
+            return ordering
+
+        result = []
+        for term in ordering:
+            prefix = '-' if term.startswith('-') else ''
+            field = term.lstrip('-')
+            result.append(prefix + field_map.get(field, field))
+
+        return result
+
+
 # custom fields, filters
 
 
@@ -175,6 +215,14 @@ def msgid_filter(queryset, name, value):
     return queryset.filter(**{name: '<' + value + '>'})
 
 
+def search_filter(queryset, name, value):
+    return queryset.filter(**get_search_kwargs(value))
+
+
+def path_filter(queryset, name, value):
+    return queryset.filter(pk__in=PatchFile.match(value).values('patch_id'))
+
+
 class CoverFilterSet(TimestampMixin, BaseFilterSet):
     project = ProjectFilter(queryset=Project.objects.all(), distinct=False)
     # NOTE(stephenfin): We disable the select-based HTML widgets for these
@@ -205,7 +253,10 @@ class PatchFilterSet(TimestampMixin, BaseFilterSet):
     delegate = UserFilter(queryset=User.objects.all(), distinct=False)
     state = StateFilter(queryset=State.objects.all(), distinct=False)
     hash = CharFilter(lookup_expr='iexact')
+    git_patch_id = CharFilter(lookup_expr='iexact')
     msgid = CharFilter(method=msgid_filter)
+    q = CharFilter(method=search_filter)
+    path = CharFilter(method=path_filter)
 
     class Meta:
         model = Patch
@@ -222,9 +273,13 @@ class PatchFilterSet(TimestampMixin, BaseFilterSet):
             'archived',
             'hash',
             'msgid',
+            'git_patch_id',
+            'q',
+            'path',
         )
         versioned_fields = {
             '1.2': ('hash', 'msgid'),
+            '1.4': ('git_patch_id', 'path', 'q'),
         }
 
 
@@ -0,0 +1,159 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from collections import defaultdict
+
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+from rest_framework.serializers import CharField
+from rest_framework.serializers import ListField
+from rest_framework.serializers import RegexField
+from rest_framework.serializers import Serializer
+from rest_framework.serializers import ValidationError
+
+from patchwork.api.base import BaseHyperlinkedModelSerializer
+from patchwork.api.embedded import MboxMixin
+from patchwork.api.embedded import ProjectSerializer
+from patchwork.api.embedded import WebURLMixin
+from patchwork.api.patch import StateField
+from patchwork.models import Patch
+from patchwork.models import Project
+
+# the maximum number of hashes that can be looked up in a single request
+MAX_HASHES = 1000
+
+
+class HashSerializer(Serializer):
+    hash = RegexField(r'^[0-9a-fA-F]{40}$')
+    commit_ref = CharField(max_length=255, required=False)
+
+
+class HashLookupSerializer(Serializer):
+    hashes = ListField(
+        child=HashSerializer(), min_length=1, max_length=MAX_HASHES
+    )
+    project = CharField(required=False)
+    state = StateField(required=False)
+
+    def validate_project(self, value):
+        projects = Project.objects.all()
+        try:
+            if value.isdigit():
+                return projects.get(id=value)
+            return projects.get(linkname=value)
+        except Project.DoesNotExist:
+            raise ValidationError('Invalid project %s.' % value)
+
+
+class HashPatchSerializer(
+    MboxMixin, WebURLMixin, BaseHyperlinkedModelSerializer
+):
+    project = ProjectSerializer(read_only=True)
+    state = StateField(read_only=True)
+
+    class Meta:
+        model = Patch
+        fields = (
+            'id',
+            'url',
+            'web_url',
+            'project',
+            'msgid',
+            'date',
+            'name',
+            'commit_ref',
+            'state',
+            'mbox',
+        )
+        read_only_fields = fields
+        extra_kwargs = {
+            'url': {'view_name': 'api-patch-detail'},
+        }
+
+
+class HashLookup(GenericAPIView):
+    """
+    post:
+    Look up patches by their hash.
+
+    If a state or commit refs are given, the patches found are also updated.
+    This requires being a maintainer of the projects of all of them.
+    """
+
+    serializer_class = HashLookupSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        hashes = serializer.validated_data['hashes']
+        project = serializer.validated_data.get('project')
+        state = serializer.validated_data.get('state')
+
+        for item in hashes:
+            item['hash'] = item['hash'].lower()
+
+        patches = (
+            Patch.objects.filter(hash__in={item['hash'] for item in hashes})
+            .select_related('project', 'state')
+            .defer('content', 'diff', 'headers')
+            .order_by('id')
+        )
+        if project:
+            patches = patches.filter(project=project)
+        patches = list(patches)
+
+        commit_refs = {
+            item['hash']: item['commit_ref']
+            for item in hashes
+            if 'commit_ref' in item
+        }
+        if state or commit_refs:
+            self.check_maintainer(request, patches)
+            Patch.bulk_set_state(
+                patches,
+                state,
+                {
+                    patch.id: commit_refs[patch.hash]
+                    for patch in patches
+                    if patch.hash in commit_refs
+                },
+                actor=request.user,
+            )
+
+        patches_by_hash = defaultdict(list)
+        for patch in patches:
+            patches_by_hash[patch.hash].append(patch)
+
+        context = self.get_serializer_context()
+        return Response(
+            [
+                {
+                    'hash': item['hash'],
+                    'patches': HashPatchSerializer(
+                        patches_by_hash[item['hash']],
+                        many=True,
+                        context=context,
+                    ).data,
+                }
+                for item in hashes
+            ]
+        )
+
+    def check_maintainer(self, request, patches):
+        if not request.user.is_authenticated:
+            self.permission_denied(request)
+
+        maintained = set(
+            request.user.profile.maintainer_projects.values_list(
+                'id', flat=True
+            )
+        )
+        if any(patch.project_id not in maintained for patch in patches):
+            self.permission_denied(
+                request,
+                'At least one patch is part of a project you are not '
+                'maintaining.',
+            )
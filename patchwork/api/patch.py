@@ -117,9 +117,10 @@ class PatchListSerializer(BaseHyperlinkedModelSerializer):
         )
 
     def get_tags(self, instance):
-        # TODO(stephenfin): Make tags performant, possibly by reworking the
-        # model
-        return {}
+        return {
+            tag.name: instance.get_tag_count(tag)
+            for tag in instance.project.tags
+        }
 
     def validate_delegate(self, value):
         """Check that the delgate is a maintainer of the patch's project."""
@@ -168,6 +169,7 @@ class PatchListSerializer(BaseHyperlinkedModelSerializer):
             'state',
             'archived',
             'hash',
+            'git_patch_id',
             'submitter',
             'delegate',
             'mbox',
@@ -187,6 +189,7 @@ class PatchListSerializer(BaseHyperlinkedModelSerializer):
             'date',
             'name',
             'hash',
+            'git_patch_id',
             'submitter',
             'mbox',
             'series',
@@ -201,6 +204,7 @@ class PatchListSerializer(BaseHyperlinkedModelSerializer):
                 'list_archive_url',
                 'related',
             ),
+            '1.4': ('git_patch_id',),
         }
         extra_kwargs = {
             'url': {'view_name': 'api-patch-detail'},
@@ -228,13 +232,20 @@ class PatchDetailSerializer(PatchListSerializer):
     def get_prefixes(self, instance):
         return clean_subject(instance.name)[1]
 
+    def _save(self, instance, validated_data, *fields):
+        # the tag and check counts are updated in the database as comments
+        # and checks are added, so only the fields changed here are saved
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, *fields])
+
+        return instance
+
     def update(self, instance, validated_data):
         # d-r-f cannot handle writable nested models, so we handle that
         # specifically ourselves and let d-r-f handle the rest
         if 'related' not in validated_data:
-            return super(PatchDetailSerializer, self).update(
-                instance, validated_data
-            )
+            return self._save(instance, validated_data)
 
         related = validated_data.pop('related')
 
@@ -278,9 +289,7 @@ class PatchDetailSerializer(PatchListSerializer):
             if instance.related and instance.related.patches.count() == 2:
                 instance.related.delete()
             instance.related = None
-            return super(PatchDetailSerializer, self).update(
-                instance, validated_data
-            )
+            return self._save(instance, validated_data, 'related')
 
         # break before make
         relations = {patch.related for patch in patches if patch.related}
@@ -300,13 +309,10 @@ class PatchDetailSerializer(PatchListSerializer):
             relation.save()
         for patch in patches:
             patch.related = relation
-            patch.save()
+            patch.save(update_fields=['related'])
         instance.related = relation
-        instance.save()
 
-        return super(PatchDetailSerializer, self).update(
-            instance, validated_data
-        )
+        return self._save(instance, validated_data, 'related')
 
     @staticmethod
     def check_user_maintains_all(user, patches):
@@ -344,6 +350,9 @@ class PatchList(ListAPIView):
     serializer_class = PatchListSerializer
     filter_class = filterset_class = PatchFilterSet
     search_fields = ('name',)
+    # from v1.4, patches are searched using the full-text search of
+    # PatchFilterSet instead
+    search_fields_version = '1.4'
     ordering_fields = (
         'id',
         'name',
@@ -354,6 +363,7 @@ class PatchList(ListAPIView):
         'submitter',
         'check',
     )
+    ordering_field_map = {'check': 'check_state'}
     ordering = 'id'
 
     def get_queryset(self):
@@ -362,7 +372,6 @@ class PatchList(ListAPIView):
         return (
             Patch.objects.all()
             .prefetch_related(
-                'check_set',
                 'delegate',
                 'project',
                 'series__project',
@@ -391,7 +400,7 @@ class PatchDetail(RetrieveUpdateAPIView):
     def get_queryset(self):
         return (
             Patch.objects.all()
-            .prefetch_related('check_set', 'related__patches__project')
+            .prefetch_related('related__patches__project')
             .select_related(
                 'project', 'state', 'submitter', 'delegate', 'series'
             )
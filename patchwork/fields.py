@@ -4,10 +4,113 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import base64
+import binascii
 import hashlib
+import zlib
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import models
 
+try:
+    from compression import zstd
+except ImportError:
+    # zstd support was only added to the standard library in Python 3.14
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+# compressed values start with one of these, followed by the compressed value
+# encoded using base64. Values stored uncompressed are unlikely to start with
+# an escape character, and any that do are always stored compressed.
+COMPRESSION_PREFIX = '\x1b'
+COMPRESSION_PREFIXES = {
+    'zlib': COMPRESSION_PREFIX + 'z:',
+    'zstd': COMPRESSION_PREFIX + 's:',
+}
+
+# values shorter than this are never compressed
+COMPRESSION_MIN_LENGTH = 256
+
+
+def _compress(data, method):
+    if method == 'zstd':
+        if zstd is None:
+            raise ImproperlyConfigured(
+                'zstd compression requires Python 3.14 or the zstandard '
+                'package'
+            )
+        return zstd.compress(data)
+
+    return zlib.compress(data)
+
+
+def compress_text(value, method):
+    """Compress a text value for storage.
+
+    Args:
+        value (str): The value to compress, or None
+        method (str): The compression to use, either 'zlib' or 'zstd', or
+            None to not compress the value
+
+    Returns:
+        The value to store. This is the value itself if it was not worth
+        compressing.
+    """
+    if value is None:
+        return None
+
+    # values starting with the prefix must be stored compressed to be read
+    # back correctly
+    escape = value.startswith(COMPRESSION_PREFIX)
+    if escape:
+        method = method or 'zlib'
+    elif not method or len(value) < COMPRESSION_MIN_LENGTH:
+        return value
+
+    if method not in COMPRESSION_PREFIXES:
+        raise ImproperlyConfigured('Invalid compression method: %s' % method)
+
+    compressed = COMPRESSION_PREFIXES[method] + base64.b64encode(
+        _compress(value.encode('utf-8'), method)
+    ).decode('ascii')
+
+    if len(compressed) >= len(value) and not escape:
+        return value
+
+    return compressed
+
+
+def decompress_text(value):
+    """Decompress a stored text value, if it is compressed."""
+    if not value or not value.startswith(COMPRESSION_PREFIX):
+        return value
+
+    for method, prefix in COMPRESSION_PREFIXES.items():
+        if value.startswith(prefix):
+            break
+    else:
+        return value
+
+    if method == 'zstd' and zstd is None:
+        raise ImproperlyConfigured(
+            'Reading zstd-compressed values requires Python 3.14 or the '
+            'zstandard package'
+        )
+
+    try:
+        data = base64.b64decode(value[len(prefix) :], validate=True)
+        if method == 'zstd':
+            data = zstd.decompress(data)
+        else:
+            data = zlib.decompress(data)
+        return data.decode('utf-8')
+    except (binascii.Error, zlib.error, UnicodeDecodeError):
+        # a value stored uncompressed before compression was supported
+        return value
+
 
 class HashField(models.CharField):
     def __init__(self, *args, **kwargs):
@@ -27,3 +130,27 @@ class HashField(models.CharField):
 
     def db_type(self, connection=None):
         return 'char(%d)' % self.n_bytes
+
+
+class CompressedTextField(models.TextField):
+    """A text field whose values can be stored compressed.
+
+    Values are compressed when saved if the ``TEXT_FIELD_COMPRESSION`` setting
+    is set, and decompressed when loaded. Compressed values are stored as
+    text, using a prefix identifying the compression used, so values stored
+    uncompressed can still be read and compression can be enabled or disabled
+    at any time.
+
+    As the database only sees compressed values, these can't be searched
+    using lookups like ``contains``.
+    """
+
+    def from_db_value(self, value, *args, **kwargs):
+        return decompress_text(value)
+
+    def to_python(self, value):
+        return decompress_text(super().to_python(value))
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return compress_text(value, settings.TEXT_FIELD_COMPRESSION)
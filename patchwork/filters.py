@@ -10,9 +10,11 @@ from django.contrib.auth.models import User
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
+from patchwork.models import PatchFile
 from patchwork.models import Person
 from patchwork.models import Series
 from patchwork.models import State
+from patchwork.search import get_search_kwargs
 
 
 class Filter(object):
@@ -308,7 +310,7 @@ class SearchFilter(Filter):
 
     @property
     def kwargs(self):
-        return {'name__icontains': self.search}
+        return get_search_kwargs(self.search)
 
     @property
     def form(self):
@@ -321,6 +323,47 @@ class SearchFilter(Filter):
         )
 
 
+class PathFilter(Filter):
+    name = 'Path'
+    param = 'path'
+
+    def __init__(self, filters):
+        super(PathFilter, self).__init__(filters)
+        self.path = None
+
+    @property
+    def condition(self):
+        return self.path
+
+    @property
+    def key(self):
+        return self.path
+
+    @key.setter
+    def key(self, key):
+        key = key.strip()
+        if not key:
+            return
+
+        self.path = key
+        self.applied = True
+
+    @property
+    def kwargs(self):
+        # filter on 'pk' rather than 'id', which the search filter uses
+        return {'pk__in': PatchFile.match(self.path).values('patch_id')}
+
+    @property
+    def form(self):
+        value = ''
+        if self.path:
+            value = escape(self.path)
+        return mark_safe(
+            '<input name="%s" class="form-control" value="%s">'
+            % (self.param, value)
+        )
+
+
 class ArchiveFilter(Filter):
     name = 'Archived'
     param = 'archive'
@@ -516,6 +559,7 @@ FILTERS = [
     SubmitterFilter,
     StateFilter,
     SearchFilter,
+    PathFilter,
     ArchiveFilter,
     DelegateFilter,
 ]
@@ -545,12 +589,17 @@ class Filters:
     def available_filters(self):
         return self._filters
 
-    def apply(self, queryset):
+    @property
+    def kwargs(self):
         kwargs = collections.OrderedDict()
         for f in self._filters:
             if f.applied:
                 kwargs.update(f.kwargs)
 
+        return kwargs
+
+    def apply(self, queryset):
+        kwargs = self.kwargs
         if not kwargs:
             return queryset
 
@@ -153,6 +153,14 @@ class PatchForm(forms.ModelForm):
             ),
         }
 
+    def save(self, commit=True):
+        patch = super(PatchForm, self).save(commit=False)
+        if commit:
+            # the tag and check counts are updated in the database as
+            # comments and checks are added, so only these fields are saved
+            patch.save(update_fields=self._meta.fields)
+        return patch
+
 
 class OptionalModelChoiceField(forms.ModelChoiceField):
     no_change_choice = ('*', 'No change')
@@ -236,6 +244,7 @@ class MultiplePatchForm(forms.Form):
                 "didn't validate." % opts.object_name
             )
         data = self.cleaned_data
+        fields = []
         # Update the instance
         for f in opts.fields:
             if f.name not in data:
@@ -249,7 +258,8 @@ class MultiplePatchForm(forms.Form):
                 continue
 
             setattr(instance, f.name, data[f.name])
+            fields.append(f.name)
 
         if commit:
-            instance.save()
+            instance.save(update_fields=fields)
         return instance
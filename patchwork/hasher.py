@@ -8,66 +8,317 @@
 """Hash generation for diffs."""
 
 import hashlib
+import io
 import re
 import sys
 
 HUNK_RE = re.compile(r'^\@\@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? \@\@')
 FILENAME_RE = re.compile(r'^(---|\+\+\+) (\S+)')
 
+# the number of lines hashed at once
+BLOCK_SIZE = 512
 
-def hash_diff(diff):
-    """Generate a hash from a diff."""
+# whitespace as understood by git, which is ignored by 'git patch-id'
+GIT_WHITESPACE = b' \t\n\r'
+DIGITS_RE = re.compile(r'[0-9]*')
+OID_RE = re.compile(r'(?:diff-tree |commit |From )?[0-9a-fA-F]{40}')
 
-    # normalise spaces
-    diff = diff.replace('\r', '')
-    diff = diff.strip() + '\n'
 
-    prefixes = ['-', '+', ' ']
-    hashed = hashlib.sha1()
+def _iter_lines(diff):
+    """Iterate over the lines of a diff.
 
-    for line in diff.split('\n'):
-        if len(line) <= 0:
-            continue
+    Only '\n' ends a line: unlike str.splitlines, characters such as '\x1c'
+    or '\u2028' aren't treated as line boundaries. Lines may or may not end
+    with '\n'.
+
+    Args:
+        diff: The diff, either as a string or as an iterable of lines
+    """
+    if isinstance(diff, str):
+        return io.StringIO(diff)
+
+    return iter(diff)
 
-        hunk_match = HUNK_RE.match(line)
-        filename_match = FILENAME_RE.match(line)
 
-        if filename_match:
+def _normalise_line(line):
+    """Normalise a line of a diff, returning None if it should be ignored.
+
+    The line is returned with a trailing newline.
+    """
+    first = line[0]
+    if first == '-' or first == '+':
+        match = FILENAME_RE.match(line)
+        if match:
             # normalise -p1 top-directories
-            if filename_match.group(1) == '---':
+            if match.group(1) == '---':
                 filename = 'a/'
             else:
                 filename = 'b/'
-            filename += '/'.join(filename_match.group(2).split('/')[1:])
-
-            line = filename_match.group(1) + ' ' + filename
-        elif hunk_match:
-            # remove line numbers, but leave line counts
-            def fn(x):
-                if not x:
-                    return 1
-                return int(x)
-
-            line_nos = list(map(fn, hunk_match.groups()))
-            line = '@@ -%d +%d @@' % tuple(line_nos)
-        elif line[0] in prefixes:
-            # if we have a +, - or context line, leave as-is
-            pass
+            filename += '/'.join(match.group(2).split('/')[1:])
+
+            line = match.group(1) + ' ' + filename
+    elif first == '@':
+        match = HUNK_RE.match(line)
+        if not match:
+            return None
+
+        # remove line numbers, but leave line counts
+        before, after = match.groups()
+        line = '@@ -%d +%d @@' % (int(before or 1), int(after or 1))
+    elif first != ' ':
+        # other lines are ignored
+        return None
+
+    if not line.endswith('\n'):
+        line += '\n'
+
+    return line
+
+
+def hash_diff(diff):
+    """Generate a hash from a diff.
+
+    Only the lines added, removed or kept by the diff, the names of the files
+    changed and the line counts of the hunks are hashed, so that the hash
+    doesn't depend on the way a diff was generated. Whitespace at the start
+    and end of the diff and carriage returns are ignored.
+
+    The diff is processed a line at a time and hashed in blocks of lines, so
+    large diffs can be hashed without first being read into memory.
+
+    Args:
+        diff: The diff, either as a string or as an iterable of lines, such as
+            a file
+
+    Returns:
+        The SHA-1 hash of the diff, as a hex string.
+    """
+    hashed = hashlib.sha1()
+    block = []
+    append = block.append
+    started = False
+
+    # whitespace at the end of the diff is ignored, so the last line that
+    # isn't blank is only normalised at the end. 'last' is the position of
+    # its output in the block: it, and the blank lines following it, are
+    # kept in the block until then.
+    last = 0
+    last_line = None
+
+    # lines are kept with their newline, if any, as this is what is hashed
+    for line in _iter_lines(diff):
+        if '\r' in line:
+            line = line.replace('\r', '')
+
+        if not started:
+            # ignore whitespace at the start of the diff
+            if not line or line.isspace():
+                continue
+            line = line.lstrip()
+            started = True
+        elif not line:
+            continue
+
+        first = line[0]
+        if first == '+' or first == '-':
+            last = len(block)
+            last_line = line
+            if line.startswith(('--- ', '+++ ')):
+                line = _normalise_line(line)
+        elif first == ' ':
+            if not line.isspace():
+                last = len(block)
+                last_line = line
+        elif first == '@':
+            last = len(block)
+            last_line = line
+            line = _normalise_line(line)
+            if line is None:
+                continue
         else:
-            # other lines are ignored
+            if not line.isspace():
+                last = len(block)
+                last_line = line
             continue
 
-        hashed.update((line + '\n').encode('utf-8'))
+        if line[-1] != '\n':
+            line += '\n'
+        append(line)
+
+        if last >= BLOCK_SIZE:
+            hashed.update(
+                ''.join(block[:last]).encode('utf-8', 'surrogateescape')
+            )
+            del block[:last]
+            last = 0
+
+    del block[last:]
+    if last_line is not None:
+        line = _normalise_line(last_line.rstrip())
+        if line is not None:
+            append(line)
+
+    hashed.update(''.join(block).encode('utf-8', 'surrogateescape'))
 
     return hashed.hexdigest()
 
 
+def _add_digest(result, lines):
+    # 'git patch-id --stable' hashes each file separately, ignoring any
+    # whitespace, and adds up the hashes as little-endian integers so that the
+    # order of the files doesn't matter. The bytes of the diff are hashed,
+    # so bytes that aren't valid UTF-8, escaped using 'surrogateescape', are
+    # hashed as they were
+    data = ''.join(lines).encode('utf-8', 'surrogateescape')
+    data = data.translate(None, GIT_WHITESPACE)
+    digest = int.from_bytes(hashlib.sha1(data).digest(), 'little')
+
+    return (result + digest) % (1 << 160)
+
+
+def _scan_count(text):
+    # parse an optional line count following a line number, returning the
+    # count and the rest of the text
+    number = DIGITS_RE.match(text).group()
+    text = text[len(number) :]
+    if not text.startswith(','):
+        return 1, bool(number), text
+
+    count = DIGITS_RE.match(text, 1).group()
+    return int(count or 0), bool(count), text[len(count) + 1 :]
+
+
+def _scan_hunk_header(line):
+    """Get the line counts of a hunk header, as git does."""
+    before, valid, rest = _scan_count(line[4:])
+    if not valid or not rest.startswith(' +'):
+        return before, 0
+
+    after, _, _ = _scan_count(rest[2:])
+    return before, after
+
+
+def git_patch_id(diff):
+    """Generate a hash from a diff, as 'git patch-id --stable' does.
+
+    This allows looking up patches using the patch ID of a commit, as
+    generated by git itself. Unlike the hashes generated by
+    :func:`hash_diff`, these depend on the headers of a git diff, such as
+    changes of file modes, but not on whitespace within lines. Diffs that are
+    not in the git format, such as those generated by ``diff -u``, have no
+    patch ID.
+
+    Args:
+        diff: The diff, either as a string or as an iterable of lines, such as
+            a file
+
+    Returns:
+        The patch ID of the diff, as a hex string, or None if it has none.
+    """
+    started = False
+    result = 0
+    lines = []
+    append = lines.append
+    before = after = -1
+    is_binary = False
+    pre_oid = post_oid = ''
+
+    for line in _iter_lines(diff):
+        # git stops reading a line at the first NUL character
+        if '\0' in line:
+            line = line[: line.index('\0')]
+
+        first = line[:1]
+
+        # the common case of a line within a hunk
+        if (
+            (first == '+' or first == '-' or first == ' ')
+            and before != -1
+            and (before or after)
+            and not is_binary
+        ):
+            if first != '+':
+                before -= 1
+            if first != '-':
+                after -= 1
+            append(line)
+            continue
+
+        if line.startswith('\\ ') and len(line) > 12:
+            continue
+
+        # the start of the next commit, if any, when given 'git log' output
+        if OID_RE.match(line):
+            if started:
+                break
+            continue
+
+        # ignore the commit message
+        if not started:
+            if not line.startswith('diff '):
+                continue
+            started = True
+
+        # parsing the header of a file
+        if before == -1:
+            if line.startswith(('GIT binary patch', 'Binary files')):
+                is_binary = True
+                before = 0
+                append(pre_oid + post_oid)
+                result = _add_digest(result, lines)
+                lines.clear()
+                continue
+            elif line.startswith('index '):
+                oids, _, _ = line[6:].rstrip('\n').partition(' ')
+                if '..' in oids:
+                    pre_oid, _, post_oid = oids.partition('..')
+                    pre_oid, post_oid = pre_oid[:40], post_oid[:40]
+                continue
+            elif line.startswith('--- '):
+                before = after = 1
+            elif not (first.isascii() and first.isalpha()):
+                break
+
+        if is_binary:
+            if line.startswith('diff '):
+                is_binary = False
+                before = -1
+            continue
+
+        # looking for the header of a hunk
+        if before == 0 and after == 0:
+            if line.startswith('@@ -'):
+                # the line numbers are ignored
+                before, after = _scan_hunk_header(line)
+                continue
+
+            # the end of the patch
+            if not line.startswith('diff '):
+                break
+
+            # the header of the next file
+            result = _add_digest(result, lines)
+            lines.clear()
+            before = after = -1
+
+        if first == '-' or first == ' ':
+            before -= 1
+        if first == '+' or first == ' ':
+            after -= 1
+        append(line)
+
+    if not started:
+        return None
+
+    return _add_digest(result, lines).to_bytes(20, 'little').hex()
+
+
 def main(args):
     """Hash a diff provided by stdin.
 
     This is required by scripts found in /tools
     """
-    print(hash_diff('\n'.join(sys.stdin.readlines())))
+    print(hash_diff(sys.stdin))
 
 
 if __name__ == '__main__':
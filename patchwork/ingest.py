@@ -0,0 +1,894 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Bulk ingestion of mails.
+
+:func:`patchwork.parser.parse_mail` adds a single mail to the database at a
+cost of a few dozen queries and several transactions. This dominates the
+time taken to import large archives. :func:`parse_mails` adds many mails at
+once, with the same result as calling ``parse_mail`` for each of them in
+turn. Each batch of mails is parsed in memory and resolved against a fixed
+number of queries. The resulting patches, cover letters, comments, series,
+references, tags and events are then written using ``bulk_create`` in a
+single transaction.
+"""
+
+from collections import Counter
+from collections import defaultdict
+import datetime
+import itertools
+import logging
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db import IntegrityError
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from patchwork.hasher import git_patch_id
+from patchwork.hasher import hash_diff
+from patchwork.mbox import invalidate_mbox
+from patchwork.models import Cover
+from patchwork.models import CoverComment
+from patchwork.models import Event
+from patchwork.models import MessageID
+from patchwork.models import Patch
+from patchwork.models import PatchComment
+from patchwork.models import PatchCount
+from patchwork.models import PatchFile
+from patchwork.models import PatchSearch
+from patchwork.models import PatchTag
+from patchwork.models import Person
+from patchwork.models import Series
+from patchwork.models import SeriesReference
+from patchwork.models import Tag
+from patchwork import parser
+
+logger = logging.getLogger(__name__)
+
+# the default number of mails to add to the database at once
+BATCH_SIZE = 500
+
+_depends_on_re = re.compile(rb'^Depends-on: ', re.MULTILINE | re.IGNORECASE)
+
+
+class _Mail(object):
+    """The metadata and content of a mail, as extracted by ``parse_mail``."""
+
+    def __init__(self, mail, project):
+        self.mail = mail
+        self.project = project
+
+        self.msgid = parser.find_message_id(mail)
+        subject = mail.get('Subject')
+        self.name, prefixes = parser.clean_subject(subject, [project.linkname])
+        self.is_comment = parser.subject_check(subject)
+        self.x, self.n = parser.parse_series_marker(prefixes)
+        self.version = parser.parse_version(self.name, prefixes)
+        self.refs = parser.find_references(mail)
+        self.date = parser.find_date(mail)
+        self.headers = parser.find_headers(mail)
+
+        if not self.is_comment:
+            self.diff, self.message = parser.find_patch_content(mail)
+        else:
+            self.diff, self.message = parser.find_comment_content(mail)
+
+        if not (self.diff or self.message):
+            return
+
+        self.pull_url = parser.parse_pull_request(self.message)
+
+        # an invalid 'From' header is only an error for mails that are
+        # saved, so defer raising it until then
+        try:
+            self.author = parser.find_author(mail, project)
+        except ValueError as exc:
+            self.author = exc
+
+        self.delegate_email = parser.clean_header(
+            mail.get('X-Patchwork-Delegate', '')
+        )
+        self.state_name = parser.clean_header(
+            mail.get('X-Patchwork-State', '')
+        )
+
+    @property
+    def has_content(self):
+        return bool(self.diff or self.message)
+
+    @property
+    def is_patch(self):
+        return not self.is_comment and bool(self.diff or self.pull_url)
+
+    def get_author(self):
+        if isinstance(self.author, Exception):
+            raise self.author
+        return self.author
+
+
+class _Batch(object):
+    """A batch of mails to add to the database at once.
+
+    Lookups are resolved against in-memory maps that are populated by a
+    fixed number of queries when the batch is created. These maps are then
+    updated with each object that would be created so that each mail sees
+    the effects of the mails before it, as it would if the mails were parsed
+    one at a time. Exactly one instance is kept for each patch, cover letter,
+    series and person, saved or not, so that instances can be compared and
+    modified in place.
+    """
+
+    def __init__(self, mails):
+        self.new_persons = []
+        self.updated_persons = {}
+        self.new_series = []
+        self.updated_series = {}
+        self.new_references = []
+        self.new_covers = []
+        self.new_patches = []
+        self.new_patch_files = []
+        self.new_patch_comments = []
+        self.new_cover_comments = []
+        self.events = []
+        self.tag_counts = {}
+
+        self._prefetch(mails)
+
+    def _prefetch(self, mails):
+        self.projects = {mail.project.id: mail.project for mail in mails}
+
+        ids = set()
+        emails = set()
+        delegate_emails = set()
+        for mail in mails:
+            ids.add(mail.msgid)
+            ids.update(ref[:255] for ref in mail.refs)
+            if not isinstance(mail.author, Exception):
+                emails.add(mail.author[1].lower())
+            if mail.delegate_email:
+                delegate_emails.add(mail.delegate_email.lower())
+
+        # people
+
+        self.persons = {}
+        for person in (
+            Person.objects.annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=emails)
+            .order_by('id')
+        ):
+            self.persons.setdefault(person.email_lower, person)
+
+        self.delegates = {}
+        for user in (
+            User.objects.annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=delegate_emails)
+            .order_by('id')
+        ):
+            self.delegates.setdefault(user.email_lower, user)
+
+        self.tags = list(Tag.objects.all())
+
+        # patches, cover letters and comments that mails could duplicate or
+        # reply to
+
+        self.patches = {}
+        for patch in Patch.objects.filter(
+            project__in=self.projects, msgid__in=ids
+        ).only('id', 'project', 'msgid'):
+            self.patches[(patch.project_id, patch.msgid)] = patch
+
+        self.covers = {}
+        for cover in Cover.objects.filter(
+            project__in=self.projects, msgid__in=ids
+        ).only('id', 'project', 'msgid'):
+            self.covers[(cover.project_id, cover.msgid)] = cover
+
+        self.patch_comments = defaultdict(list)
+        self.cover_comments = defaultdict(list)
+        self.comment_keys = set()
+
+        for comment in (
+            PatchComment.objects.filter(
+                patch__project__in=self.projects, msgid__in=ids
+            )
+            .select_related('patch')
+            .only(
+                'id',
+                'date',
+                'msgid',
+                'patch',
+                'patch__project',
+                'patch__msgid',
+            )
+            .order_by('id')
+        ):
+            patch = self._get_patch(comment.patch)
+            comment.patch = patch
+            self.patch_comments[(patch.project_id, comment.msgid)].append(
+                comment
+            )
+            self.comment_keys.add((id(patch), comment.msgid))
+
+        for comment in (
+            CoverComment.objects.filter(
+                cover__project__in=self.projects, msgid__in=ids
+            )
+            .select_related('cover')
+            .only(
+                'id',
+                'date',
+                'msgid',
+                'cover',
+                'cover__project',
+                'cover__msgid',
+            )
+            .order_by('id')
+        ):
+            cover = self._get_cover(comment.cover)
+            comment.cover = cover
+            self.cover_comments[(cover.project_id, comment.msgid)].append(
+                comment
+            )
+            self.comment_keys.add((id(cover), comment.msgid))
+
+        self.cover_names = Counter(
+            Cover.objects.filter(
+                name__in={mail.name for mail in mails}
+            ).values_list('name', flat=True)
+        )
+
+        # series that patches could belong to, either by reference or by
+        # series markers, and the patches they already contain
+
+        self.series = {}
+
+        submitters = [
+            self.persons[email] for email in emails if email in self.persons
+        ]
+        if submitters:
+            delta = datetime.timedelta(minutes=parser.SERIES_DELAY_INTERVAL)
+            dates = [mail.date for mail in mails]
+            for series in Series.objects.filter(
+                project__in=self.projects,
+                submitter__in=submitters,
+                date__range=[min(dates) - delta, max(dates) + delta],
+            ):
+                self.series[series.id] = series
+
+        references = list(
+            SeriesReference.objects.filter(
+                project__in=self.projects, msgid__in=ids
+            ).values_list('project_id', 'msgid', 'series_id')
+        )
+        missing = {ref[2] for ref in references} - set(self.series)
+        for series in Series.objects.filter(id__in=missing):
+            self.series[series.id] = series
+
+        self.references = {
+            (project_id, msgid): self.series[series_id]
+            for project_id, msgid, series_id in references
+        }
+
+        self.series_patches = defaultdict(list)
+        for patch in Patch.objects.filter(series__in=self.series).only(
+            'id', 'project', 'msgid', 'series', 'number', 'name'
+        ):
+            series = self.series[patch.series_id]
+            self.series_patches[id(series)].append(self._get_patch(patch))
+
+        self.all_series = list(self.series.values())
+
+    def _get_patch(self, patch):
+        key = (patch.project_id, patch.msgid)
+        return self.patches.setdefault(key, patch)
+
+    def _get_cover(self, cover):
+        key = (cover.project_id, cover.msgid)
+        return self.covers.setdefault(key, cover)
+
+    # lookups, see the functions of the same name in 'patchwork.parser'
+
+    def get_or_create_author(self, mail):
+        name, email = mail.get_author()
+
+        person = self.persons.get(email.lower())
+        if person is None:
+            person = Person(name=name, email=email)
+            self.persons[email.lower()] = person
+            self.new_persons.append(person)
+        elif name and name != person.name:  # use the latest provided name
+            person.name = name
+            if person.pk is not None:
+                self.updated_persons[person.pk] = person
+
+        return person
+
+    def find_state(self, mail):
+        if mail.state_name:
+            state = parser.cache.get_state(mail.state_name)
+            if state:
+                return state
+
+        return parser.cache.get_default_state()
+
+    def find_delegate(self, mail, filenames):
+        if mail.delegate_email:
+            delegate = self.delegates.get(mail.delegate_email.lower())
+            if delegate:
+                return delegate
+
+        return parser.find_delegate_by_filename(mail.project, filenames)
+
+    def find_series(self, mail, author):
+        for ref in [mail.msgid] + mail.refs:
+            series = self.references.get((mail.project.id, ref[:255]))
+            if series:
+                return [series]
+
+        delta = datetime.timedelta(minutes=parser.SERIES_DELAY_INTERVAL)
+        start_date = mail.date - delta
+        end_date = mail.date + delta
+
+        return [
+            series
+            for series in self.all_series
+            if series.project_id == mail.project.id
+            and series.version == mail.version
+            and series.total == mail.n
+            and start_date <= series.date <= end_date
+            and (
+                series.submitter_id == author.pk
+                if series.pk is not None
+                else series.submitter is author
+            )
+        ]
+
+    def has_patch_number(self, series, number):
+        return any(
+            patch.number == number for patch in self.series_patches[id(series)]
+        )
+
+    def find_patch_for_comment(self, mail):
+        for ref in mail.refs:
+            key = (mail.project.id, ref[:255])
+
+            patch = self.patches.get(key)
+            if patch:
+                return patch
+
+            comments = self.patch_comments.get(key)
+            if comments:
+                # The latter item will be the cover letter
+                return comments[-1].patch
+
+        return None
+
+    def find_cover_for_comment(self, mail):
+        for ref in mail.refs:
+            key = (mail.project.id, ref[:255])
+
+            cover = self.covers.get(key)
+            if cover:
+                return cover
+
+            comments = self.cover_comments.get(key)
+            if comments:
+                return comments[-1].cover
+
+        return None
+
+    # object creation, see 'parse_mail', the 'Series' helpers and the signal
+    # handlers that create events
+
+    def add_event(self, category, **kwargs):
+        self.events.append(Event(category=category, **kwargs))
+
+    def add_tags(self, patch, content):
+        if not self.projects[patch.project_id].use_tags or not content:
+            return
+
+        counts = Patch.extract_tags(content, self.tags)
+        self.tag_counts.setdefault(id(patch), (patch, Counter()))[1].update(
+            counts
+        )
+
+    def create_series(self, mail, author, total):
+        series = Series(
+            project=mail.project,
+            date=mail.date,
+            submitter=author,
+            version=mail.version,
+            total=total,
+        )
+        self.new_series.append(series)
+        self.all_series.append(series)
+        self.add_event(
+            Event.CATEGORY_SERIES_CREATED, project=mail.project, series=series
+        )
+        return series
+
+    def add_series_reference(self, mail, msgid, series):
+        key = (mail.project.id, msgid[:255])
+        if key in self.references:
+            return
+
+        self.references[key] = series
+        self.new_references.append(
+            SeriesReference(
+                project=mail.project, msgid=msgid[:255], series=series
+            )
+        )
+
+    def update_series(self, series):
+        if series.pk is not None:
+            self.updated_series[series.pk] = series
+
+    def add_patch_to_series(self, series, patch, number):
+        # both user defined names and cover letter-based names take precedence
+        if not series.name and number == 1:
+            series.name = patch.name
+            self.update_series(series)
+
+        patches = self.series_patches[id(series)]
+
+        # if dependencies are met, raise events for this patch and for any
+        # successors whose dependencies this now satisfies
+        predecessors = [p for p in patches if p.number < number]
+        if len(predecessors) == number - 1:
+            self.add_event(
+                Event.CATEGORY_PATCH_COMPLETED,
+                project=patch.project,
+                patch=patch,
+                series=series,
+            )
+
+            count = number + 1
+            for successor in sorted(
+                (p for p in patches if p.number > number),
+                key=lambda p: p.number,
+            ):
+                if successor.number != count:
+                    break
+
+                self.add_event(
+                    Event.CATEGORY_PATCH_COMPLETED,
+                    project_id=successor.project_id,
+                    patch=successor,
+                    series=series,
+                )
+                count += 1
+
+        if len(patches) + 1 >= series.total:
+            self.add_event(
+                Event.CATEGORY_SERIES_COMPLETED,
+                project=series.project,
+                series=series,
+            )
+
+        patch.series = series
+        patch.number = number
+        patches.append(patch)
+
+    def add_cover_to_series(self, series, cover):
+        if series.cover_letter_id or series.cover_letter:
+            return
+
+        series.cover_letter = cover
+
+        if not series.name:
+            series.name = Series._format_name(cover)
+        else:
+            name = None
+            for patch in self.series_patches[id(series)]:
+                if patch.number == 1:
+                    name = patch.name
+                    break
+
+            if series.name == name:
+                series.name = Series._format_name(cover)
+
+        self.update_series(series)
+
+    def add(self, mail):
+        if mail.is_patch:
+            return self.add_patch(mail)
+
+        if mail.x == 0:  # (potential) cover letters
+            is_cover_letter = False
+            if not mail.is_comment:
+                if mail.refs:
+                    is_cover_letter = not self.cover_names[mail.name]
+                else:
+                    is_cover_letter = True
+
+            if is_cover_letter:
+                return self.add_cover(mail)
+
+        return self.add_comment(mail)
+
+    def add_patch(self, mail):
+        project = mail.project
+        author = self.get_or_create_author(mail)
+        filenames = parser.find_filenames(mail.diff) if mail.diff else []
+        delegate = self.find_delegate(mail, filenames)
+
+        if (project.id, mail.msgid) in self.patches:
+            raise parser.DuplicateMailError(msgid=mail.msgid)
+
+        patch = Patch(
+            msgid=mail.msgid,
+            project=project,
+            name=mail.name[:255],
+            date=mail.date,
+            headers=mail.headers,
+            submitter=author,
+            content=mail.message,
+            diff=mail.diff,
+            pull_url=mail.pull_url,
+            delegate=delegate,
+            state=self.find_state(mail),
+        )
+        # these are usually taken care of by 'save'
+        if patch.content:
+            patch.content = patch.content.replace('\r\n', '\n')
+        if patch.diff is not None:
+            patch.hash = hash_diff(patch.diff)
+            patch.git_patch_id = git_patch_id(patch.diff)
+
+        self.patches[(project.id, mail.msgid)] = patch
+        self.new_patches.append(patch)
+        self.new_patch_files.append((patch, filenames))
+        self.add_event(
+            Event.CATEGORY_PATCH_CREATED, project=project, patch=patch
+        )
+        self.add_tags(patch, patch.content)
+
+        # see 'parse_mail'. Series aren't locked here: if another process
+        # adds patches to the same series while the batch is being parsed,
+        # saving the batch fails and 'parse_mail' is used instead
+        x, n = mail.x, mail.n
+        series = None
+        if n:
+            candidates = self.find_series(mail, author)
+            if len(candidates) > 1:
+                for series in sorted(
+                    candidates, key=lambda s: s.date, reverse=True
+                ):
+                    if self.has_patch_number(series, x):
+                        continue
+                    break
+                else:
+                    series = None
+            elif len(candidates) == 1:
+                series = candidates[0]
+        else:
+            x = n = 1
+
+        if not series or self.has_patch_number(series, x):
+            series = self.create_series(mail, author, n)
+            for ref in mail.refs + [mail.msgid]:
+                self.add_series_reference(mail, ref, series)
+
+        if series and x:
+            self.add_patch_to_series(series, patch, x)
+
+        return patch
+
+    def add_cover(self, mail):
+        project = mail.project
+        author = self.get_or_create_author(mail)
+
+        series = self.references.get((project.id, mail.msgid))
+        if not series:
+            series = self.create_series(mail, author, mail.n)
+            self.add_series_reference(mail, mail.msgid, series)
+
+        if (project.id, mail.msgid) in self.covers:
+            raise parser.DuplicateMailError(msgid=mail.msgid)
+
+        cover = Cover(
+            msgid=mail.msgid,
+            project=project,
+            name=mail.name[:255],
+            date=mail.date,
+            headers=mail.headers,
+            submitter=author,
+            content=mail.message.replace('\r\n', '\n'),
+        )
+
+        self.covers[(project.id, mail.msgid)] = cover
+        self.cover_names[cover.name] += 1
+        self.new_covers.append(cover)
+        self.add_event(
+            Event.CATEGORY_COVER_CREATED, project=project, cover=cover
+        )
+
+        self.add_cover_to_series(series, cover)
+
+        return cover
+
+    def add_comment(self, mail):
+        project = mail.project
+        key = (project.id, mail.msgid)
+
+        # we only save comments if we have the parent email
+        patch = self.find_patch_for_comment(mail)
+        if patch:
+            author = self.get_or_create_author(mail)
+
+            if (id(patch), mail.msgid) in self.comment_keys:
+                raise parser.DuplicateMailError(msgid=mail.msgid)
+
+            comment = PatchComment(
+                patch=patch,
+                msgid=mail.msgid,
+                date=mail.date,
+                headers=mail.headers,
+                submitter=author,
+                content=mail.message.replace('\r\n', '\n'),
+                addressed=parser.find_comment_addressed_by_header(mail.mail),
+            )
+
+            self.patch_comments[key].append(comment)
+            self.comment_keys.add((id(patch), mail.msgid))
+            self.new_patch_comments.append(comment)
+            self.add_event(
+                Event.CATEGORY_PATCH_COMMENT_CREATED,
+                project_id=patch.project_id,
+                patch=patch,
+                patch_comment=comment,
+            )
+            self.add_tags(patch, comment.content)
+
+            return comment
+
+        cover = self.find_cover_for_comment(mail)
+        if not cover:
+            return None
+
+        author = self.get_or_create_author(mail)
+
+        if (id(cover), mail.msgid) in self.comment_keys:
+            raise parser.DuplicateMailError(msgid=mail.msgid)
+
+        comment = CoverComment(
+            cover=cover,
+            msgid=mail.msgid,
+            date=mail.date,
+            headers=mail.headers,
+            submitter=author,
+            content=mail.message.replace('\r\n', '\n'),
+        )
+
+        self.cover_comments[key].append(comment)
+        self.comment_keys.add((id(cover), mail.msgid))
+        self.new_cover_comments.append(comment)
+        self.add_event(
+            Event.CATEGORY_COVER_COMMENT_CREATED,
+            project_id=cover.project_id,
+            cover=cover,
+            cover_comment=comment,
+        )
+
+        return comment
+
+    # database writes
+
+    def save(self):
+        Person.objects.bulk_create(self.new_persons)
+        Person.objects.bulk_update(self.updated_persons.values(), ['name'])
+
+        Cover.objects.bulk_create(self.new_covers)
+        Series.objects.bulk_create(self.new_series)
+        Series.objects.bulk_update(
+            self.updated_series.values(), ['name', 'cover_letter']
+        )
+        SeriesReference.objects.bulk_create(self.new_references)
+
+        Patch.objects.bulk_create(self.new_patches)
+        PatchSearch.index(self.new_patches)
+        PatchFile.add(self.new_patch_files)
+        PatchCount.add(Counter(map(PatchCount.get_key, self.new_patches)))
+        PatchComment.objects.bulk_create(self.new_patch_comments)
+        CoverComment.objects.bulk_create(self.new_cover_comments)
+        # these are created without sending signals
+        invalidate_mbox(
+            Patch, {comment.patch_id for comment in self.new_patch_comments}
+        )
+        invalidate_mbox(
+            Cover, {comment.cover_id for comment in self.new_cover_comments}
+        )
+        MessageID.objects.bulk_create(
+            MessageID.from_message(message)
+            for message in itertools.chain(
+                self.new_patches,
+                self.new_covers,
+                self.new_patch_comments,
+                self.new_cover_comments,
+            )
+        )
+
+        self._save_tags()
+
+        Event.objects.bulk_create(self.events)
+
+    def _save_tags(self):
+        new_patches = {id(patch) for patch in self.new_patches}
+
+        existing = {}
+        for patchtag in PatchTag.objects.filter(
+            patch__in=[
+                patch.pk
+                for key, (patch, _) in self.tag_counts.items()
+                if key not in new_patches
+            ]
+        ):
+            existing[(patchtag.patch_id, patchtag.tag_id)] = patchtag
+
+        created = []
+        updated = []
+        patches = []
+        for patch, counts in self.tag_counts.values():
+            if any(counts.values()):
+                patches.append(patch)
+
+            for tag, count in counts.items():
+                if not count:
+                    continue
+
+                patchtag = existing.get((patch.pk, tag.pk))
+                if patchtag:
+                    patchtag.count += count
+                    updated.append(patchtag)
+                else:
+                    created.append(PatchTag(patch=patch, tag=tag, count=count))
+
+        PatchTag.objects.bulk_create(created)
+        PatchTag.objects.bulk_update(updated, ['count'])
+
+        # store the counts with the patches too, as Patch.store_tag_counts
+        # would but without fetching the tags again
+        stored = defaultdict(dict)
+        for patchtag in itertools.chain(existing.values(), created):
+            stored[patchtag.patch_id][str(patchtag.tag_id)] = patchtag.count
+
+        for patch in patches:
+            patch.tag_counts = stored[patch.pk]
+        Patch.objects.bulk_update(patches, ['tag_counts'])
+
+
+def _has_dependencies(mail):
+    for part in mail.walk():
+        payload = part.get_payload(decode=True)
+        if payload and _depends_on_re.search(payload):
+            return True
+
+    return False
+
+
+def _parse_serial(mails, list_id):
+    results = []
+    for mail in mails:
+        try:
+            results.append(parser.parse_mail(mail, list_id))
+        except Exception as exc:
+            results.append(exc)
+    return results
+
+
+def _parse_batch(mails, list_id):
+    results = []
+    parsed = []
+
+    for mail in mails:
+        # see the checks at the start of 'parse_mail'
+        try:
+            if 'From' not in mail:
+                raise ValueError("Missing 'From' header")
+
+            if 'Subject' not in mail:
+                raise ValueError("Missing 'Subject' header")
+
+            if 'Message-Id' not in mail:
+                raise ValueError("Missing 'Message-Id' header")
+
+            hint = parser.clean_header(mail.get('X-Patchwork-Hint', ''))
+            if hint and hint.lower() == 'ignore':
+                logger.info("Ignoring email due to 'ignore' hint")
+                results.append(None)
+                continue
+
+            project = parser.find_project(mail, list_id)
+            if project is None:
+                logger.error('Failed to find a project for email')
+                results.append(None)
+                continue
+
+            mail = _Mail(mail, project)
+        except Exception as exc:
+            results.append(exc)
+            continue
+
+        if not mail.has_content:
+            results.append(None)  # nothing to work with
+            continue
+
+        results.append(mail)
+        parsed.append(mail)
+
+    if not parsed:
+        return results
+
+    batch = _Batch(parsed)
+    for i, mail in enumerate(results):
+        if not isinstance(mail, _Mail):
+            continue
+
+        try:
+            results[i] = batch.add(mail)
+        except Exception as exc:
+            results[i] = exc
+
+    with transaction.atomic():
+        batch.save()
+
+    return results
+
+
+def parse_mails(mails, list_id=None, batch_size=BATCH_SIZE):
+    """Parse mails and add them to the database in batches.
+
+    The result is the same as that of calling
+    :func:`patchwork.parser.parse_mail` for each mail in turn. However, an
+    error in one mail does not stop the other mails from being added. It is
+    returned in place of the mail's result instead.
+
+    Mails containing ``Depends-on:`` hints are passed to ``parse_mail``, as
+    they can refer to any series. Batches that cannot be saved, for example
+    because another process added some of the same mails in the meantime,
+    are also passed to ``parse_mail`` one mail at a time.
+
+    Args:
+        mails (iterable of `email.message.Message`): Mails to parse and add.
+        list_id (str): Mailing list ID
+        batch_size (int): Maximum number of mails to add at once
+
+    Yields:
+        The patch, cover letter, comment or None returned by ``parse_mail``,
+        or the exception raised by it, for each mail in order.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # we need the IDs of objects created in bulk to refer to them
+        yield from _parse_serial(mails, list_id)
+        return
+
+    mails = iter(mails)
+    while True:
+        chunk = list(itertools.islice(mails, batch_size))
+        if not chunk:
+            break
+
+        start = 0
+        for end, mail in enumerate(chunk + [None]):
+            if mail is not None and not _has_dependencies(mail):
+                continue
+
+            if start < end:
+                try:
+                    yield from _parse_batch(chunk[start:end], list_id)
+                except IntegrityError:
+                    logger.warning(
+                        'Conflict while saving %d mails. Parsing them one at '
+                        'a time instead',
+                        end - start,
+                    )
+                    yield from _parse_serial(chunk[start:end], list_id)
+
+            if mail is not None:
+                yield from _parse_serial([mail], list_id)
+
+            start = end + 1
@@ -0,0 +1,258 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Support for management commands that update many patches at once.
+
+Patches are processed in chunks of consecutive IDs, optionally using a pool
+of worker processes. Each chunk is handled by a function that is given a
+queryset of the patches in the chunk and is expected to write its changes
+using bulk queries, so that no signals are sent. The chunks that have been
+processed can be recorded in a checkpoint file, allowing an interrupted run
+to be resumed.
+"""
+
+import bisect
+import datetime
+import json
+import multiprocessing
+import os
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connections
+from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_datetime
+
+from patchwork.models import Patch
+from patchwork.models import Project
+
+CHUNK_SIZE = 1000
+
+
+def get_patches(filters):
+    """Get the patches matching the filters given on the command line."""
+    query = Patch.objects.all()
+
+    if filters['patch_ids']:
+        query = query.filter(id__in=filters['patch_ids'])
+
+    if filters['project']:
+        query = query.filter(project__linkname=filters['project'])
+
+    if filters['since']:
+        query = query.filter(date__gte=parse_datetime(filters['since']))
+
+    return query
+
+
+def _init_worker():
+    # each worker needs its own database connection rather than one inherited
+    # from the parent process
+    connections.close_all()
+
+
+def _process_chunk(args):
+    process, filters, first, last = args
+
+    return process(get_patches(filters).filter(id__range=(first, last)))
+
+
+class Checkpoint(object):
+    """A record of the chunks of patches processed so far.
+
+    Args:
+        path (str): Path of the checkpoint file, or None to not record
+            anything
+        key (dict): Identifies the run, i.e. the command and its filters.
+            A checkpoint file recorded for a different run is refused.
+    """
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.ranges = []
+
+        if not path or not os.path.exists(path):
+            return
+
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise CommandError('Invalid checkpoint file %s: %s' % (path, exc))
+
+        if data.get('key') != key:
+            raise CommandError(
+                'Checkpoint file %s was recorded with different options. '
+                'Remove it to start again.' % path
+            )
+
+        self.ranges = sorted(tuple(r) for r in data['done'])
+
+    def __contains__(self, patch_id):
+        index = bisect.bisect_right(self.ranges, (patch_id, float('inf')))
+        return index > 0 and self.ranges[index - 1][1] >= patch_id
+
+    def save(self, ranges):
+        """Record the ranges of IDs processed in this run."""
+        if not self.path:
+            return
+
+        data = {'key': self.key, 'done': sorted(self.ranges + ranges)}
+
+        # write the new checkpoint atomically, so that it's never truncated
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ChunkedPatchCommand(BaseCommand):
+    """A command that updates patches in chunks.
+
+    Subclasses must set ``process_chunk`` to a module-level function that
+    takes a queryset of patches and returns the number of patches updated.
+    """
+
+    process_chunk = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'patch_ids',
+            metavar='patch_id',
+            nargs='*',
+            type=int,
+            help='a patch ID number. If not supplied, all patches will be '
+            'updated.',
+        )
+        parser.add_argument(
+            '--project',
+            help='only update the patches of the project with this link name',
+        )
+        parser.add_argument(
+            '--since',
+            help='only update patches received on or after this date, in '
+            'ISO 8601 format',
+        )
+        parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            default=1,
+            help='number of worker processes to update patches with',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='number of patches to update at once',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='file to record progress in. If the file exists, patches '
+            'already updated according to it are skipped. It is removed '
+            'once all patches have been updated.',
+        )
+
+    def _get_filters(self, options):
+        project = options['project']
+        if project and not Project.objects.filter(linkname=project).exists():
+            raise CommandError('Invalid project: %s' % project)
+
+        since = options['since']
+        if since:
+            try:
+                date = parse_datetime(since) or parse_date(since)
+            except ValueError:
+                date = None
+            if date is None:
+                raise CommandError('Invalid date: %s' % since)
+
+            if not isinstance(date, datetime.datetime):
+                date = datetime.datetime.combine(date, datetime.time())
+            elif date.tzinfo:
+                # dates are stored in UTC, without a timezone
+                date = date.astimezone(datetime.timezone.utc)
+                date = date.replace(tzinfo=None)
+
+            since = date.isoformat()
+
+        return {
+            'patch_ids': sorted(options['patch_ids']),
+            'project': project,
+            'since': since,
+        }
+
+    def _get_chunks(self, filters, chunk_size, checkpoint):
+        chunks = []
+        chunk = None
+
+        ids = get_patches(filters).order_by('id').values_list('id', flat=True)
+        for patch_id in ids.iterator(chunk_size=10000):
+            if patch_id in checkpoint:
+                continue
+
+            if chunk is None or chunk[2] == chunk_size:
+                chunk = [patch_id, patch_id, 0]
+                chunks.append(chunk)
+
+            chunk[1] = patch_id
+            chunk[2] += 1
+
+        return chunks
+
+    def _run(self, tasks, jobs):
+        if jobs == 1:
+            for task in tasks:
+                yield _process_chunk(task)
+            return
+
+        # forked workers must not share the parent's database connections
+        connections.close_all()
+
+        # workers are forked so they inherit the configured Django setup
+        context = multiprocessing.get_context('fork')
+
+        with context.Pool(jobs, initializer=_init_worker) as pool:
+            yield from pool.imap(_process_chunk, tasks)
+
+    def handle(self, *args, **options):
+        jobs = options['jobs']
+        if jobs < 1:
+            raise CommandError('Invalid number of jobs: %d' % jobs)
+
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('Invalid chunk size: %d' % chunk_size)
+
+        filters = self._get_filters(options)
+        checkpoint = Checkpoint(
+            options['checkpoint'],
+            {'command': self.__module__.rsplit('.', 1)[-1], **filters},
+        )
+
+        chunks = self._get_chunks(filters, chunk_size, checkpoint)
+        total = sum(chunk[2] for chunk in chunks)
+        tasks = [
+            (type(self).process_chunk, filters, first, last)
+            for first, last, _ in chunks
+        ]
+
+        # chunks are completed in order, so the IDs processed so far can be
+        # recorded as a single range
+        count = 0
+        for (_, last, size), _ in zip(chunks, self._run(tasks, jobs)):
+            count += size
+            checkpoint.save([(chunks[0][0], last)])
+
+            self.stdout.write('%06d/%06d\r' % (count, total), ending='')
+            self.stdout.flush()
+
+        checkpoint.remove()
+        self.stdout.write('\ndone')
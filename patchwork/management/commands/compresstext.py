@@ -0,0 +1,117 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from patchwork.fields import COMPRESSION_MIN_LENGTH
+from patchwork.fields import COMPRESSION_PREFIX
+from patchwork.fields import COMPRESSION_PREFIXES
+from patchwork.fields import CompressedTextField
+
+CHUNK_SIZE = 100
+
+
+def get_compressed_fields():
+    """Get the models with compressed text fields, and the names of these."""
+    models = []
+
+    for model in apps.get_app_config('patchwork').get_models():
+        fields = [
+            field.name
+            for field in model._meta.concrete_fields
+            if isinstance(field, CompressedTextField)
+        ]
+        if fields:
+            models.append((model, fields))
+
+    return models
+
+
+def get_stale(model, fields, method):
+    """Get the objects with values not stored using the compression given.
+
+    Stored values are compared rather than the values loaded, which are
+    always decompressed.
+    """
+    query = Q()
+    annotations = {}
+
+    for name in fields:
+        if method:
+            length = '%s_length' % name
+            annotations[length] = Length(name)
+            query |= Q(**{'%s__gte' % length: COMPRESSION_MIN_LENGTH}) & ~Q(
+                **{'%s__startswith' % name: COMPRESSION_PREFIXES[method]}
+            )
+        else:
+            query |= Q(**{'%s__startswith' % name: COMPRESSION_PREFIX})
+
+    return model.objects.alias(**annotations).filter(query)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compress, or decompress, the text stored for existing mails '
+        'according to the TEXT_FIELD_COMPRESSION setting.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='number of objects to update at once',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('Invalid chunk size: %d' % chunk_size)
+
+        method = settings.TEXT_FIELD_COMPRESSION
+        if method and method not in COMPRESSION_PREFIXES:
+            raise CommandError('Invalid compression method: %s' % method)
+
+        for model, fields in get_compressed_fields():
+            name = str(model._meta.verbose_name_plural).lower()
+            stale = get_stale(model, fields, method).order_by('id')
+            total = stale.count()
+            count = 0
+            last_id = 0
+
+            self.stdout.write(
+                '%s: %06d/%06d\r' % (name, count, total), ending=''
+            )
+
+            # the objects updated no longer match, so they're skipped if the
+            # command is interrupted and run again
+            while True:
+                objs = list(
+                    stale.filter(id__gt=last_id).only('id', *fields)[
+                        :chunk_size
+                    ]
+                )
+                if not objs:
+                    break
+
+                # saving the values loaded stores them using the current
+                # compression
+                model.objects.bulk_update(objs, fields)
+
+                last_id = objs[-1].id
+                count += len(objs)
+                self.stdout.write(
+                    '%s: %06d/%06d\r' % (name, count, total), ending=''
+                )
+                self.stdout.flush()
+
+            self.stdout.write('')
+
+        self.stdout.write('done')
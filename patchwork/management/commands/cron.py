@@ -5,14 +5,15 @@
 
 from django.core.management.base import BaseCommand
 
+from patchwork.models import PatchCount
 from patchwork.notifications import expire_notifications
 from patchwork.notifications import send_notifications
 
 
 class Command(BaseCommand):
     help = (
-        'Run periodic Patchwork functions: send notifications and '
-        'expire unused users'
+        'Run periodic Patchwork functions: send notifications, '
+        'expire unused users and fix patch counts'
     )
 
     def handle(self, *args, **kwargs):
@@ -23,3 +24,6 @@ class Command(BaseCommand):
             )
 
         expire_notifications()
+
+        # counts can be wrong if patches are changed without sending signals
+        PatchCount.refresh()
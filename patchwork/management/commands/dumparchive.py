@@ -13,7 +13,7 @@ from django.utils.encoding import force_bytes
 
 from patchwork.models import Patch
 from patchwork.models import Project
-from patchwork.views.utils import patch_to_mbox
+from patchwork.views.utils import patches_to_mbox
 
 
 class Command(BaseCommand):
@@ -66,14 +66,16 @@ class Command(BaseCommand):
                 with tempfile.NamedTemporaryFile(delete=False) as mbox:
                     patches = Patch.objects.filter(project=project)
                     count = patches.count()
-                    for j, patch in enumerate(patches):
+                    for j, text in enumerate(
+                        patches_to_mbox(patches.iterator())
+                    ):
                         if not (j % 10):
                             self.stdout.write(
                                 '%06d/%06d\r' % (j, count), ending=''
                             )
                             self.stdout.flush()
 
-                        mbox.write(force_bytes(patch_to_mbox(patch) + '\n'))
+                        mbox.write(force_bytes(text + '\n'))
 
                 tar.add(mbox.name, arcname='%s.mbox' % project.linkname)
 
@@ -3,42 +3,455 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+from collections import Counter
+import datetime
+import email
+import email.parser
+from email.utils import parseaddr
+import gzip
+import io
 import logging
+import lzma
 import mailbox
+import multiprocessing
 import os
 import sys
+import tempfile
 
 from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models.functions import Lower
 
+from patchwork.ingest import parse_mails
 from patchwork import models
+from patchwork.parser import clean_header
+from patchwork.parser import clean_subject
+from patchwork.parser import find_author
+from patchwork.parser import find_date
+from patchwork.parser import find_message_id
+from patchwork.parser import find_project
+from patchwork.parser import find_references
 from patchwork.parser import parse_mail
+from patchwork.parser import parse_series_marker
+from patchwork.parser import parse_version
+from patchwork.parser import SERIES_DELAY_INTERVAL
 from patchwork.parser import DuplicateMailError
 
+try:
+    from compression import zstd
+except ImportError:
+    # zstd support was only added to the standard library in Python 3.14
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
 logger = logging.getLogger(__name__)
 
+# magic numbers of the compression formats we can read
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# number of people to look up and create at once before parsing in parallel
+SENDER_BATCH_SIZE = 500
+
+
+def _decompress(stream):
+    """Wrap a binary stream, transparently decompressing it if necessary.
+
+    The compression format is detected from the first bytes of the stream
+    rather than from the filename so that compressed archives can also be
+    read from stdin.
+    """
+    magic = stream.peek(len(XZ_MAGIC))
+
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(stream, 'rb')
+
+    if magic.startswith(XZ_MAGIC):
+        return lzma.open(stream, 'rb')
+
+    if magic.startswith(ZSTD_MAGIC):
+        if zstd is None:
+            raise ValueError(
+                'Reading zstd-compressed archives requires Python 3.14 or '
+                'the zstandard package'
+            )
+        return io.BufferedReader(zstd.open(stream, 'rb'))
+
+    return stream
+
+
+def split_mbox(stream):
+    """Split an mbox stream into the raw bytes of each mail it contains.
+
+    This is a streaming alternative to ``mailbox.mbox``, which must be able
+    to seek in a file and which builds a table of contents of the entire
+    mbox before returning the first message. Like ``mailbox.mbox``, a mail
+    starts on each line beginning with ``From `` and the blank line
+    separating it from the previous mail is dropped.
+    """
+    lines = None
+
+    for line in stream:
+        if line.startswith(b'From '):
+            if lines:
+                yield _join_mail(lines)
+            lines = []
+        elif lines is not None:
+            lines.append(line)
+
+    if lines:
+        yield _join_mail(lines)
+
+
+def _join_mail(lines):
+    if lines[-1] in (b'\n', b'\r\n'):
+        lines.pop()
+    return b''.join(lines)
+
+
+def read_archive(path=None):
+    """Yield the raw bytes of each mail in an archive.
+
+    Args:
+        path: Path to an mbox file, which may be compressed with gzip, xz or
+            zstd, or to a Maildir. If not supplied, an mbox is read from
+            stdin.
+    """
+    # assume if <infile> is a directory, then we're passing a maildir
+    if path and os.path.isdir(path):
+        maildir = mailbox.Maildir(path, create=False)
+        for key in maildir.iterkeys():
+            yield maildir.get_bytes(key)
+        return
+
+    if path:
+        infile = open(path, 'rb')
+    else:
+        infile = sys.stdin.buffer
+
+    try:
+        yield from split_mbox(_decompress(infile))
+    finally:
+        if path:
+            infile.close()
+
+
+def _count_result(counts, obj):
+    if isinstance(obj, DuplicateMailError):
+        counts['duplicates'] += 1
+        logger.warning('Duplicate mail for message ID %s', obj.msgid)
+    elif isinstance(obj, Exception):
+        counts['errors'] += 1
+        logger.warning('Invalid mail: %s', repr(obj))
+    elif isinstance(obj, models.Cover):
+        counts['covers'] += 1
+    elif isinstance(obj, models.Patch):
+        counts['patches'] += 1
+    elif obj:
+        counts['comments'] += 1
+    else:
+        counts['dropped'] += 1
+
+
+def _parse_one(data, list_id, counts):
+    try:
+        # Broken mails can cause the 'email' library to raise exceptions
+        # other than parse errors, as described here:
+        #
+        #   https://lists.ozlabs.org/pipermail/patchwork/2017-July/004486.html
+        #
+        # so these are simply treated as another kind of invalid mail
+        mail = email.message_from_bytes(data)
+        result = parse_mail(mail, list_id)
+    except Exception as exc:
+        result = exc
+
+    _count_result(counts, result)
+
+
+def _read_mails(mails, counts):
+    for data in mails:
+        try:
+            yield email.message_from_bytes(data)
+        except Exception as exc:
+            _count_result(counts, exc)
+
+
+def _parse_many(mails, list_id, batch_size, counts):
+    """Parse mails in batches, yielding once for each mail parsed."""
+    if batch_size == 1:
+        for data in mails:
+            _parse_one(data, list_id, counts)
+            yield
+        return
+
+    for result in parse_mails(_read_mails(mails, counts), list_id, batch_size):
+        _count_result(counts, result)
+        yield
+
+
+def _thread_keys(mail):
+    """Return the keys linking a mail to other mails in its thread.
+
+    These are the mail's own Message-ID and those of any ancestor it
+    references. Mails with a series marker are also linked to other mails
+    from the same sender with the same version and marker sent around the
+    same time, since the parser can match these to the same series using
+    ``_find_series_by_markers``.
+    """
+    try:
+        keys = [find_message_id(mail)]
+    except ValueError:
+        keys = []
+
+    keys.extend(ref[:255] for ref in find_references(mail))
+
+    try:
+        name, prefixes = clean_subject(mail.get('Subject'))
+    except ValueError:
+        return keys
+
+    _, total = parse_series_marker(prefixes)
+    if total:
+        sender = parseaddr(clean_header(mail.get('From', '')) or '')[1]
+        version = parse_version(name, prefixes)
+        # the parser only matches mails sent within SERIES_DELAY_INTERVAL of
+        # each other, which are in the same or adjacent periods of that
+        # length, so each mail is linked to those of its period and the next
+        delta = datetime.timedelta(minutes=SERIES_DELAY_INTERVAL)
+        period = (find_date(mail) - datetime.datetime(1970, 1, 1)) // delta
+        for key_period in (period, period + 1):
+            keys.append(('series', sender.lower(), version, total, key_period))
+
+    return keys
+
+
+def partition_by_thread(keys):
+    """Group mails into partitions that can be parsed independently.
+
+    Args:
+        keys: An iterable of lists of thread keys, one list per mail, in
+            archive order, as returned by ``_thread_keys``.
+
+    Returns:
+        A list of partitions, each a list of mail indexes in archive order.
+        Partitions are ordered by their first mail.
+    """
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    count = 0
+    for index, mail_keys in enumerate(keys):
+        count += 1
+        node = ('mail', index)
+        parent[node] = node
+        for key in mail_keys:
+            parent.setdefault(key, key)
+            root_a, root_b = find(node), find(key)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    partitions = {}
+    for index in range(count):
+        partitions.setdefault(find(('mail', index)), []).append(index)
+
+    return sorted(partitions.values(), key=lambda indexes: indexes[0])
+
+
+def _find_sender(mail, list_id, senders):
+    """Record the sender of a mail, as the parser would find them."""
+    try:
+        project = find_project(mail, list_id)
+        if not project:
+            # the mail will be dropped
+            return
+
+        name, email = find_author(mail, project)
+    except Exception:
+        # this will be reported as an error by the worker
+        return
+
+    senders.setdefault(email.lower(), (name, email))
+
+
+def create_senders(senders):
+    """Create the people sending mails who don't exist yet.
+
+    Workers parsing mails of different threads from the same new sender would
+    otherwise race to create them, and the mails of the workers losing the
+    race would fail to be parsed.
+
+    Args:
+        senders: A dict of the (name, email) tuple of each sender, keyed by
+            their lowercase email address.
+    """
+    emails = list(senders)
+    for start in range(0, len(emails), SENDER_BATCH_SIZE):
+        batch = emails[start : start + SENDER_BATCH_SIZE]
+        existing = set(
+            models.Person.objects.annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=batch)
+            .values_list('email_lower', flat=True)
+        )
+        # other processes, such as parsemail, may be creating them too
+        models.Person.objects.bulk_create(
+            [
+                models.Person(name=senders[email][0], email=senders[email][1])
+                for email in batch
+                if email not in existing
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def _init_worker():
+    # each worker needs its own database connection rather than one inherited
+    # from the parent process
+    connections.close_all()
+
+
+def _parse_partition(args):
+    spool_fd, index, list_id, batch_size = args
+
+    # the spool file descriptor is shared with the parent and the other
+    # workers so only read it using positional reads
+    mails = (os.pread(spool_fd, length, offset) for offset, length in index)
+
+    counts = Counter()
+    for _ in _parse_many(mails, list_id, batch_size, counts):
+        pass
+
+    return counts
+
 
 class Command(BaseCommand):
     help = 'Parse an mbox archive file and store any patches/comments found.'
 
     def add_arguments(self, parser):
-        parser.add_argument('infile', help='input mbox filename')
+        parser.add_argument(
+            'infile',
+            nargs='?',
+            type=str,
+            default=None,
+            help='input mbox filename, optionally compressed with gzip, xz '
+            'or zstd, or Maildir directory. If not supplied, an mbox will '
+            'be read from stdin.',
+        )
         parser.add_argument(
             '--list-id',
             help='mailing list ID. If not supplied, this will be '
             'extracted from the mail headers.',
         )
+        parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            default=1,
+            help='number of worker processes to parse mails with. Mails are '
+            'partitioned by thread so that mails of a thread are always '
+            'parsed in order by the same worker.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1,
+            help='number of mails to add to the database at once. Mails are '
+            'added one at a time by default.',
+        )
 
-    def handle(self, *args, **options):
-        results = {
-            models.Patch: 0,
-            models.Cover: 0,
-            models.PatchComment: 0,
-            models.CoverComment: 0,
-        }
-        duplicates = 0
-        dropped = 0
-        errors = 0
+    def _progress(self, count):
+        self.stdout.write('%06d\r' % count, ending='')
+        self.stdout.flush()
+
+    def _parse_serial(self, mails, list_id, verbosity, batch_size):
+        counts = Counter()
+
+        for i, _ in enumerate(_parse_many(mails, list_id, batch_size, counts)):
+            if verbosity < 3 and (i % 10) == 0:
+                self._progress(i)
+
+        return counts
+
+    def _parse_parallel(self, mails, list_id, verbosity, jobs, batch_size):
+        # Spool the mails to a temporary file while working out the threads
+        # they belong to. This allows us to read the archive only once, even
+        # if it's compressed or coming from stdin, without holding it in
+        # memory.
+        header_parser = email.parser.BytesHeaderParser()
+        index = []
+        keys = []
+        senders = {}
+
+        with tempfile.TemporaryFile() as spool:
+            offset = 0
+            for data in mails:
+                spool.write(data)
+                index.append((offset, len(data)))
+                offset += len(data)
 
+                try:
+                    headers = header_parser.parsebytes(data)
+                    keys.append(_thread_keys(headers))
+                except Exception:
+                    # this will be reported as an error by the worker
+                    keys.append([])
+                    continue
+
+                _find_sender(headers, list_id, senders)
+
+            spool.flush()
+
+            partitions = partition_by_thread(keys)
+            del keys
+
+            create_senders(senders)
+            del senders
+
+            logger.info(
+                'Parsing %d mails in %d threads with %d workers',
+                len(index),
+                len(partitions),
+                jobs,
+            )
+
+            def tasks():
+                for partition in partitions:
+                    yield (
+                        spool.fileno(),
+                        [index[i] for i in partition],
+                        list_id,
+                        batch_size,
+                    )
+
+            # forked workers must not share the parent's database connections
+            connections.close_all()
+
+            # workers are forked so they inherit the configured Django setup
+            context = multiprocessing.get_context('fork')
+
+            counts = Counter()
+            done = 0
+            with context.Pool(jobs, initializer=_init_worker) as pool:
+                for result in pool.imap_unordered(_parse_partition, tasks()):
+                    counts.update(result)
+                    done += sum(result.values())
+
+                    if verbosity < 3:
+                        self._progress(done)
+
+        return counts
+
+    def handle(self, *args, **options):
         verbosity = int(options['verbosity'])
         if not verbosity:
             level = logging.CRITICAL
@@ -53,61 +466,46 @@ class Command(BaseCommand):
             logger.setLevel(level)
             logging.getLogger('patchwork.parser').setLevel(level)
 
-        # TODO(stephenfin): Support passing via stdin
-        path = args and args[0] or options['infile']
-        if not os.path.exists(path):
-            logger.error('Invalid path: %s', path)
+        jobs = options['jobs']
+        if jobs < 1:
+            logger.error('Invalid number of jobs: %d', jobs)
             sys.exit(1)
 
-        # assume if <infile> is a directory, then we're passing a maildir
-        if os.path.isfile(path):
-            mbox = mailbox.mbox(path, create=False)
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            logger.error('Invalid batch size: %d', batch_size)
+            sys.exit(1)
+
+        path = args and args[0] or options['infile']
+        if path:
+            if not os.path.exists(path):
+                logger.error('Invalid path: %s', path)
+                sys.exit(1)
+            logger.info('Parsing mails loaded by filename')
         else:
-            mbox = mailbox.Maildir(path, create=False)
+            logger.info('Parsing mails loaded from stdin')
 
-        count = len(mbox)
+        mails = read_archive(path)
 
-        # Iterate through the mbox. This will pick up exceptions that are only
-        # thrown when a broken email is found part way through. Without this
-        # block, we'd get the exception thrown in enumerate(mbox) below, which
-        # is harder to catch. This is due to a bug in the Python 'email'
-        # library, as described here:
-        #
-        #   https://lists.ozlabs.org/pipermail/patchwork/2017-July/004486.html
-        #
-        # The alternative is converting the mbox to a list of messages, but
-        # that requires holding the entire thing in memory, which is wateful.
         try:
-            for m in mbox:
-                pass
-        except AttributeError:
-            logger.error('Broken mbox/Maildir, aborting')
-            return
-
-        logger.info('Parsing %d mails', count)
-        for i, msg in enumerate(mbox):
-            try:
-                obj = parse_mail(msg, options['list_id'])
-                if obj:
-                    results[type(obj)] += 1
-                else:
-                    dropped += 1
-            except DuplicateMailError as exc:
-                duplicates += 1
-                logger.warning('Duplicate mail for message ID %s', exc.msgid)
-            except (ValueError, Exception) as exc:
-                errors += 1
-                logger.warning('Invalid mail: %s', repr(exc))
-
-            if verbosity < 3 and (i % 10) == 0:
-                self.stdout.write('%06d/%06d\r' % (i, count), ending='')
-                self.stdout.flush()
-
-        mbox.close()
+            if jobs > 1:
+                counts = self._parse_parallel(
+                    mails, options['list_id'], verbosity, jobs, batch_size
+                )
+            else:
+                counts = self._parse_serial(
+                    mails, options['list_id'], verbosity, batch_size
+                )
+        except (OSError, EOFError, ValueError) as exc:
+            # raised for unreadable or truncated (compressed) archives
+            logger.error('Failed to read archive, aborting: %s', exc)
+            sys.exit(1)
 
         if not verbosity:
             return
 
+        count = sum(counts.values())
+
         self.stdout.write(
             'Processed %(total)d messages -->\n'
             '  %(covers)4d cover letters\n'
@@ -119,14 +517,17 @@ class Command(BaseCommand):
             'Total: %(new)s new entries'
             % {
                 'total': count,
-                'covers': results[models.Cover],
-                'patches': results[models.Patch],
-                'comments': (
-                    results[models.CoverComment] + results[models.PatchComment]
+                'covers': counts['covers'],
+                'patches': counts['patches'],
+                'comments': counts['comments'],
+                'duplicates': counts['duplicates'],
+                'dropped': counts['dropped'],
+                'errors': counts['errors'],
+                'new': (
+                    count
+                    - counts['duplicates']
+                    - counts['dropped']
+                    - counts['errors']
                 ),
-                'duplicates': duplicates,
-                'dropped': dropped,
-                'errors': errors,
-                'new': count - duplicates - dropped - errors,
             }
         )
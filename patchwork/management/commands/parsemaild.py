@@ -0,0 +1,623 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import email
+import itertools
+import logging
+import os
+import queue
+import signal
+import socket
+import socketserver
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import InterfaceError
+from django.db import OperationalError
+
+from patchwork.parser import parse_mail
+from patchwork.parser import DuplicateMailError
+
+logger = logging.getLogger(__name__)
+
+# database errors that are likely to go away if we try again, such as lost
+# connections or deadlocks
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+# the maximum delay between attempts to parse a mail, in seconds
+MAX_RETRY_DELAY = 60
+
+
+class Spool(object):
+    """A Maildir-format directory of mails waiting to be parsed.
+
+    Mails are delivered to the ``new`` directory and are removed once parsed.
+    Mails that cannot be parsed are moved to a dead-letter directory, which
+    is also in Maildir format and can later be passed to ``parsearchive``.
+    """
+
+    def __init__(self, path, dead_letter_path):
+        self.path = path
+        self.dead_letter_path = dead_letter_path
+        self._counter = itertools.count()
+        self._hostname = socket.gethostname().replace('/', r'\057')
+
+        for directory in (path, dead_letter_path):
+            for subdir in ('tmp', 'new', 'cur'):
+                os.makedirs(os.path.join(directory, subdir), exist_ok=True)
+
+    def _unique_name(self):
+        return '%.6f.P%dQ%d.%s' % (
+            time.time(),
+            os.getpid(),
+            next(self._counter),
+            self._hostname,
+        )
+
+    def deliver(self, data):
+        """Durably add a mail to the spool, returning its name."""
+        name = self._unique_name()
+        tmp_path = os.path.join(self.path, 'tmp', name)
+
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.rename(tmp_path, os.path.join(self.path, 'new', name))
+
+        return name
+
+    def names(self):
+        """Return the names of all mails in the spool, oldest first."""
+        directory = os.path.join(self.path, 'new')
+        entries = []
+        for name in os.listdir(directory):
+            try:
+                mtime = os.stat(os.path.join(directory, name)).st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((mtime, name))
+
+        return [name for _, name in sorted(entries)]
+
+    def count(self):
+        """Return the number of mails in the spool."""
+        return sum(
+            len(os.listdir(os.path.join(self.path, subdir)))
+            for subdir in ('new', 'cur')
+        )
+
+    def read(self, name):
+        """Return the contents and delivery time of a mail."""
+        path = os.path.join(self.path, 'new', name)
+        with open(path, 'rb') as f:
+            return f.read(), os.fstat(f.fileno()).st_mtime
+
+    def remove(self, name):
+        os.unlink(os.path.join(self.path, 'new', name))
+
+    def dead_letter(self, name):
+        os.rename(
+            os.path.join(self.path, 'new', name),
+            os.path.join(self.dead_letter_path, 'new', name),
+        )
+
+
+class Stats(object):
+    """Statistics about the mails parsed since they were last reported."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.counts = {'parsed': 0, 'deferred': 0, 'failed': 0}
+        self.latencies = []
+
+    def record(self, result, latency):
+        with self._lock:
+            self.counts[result] += 1
+            self.latencies.append(latency)
+
+    def report(self, depth, queued):
+        """Return a summary of the statistics and reset them."""
+        with self._lock:
+            counts, latencies = self.counts, sorted(self.latencies)
+            self._reset()
+
+        if latencies:
+            latency = 'latency avg %.3fs, p95 %.3fs, max %.3fs' % (
+                sum(latencies) / len(latencies),
+                latencies[int(len(latencies) * 0.95)],
+                latencies[-1],
+            )
+        else:
+            latency = 'latency n/a'
+
+        return (
+            'Queue depth %d, %d queued, parsed %d, deferred %d, failed %d, %s'
+        ) % (
+            depth,
+            queued,
+            counts['parsed'],
+            counts['deferred'],
+            counts['failed'],
+            latency,
+        )
+
+
+class LMTPSession(object):
+    """A session with an LMTP client, as described in RFC 2033.
+
+    Only what is needed to accept mail from a local MTA is implemented.
+    Mails are accepted once they have been durably added to the spool, and
+    the same reply is sent for each recipient.
+    """
+
+    def __init__(self, rfile, wfile, deliver, hostname=None):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.deliver = deliver
+        self.hostname = hostname or socket.getfqdn()
+
+    def reply(self, *lines):
+        for line in lines[:-1]:
+            self.wfile.write(('%s\r\n' % line.replace(' ', '-', 1)).encode())
+        self.wfile.write(('%s\r\n' % lines[-1]).encode())
+        self.wfile.flush()
+
+    def read_data(self):
+        lines = []
+        for line in self.rfile:
+            if line in (b'.\r\n', b'.\n'):
+                return b''.join(lines)
+            if line.startswith(b'.'):  # remove dot-stuffing
+                line = line[1:]
+            if line.endswith(b'\r\n'):  # use Maildir line endings
+                line = line[:-2] + b'\n'
+            lines.append(line)
+
+        return None  # connection closed mid-message
+
+    def run(self):
+        self.reply('220 %s LMTP Patchwork ready' % self.hostname)
+
+        greeted = False
+        sender = None
+        recipients = []
+
+        for line in self.rfile:
+            command, _, argument = line.decode('ascii', 'replace').partition(
+                ' '
+            )
+            command = command.strip().upper()
+
+            if command == 'LHLO':
+                greeted = True
+                sender, recipients = None, []
+                self.reply(
+                    '250 %s' % self.hostname,
+                    '250 PIPELINING',
+                    '250 8BITMIME',
+                    '250 ENHANCEDSTATUSCODES',
+                )
+            elif command == 'MAIL':
+                if not greeted:
+                    self.reply('503 5.5.1 Send LHLO first')
+                elif sender is not None:
+                    self.reply('503 5.5.1 Nested MAIL command')
+                else:
+                    sender = argument.strip()
+                    self.reply('250 2.1.0 Ok')
+            elif command == 'RCPT':
+                if sender is None:
+                    self.reply('503 5.5.1 Send MAIL first')
+                else:
+                    recipients.append(argument.strip())
+                    self.reply('250 2.1.5 Ok')
+            elif command == 'DATA':
+                if not recipients:
+                    self.reply('503 5.5.1 Send RCPT first')
+                    continue
+
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = self.read_data()
+                if data is None:
+                    return
+
+                try:
+                    name = self.deliver(data)
+                except OSError as exc:
+                    logger.error('Failed to spool mail: %s', exc)
+                    status = '451 4.3.0 Failed to spool mail'
+                else:
+                    status = '250 2.0.0 Ok: queued as %s' % name
+
+                # LMTP requires a reply for each recipient
+                for _ in recipients:
+                    self.reply(status)
+
+                sender, recipients = None, []
+            elif command == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 2.0.0 Ok')
+            elif command == 'NOOP':
+                self.reply('250 2.0.0 Ok')
+            elif command == 'VRFY':
+                self.reply('252 2.0.0 Cannot verify')
+            elif command == 'QUIT':
+                self.reply('221 2.0.0 Bye')
+                return
+            else:
+                self.reply('500 5.5.2 Command not recognized')
+
+
+class _LMTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            LMTPSession(self.rfile, self.wfile, self.server.deliver).run()
+        except OSError as exc:
+            logger.warning('LMTP connection lost: %s', exc)
+
+
+class _UnixLMTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+class _TCPLMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Daemon(object):
+    """Parse mails from a spool using a pool of worker threads.
+
+    Each worker thread keeps its own database connection open between
+    mails. Mails that fail with a transient database error are retried with
+    an exponential backoff and, if they still fail, left in the spool to be
+    retried later. Mails that fail for any other reason are moved to the
+    dead-letter directory.
+    """
+
+    def __init__(
+        self,
+        spool,
+        list_id=None,
+        workers=4,
+        queue_size=1000,
+        retries=5,
+        retry_delay=1.0,
+    ):
+        self.spool = spool
+        self.list_id = list_id
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.stats = Stats()
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def deliver(self, data):
+        """Add a mail to the spool and queue it for parsing."""
+        name = self.spool.deliver(data)
+        self.enqueue(name)
+        return name
+
+    def enqueue(self, name):
+        with self._lock:
+            if name in self._pending:
+                return True
+
+            try:
+                self._queue.put_nowait(name)
+            except queue.Full:
+                # it will be picked up by a later scan of the spool
+                return False
+
+            self._pending.add(name)
+            return True
+
+    def scan(self):
+        """Queue any mails in the spool that aren't queued yet."""
+        for name in self.spool.names():
+            if not self.enqueue(name):
+                break
+
+    def _parse(self, name, mail):
+        for attempt in itertools.count():
+            try:
+                # parse_mail scopes its own transactions. An outer one would
+                # take its snapshot before the series are locked, and hold
+                # every lock until the whole mail is parsed
+                result = parse_mail(mail, self.list_id)
+            except DuplicateMailError as exc:
+                logger.warning('Duplicate mail for message ID %s', exc.msgid)
+                return 'parsed'
+            except TRANSIENT_ERRORS as exc:
+                # the connection may be unusable so start afresh
+                connection.close()
+
+                if attempt >= self.retries:
+                    logger.error(
+                        'Failed to parse mail %s after %d attempts, '
+                        'deferring: %s',
+                        name,
+                        attempt + 1,
+                        repr(exc),
+                    )
+                    return 'deferred'
+
+                delay = min(self.retry_delay * 2**attempt, MAX_RETRY_DELAY)
+                logger.warning(
+                    'Transient error when parsing mail %s, retrying in '
+                    '%.1fs: %s',
+                    name,
+                    delay,
+                    repr(exc),
+                )
+                if self._stopping.wait(delay):
+                    return 'deferred'
+            except Exception as exc:
+                logger.exception(
+                    'Error when parsing incoming email %s: %s',
+                    name,
+                    repr(exc),
+                )
+                return 'failed'
+            else:
+                if result is None:
+                    logger.info('Nothing added to database for mail %s', name)
+                return 'parsed'
+
+    def process(self, name):
+        """Parse a mail from the spool and remove it once done.
+
+        Returns:
+            'parsed' if the mail was parsed, even if nothing was added to
+            the database, 'deferred' if it was left in the spool to retry
+            later, or 'failed' if it was moved to the dead-letter directory.
+        """
+        try:
+            data, delivered = self.spool.read(name)
+        except FileNotFoundError:
+            return None
+
+        start = time.monotonic()
+
+        try:
+            mail = email.message_from_bytes(data)
+        except Exception as exc:
+            logger.error('Broken email %s: %s', name, repr(exc))
+            result = 'failed'
+        else:
+            result = self._parse(name, mail)
+
+        if result == 'parsed':
+            self.spool.remove(name)
+        elif result == 'failed':
+            self.spool.dead_letter(name)
+
+        logger.debug(
+            'Mail %s %s in %.3fs, %.3fs after delivery',
+            name,
+            result,
+            time.monotonic() - start,
+            time.time() - delivered,
+        )
+        self.stats.record(result, max(time.time() - delivered, 0))
+
+        return result
+
+    def _work(self):
+        while True:
+            name = self._queue.get()
+            if name is None:
+                break
+
+            try:
+                self.process(name)
+            except Exception:
+                logger.exception('Unexpected error processing mail %s', name)
+            finally:
+                with self._lock:
+                    self._pending.discard(name)
+
+        connection.close()
+
+    @property
+    def depth(self):
+        """The number of mails waiting in the spool to be parsed.
+
+        This includes the mails queued, and those being parsed.
+        """
+        return self.spool.count()
+
+    @property
+    def queued(self):
+        """The number of mails queued for the workers."""
+        return self._queue.qsize()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name='parsemaild-worker-%d' % i
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+
+        # drop anything that hasn't been started yet; it's still spooled
+        with self._lock:
+            while True:
+                try:
+                    self._pending.discard(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+        for _ in self._threads:
+            self._queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+
+def _create_lmtp_server(address, deliver):
+    host, sep, port = address.rpartition(':')
+    if '/' not in address and sep and port.isdigit():
+        server = _TCPLMTPServer((host or 'localhost', int(port)), _LMTPHandler)
+    else:
+        if os.path.exists(address):
+            os.unlink(address)  # remove a stale socket
+        server = _UnixLMTPServer(address, _LMTPHandler)
+
+    server.deliver = deliver
+    return server
+
+
+class Command(BaseCommand):
+    help = 'Parse incoming mails and store any patches/comments found.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'spool',
+            help='spool directory, in Maildir format, to queue incoming '
+            'mails in. Mails delivered to this directory by other means are '
+            'also parsed.',
+        )
+        parser.add_argument(
+            '--lmtp',
+            metavar='ADDRESS',
+            help='accept mails using LMTP on this address, either the path '
+            'of a UNIX socket or HOST:PORT.',
+        )
+        parser.add_argument(
+            '--dead-letter',
+            metavar='DIRECTORY',
+            help='directory, in Maildir format, to move mails that cannot be '
+            'parsed to. Defaults to the "failed" directory in the spool.',
+        )
+        parser.add_argument(
+            '--list-id',
+            help='mailing list ID. If not supplied, this will be '
+            'extracted from the mail headers.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='number of mails to parse concurrently.',
+        )
+        parser.add_argument(
+            '--queue-size',
+            type=int,
+            default=1000,
+            help='maximum number of mails to queue in memory. Any other '
+            'mails are picked up from the spool later.',
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=5,
+            help='number of times to retry mails that fail with a transient '
+            'database error before deferring them.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='how often to check the spool for mails, in seconds.',
+        )
+        parser.add_argument(
+            '--stats-interval',
+            type=float,
+            default=60.0,
+            help='how often to report statistics, in seconds.',
+        )
+
+    def handle(self, *args, **options):
+        for option in ('workers', 'queue_size'):
+            if options[option] < 1:
+                raise CommandError(
+                    'Invalid %s: %d'
+                    % (option.replace('_', ' '), options[option])
+                )
+
+        spool = Spool(
+            options['spool'],
+            options['dead_letter'] or os.path.join(options['spool'], 'failed'),
+        )
+        daemon = Daemon(
+            spool,
+            list_id=options['list_id'],
+            workers=options['workers'],
+            queue_size=options['queue_size'],
+            retries=options['retries'],
+        )
+
+        stop = threading.Event()
+
+        def handle_signal(signum, frame):
+            logger.info('Received signal %d, stopping', signum)
+            stop.set()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+
+        server = None
+        if options['lmtp']:
+            server = _create_lmtp_server(options['lmtp'], daemon.deliver)
+            threading.Thread(
+                target=server.serve_forever, name='parsemaild-lmtp'
+            ).start()
+            logger.info('Accepting mail using LMTP on %s', options['lmtp'])
+
+        # the workers use their own connections
+        connection.close()
+
+        daemon.start()
+        logger.info(
+            'Parsing mails from %s with %d workers',
+            options['spool'],
+            options['workers'],
+        )
+
+        next_report = time.monotonic() + options['stats_interval']
+        try:
+            while not stop.is_set():
+                daemon.scan()
+
+                if time.monotonic() >= next_report:
+                    self.stdout.write(
+                        daemon.stats.report(daemon.depth, daemon.queued)
+                    )
+                    next_report += options['stats_interval']
+
+                stop.wait(options['poll_interval'])
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+                if server.address_family == socket.AF_UNIX:
+                    os.unlink(options['lmtp'])
+            daemon.stop()
+            self.stdout.write(daemon.stats.report(daemon.depth, daemon.queued))
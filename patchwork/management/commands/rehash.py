@@ -4,29 +4,31 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
-from django.core.management.base import BaseCommand
-
+from patchwork.hasher import git_patch_id
+from patchwork.hasher import hash_diff
+from patchwork.management.chunked import ChunkedPatchCommand
 from patchwork.models import Patch
 
 
-class Command(BaseCommand):
-    help = 'Update the hashes on existing patches'
-    args = '[<patch_id>...]'
-
-    def handle(self, *args, **options):
-        query = Patch.objects
+def rehash_chunk(patches):
+    updated = []
 
-        if args:
-            query = query.filter(id_in=args)
+    for patch in patches.only('id', 'diff', 'hash', 'git_patch_id'):
+        if patch.diff is not None:
+            hashes = (hash_diff(patch.diff), git_patch_id(patch.diff))
         else:
-            query = query.all()
+            hashes = (None, None)
+
+        if (patch.hash, patch.git_patch_id) != hashes:
+            patch.hash, patch.git_patch_id = hashes
+            updated.append(patch)
 
-        count = query.count()
+    Patch.objects.bulk_update(updated, ['hash', 'git_patch_id'])
+
+    return len(updated)
+
+
+class Command(ChunkedPatchCommand):
+    help = 'Update the hashes on existing patches'
 
-        for i, patch in enumerate(query.iterator()):
-            patch.hash = None
-            patch.save()
-            if (i % 10) == 0:
-                self.stdout.write('%06d/%06d\r' % (i, count), ending='')
-                self.stdout.flush()
-        self.stdout.write('\ndone')
+    process_chunk = staticmethod(rehash_chunk)
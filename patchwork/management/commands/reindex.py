@@ -0,0 +1,20 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from patchwork.management.chunked import ChunkedPatchCommand
+from patchwork.models import PatchSearch
+
+
+def reindex_chunk(patches):
+    patches = list(patches.only('id', 'name', 'content'))
+    PatchSearch.index(patches)
+
+    return len(patches)
+
+
+class Command(ChunkedPatchCommand):
+    help = 'Update the text searched for existing patches'
+
+    process_chunk = staticmethod(reindex_chunk)
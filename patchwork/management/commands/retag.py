@@ -3,28 +3,78 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
-from django.core.management.base import BaseCommand
+from collections import Counter
+from collections import defaultdict
 
+from patchwork.management.chunked import ChunkedPatchCommand
 from patchwork.models import Patch
+from patchwork.models import PatchComment
+from patchwork.models import PatchTag
+from patchwork.models import Tag
 
 
-class Command(BaseCommand):
-    help = 'Update the tag (Ack/Review/Test) counts on existing patches'
-    args = '[<patch_id>...]'
+def retag_chunk(patches):
+    """Recount the tags of a chunk of patches.
+
+    This is equivalent to calling ``Patch.refresh_tag_counts`` on each patch,
+    but uses a fixed number of queries for the whole chunk.
+    """
+    patches = list(
+        patches.filter(project__use_tags=True).only('id', 'content')
+    )
+    if not patches:
+        return 0
+
+    tags = list(Tag.objects.all())
+    counters = defaultdict(Counter)
+
+    for patch in patches:
+        if patch.content:
+            counters[patch.id] += Patch.extract_tags(patch.content, tags)
+
+    comments = PatchComment.objects.filter(patch__in=patches).values_list(
+        'patch_id', 'content'
+    )
+    for patch_id, content in comments.iterator():
+        counters[patch_id] += Patch.extract_tags(content, tags)
+
+    patchtags = {
+        (patchtag.patch_id, patchtag.tag_id): patchtag
+        for patchtag in PatchTag.objects.filter(patch__in=patches)
+    }
 
-    def handle(self, *args, **options):
-        query = Patch.objects
+    created = []
+    updated = []
+    deleted = []
 
-        if args:
-            query = query.filter(id__in=args)
-        else:
-            query = query.all()
+    for patch in patches:
+        patch.tag_counts = {
+            str(tag.id): count
+            for tag, count in counters[patch.id].items()
+            if count
+        }
 
-        count = query.count()
+        for tag in tags:
+            patchtag = patchtags.get((patch.id, tag.id))
+            count = counters[patch.id][tag]
+            if not count:
+                if patchtag:
+                    deleted.append(patchtag.id)
+            elif not patchtag:
+                created.append(PatchTag(patch=patch, tag=tag, count=count))
+            elif patchtag.count != count:
+                patchtag.count = count
+                updated.append(patchtag)
+
+    PatchTag.objects.bulk_create(created)
+    PatchTag.objects.bulk_update(updated, ['count'])
+    PatchTag.objects.filter(id__in=deleted).delete()
+    Patch.objects.bulk_update(patches, ['tag_counts'])
+
+    return len(patches)
+
+
+class Command(ChunkedPatchCommand):
+    help = 'Update the tag (Ack/Review/Test) counts on existing patches'
 
-        for i, patch in enumerate(query.iterator()):
-            patch.refresh_tag_counts()
-            if (i % 10) == 0:
-                self.stdout.write('%06d/%06d\r' % (i, count), ending='')
-                self.stdout.flush()
-        self.stdout.write('\ndone')
+    process_chunk = staticmethod(retag_chunk)
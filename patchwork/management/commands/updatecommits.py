@@ -0,0 +1,223 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import multiprocessing
+import subprocess
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connections
+
+from patchwork.hasher import hash_diff
+from patchwork.models import Patch
+from patchwork.models import Project
+from patchwork.models import State
+
+BATCH_SIZE = 500
+
+# marks the start of each commit in the output of 'git log'. This can't
+# appear in a diff, as git considers files containing NUL bytes to be binary
+COMMIT_MARKER = '\0'
+
+
+def read_commits(repo, revisions):
+    """Yield the ID and diff of each non-merge commit in a range.
+
+    The diffs of all commits are read from a single ``git log`` process.
+    Commits are yielded oldest first.
+
+    Args:
+        repo (str): Path to the git repository
+        revisions (list): Revisions to pass to ``git log``, for example
+            ``['v1.0..main']``
+    """
+    cmd = [
+        'git',
+        '-C',
+        repo,
+        'log',
+        '--patch',
+        '--no-merges',
+        '--reverse',
+        '--no-color',
+        '--no-ext-diff',
+        '--format=%x00%H',
+        *revisions,
+        '--',
+    ]
+
+    # errors are written to a file, as a pipe could fill up while the
+    # commits are read, blocking git
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+
+        commit = None
+        lines = []
+
+        for line in proc.stdout:
+            # diffs of files that aren't valid UTF-8 are hashed as the
+            # original bytes, as git does
+            line = line.decode('utf-8', errors='surrogateescape')
+            if line.startswith(COMMIT_MARKER):
+                if commit:
+                    yield commit, ''.join(lines)
+                commit = line[1:].strip()
+                lines = []
+            else:
+                lines.append(line)
+
+        if commit:
+            yield commit, ''.join(lines)
+
+        if proc.wait():
+            stderr.seek(0)
+            error = stderr.read().decode('utf-8', errors='replace')
+            raise CommandError('Failed to read commits: %s' % error.strip())
+
+
+def _hash_commit(commit):
+    rev, diff = commit
+    return rev, hash_diff(diff) if diff.strip() else None
+
+
+def update_patches(hashes, state, project=None):
+    """Update the patches matching the hashes of some commits.
+
+    Args:
+        hashes (dict): Commit IDs, keyed by the hash of their diff
+        state (State): The state to set
+        project (Project): Only update patches of this project
+
+    Returns:
+        A list of the patches updated.
+    """
+    patches = (
+        Patch.objects.filter(hash__in=list(hashes))
+        .select_related('project', 'state')
+        .defer('content', 'diff', 'headers')
+    )
+    if project:
+        patches = patches.filter(project=project)
+
+    patches = list(patches)
+    commit_refs = {patch.id: hashes[patch.hash] for patch in patches}
+
+    return Patch.bulk_set_state(patches, state, commit_refs)
+
+
+class Command(BaseCommand):
+    help = 'Update the state of patches merged in a git repository.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'repo',
+            metavar='REPO',
+            help='path to the git repository',
+        )
+        parser.add_argument(
+            'revisions',
+            metavar='REVISION',
+            nargs='+',
+            help='revisions to look for patches in, as understood by '
+            "'git log', for example 'v1.0..main'",
+        )
+        parser.add_argument(
+            '--state',
+            default='Accepted',
+            help="state to set on the patches found (default: 'Accepted')",
+        )
+        parser.add_argument(
+            '--project',
+            help='only update the patches of the project with this link name',
+        )
+        parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            default=1,
+            help='number of worker processes to hash commits with',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='number of commits to look up and update patches for at once',
+        )
+
+    def handle(self, *args, **options):
+        verbosity = int(options['verbosity'])
+
+        jobs = options['jobs']
+        if jobs < 1:
+            raise CommandError('Invalid number of jobs: %d' % jobs)
+
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Invalid batch size: %d' % batch_size)
+
+        try:
+            state = State.objects.get(name__iexact=options['state'])
+        except State.DoesNotExist:
+            raise CommandError('Invalid state: %s' % options['state'])
+
+        project = None
+        if options['project']:
+            try:
+                project = Project.objects.get(linkname=options['project'])
+            except Project.DoesNotExist:
+                raise CommandError('Invalid project: %s' % options['project'])
+
+        commits = read_commits(options['repo'], options['revisions'])
+
+        if jobs > 1:
+            # forked workers must not share the parent's database connections
+            connections.close_all()
+
+            # workers are forked so they inherit the configured Django setup
+            context = multiprocessing.get_context('fork')
+
+            pool = context.Pool(jobs)
+            results = pool.imap(_hash_commit, commits, chunksize=16)
+        else:
+            pool = None
+            results = map(_hash_commit, commits)
+
+        count = 0
+        try:
+            batch = {}
+            for rev, diff_hash in results:
+                if diff_hash is None:
+                    continue
+
+                # if the same change was committed more than once, the latest
+                # commit is used
+                batch[diff_hash] = rev
+                if len(batch) >= batch_size:
+                    count += self._update(batch, state, project, verbosity)
+                    batch = {}
+
+            if batch:
+                count += self._update(batch, state, project, verbosity)
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+
+        self.stdout.write(
+            '%d patch(es) updated to state %s.' % (count, state.name)
+        )
+
+    def _update(self, hashes, state, project, verbosity):
+        updated = update_patches(hashes, state, project)
+
+        if verbosity > 1:
+            for patch in updated:
+                self.stdout.write(
+                    'Patch #%d updated using rev %s.'
+                    % (patch.id, patch.commit_ref)
+                )
+
+        return len(updated)
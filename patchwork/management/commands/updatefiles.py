@@ -0,0 +1,29 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from patchwork.management.chunked import ChunkedPatchCommand
+from patchwork.models import PatchFile
+from patchwork.parser import find_filenames
+
+
+def updatefiles_chunk(patches):
+    patches = list(patches.only('id', 'diff'))
+
+    PatchFile.objects.filter(patch__in=patches).delete()
+    PatchFile.add(
+        [
+            (patch, find_filenames(patch.diff))
+            for patch in patches
+            if patch.diff
+        ]
+    )
+
+    return len(patches)
+
+
+class Command(ChunkedPatchCommand):
+    help = 'Update the files changed by existing patches'
+
+    process_chunk = staticmethod(updatefiles_chunk)
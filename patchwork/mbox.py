@@ -0,0 +1,120 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Cache keys of the mboxes of patches and cover letters."""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# bump this when changing the mbox generated, so that cached mboxes aren't used
+MBOX_CACHE_VERSION = 1
+
+# the fields of related objects included in the mboxes of submissions. Rather
+# than tracking changes to these, their values are part of the versions
+MBOX_RELATED_FIELDS = {
+    'patch': (
+        'submitter__name',
+        'submitter__email',
+        'delegate__email',
+        'project__listemail',
+    ),
+    'cover': (
+        'submitter__name',
+        'submitter__email',
+        'project__listemail',
+    ),
+}
+
+
+def _get_version_key(model, submission_id):
+    return 'mbox-version-%s-%d' % (model._meta.model_name, submission_id)
+
+
+def get_mbox_key(model, submission_id, version):
+    """Get the cache key of the mbox of a submission.
+
+    Arguments:
+        model: The Patch or Cover model.
+        submission_id: The ID of the submission.
+        version: The version of the mbox, from ``get_mbox_versions``.
+
+    Returns:
+        The cache key.
+    """
+    return 'mbox-%d-%s-%d-%s' % (
+        MBOX_CACHE_VERSION,
+        model._meta.model_name,
+        submission_id,
+        version,
+    )
+
+
+def get_mbox_versions(model, ids):
+    """Get the versions of the cached mboxes of submissions.
+
+    Submissions without a version, because they haven't been converted yet or
+    have changed since, are given a new one. The versions also change with the
+    submitters, delegates and projects of the submissions, as these are
+    included in the mboxes too.
+
+    Arguments:
+        model: The Patch or Cover model.
+        ids: The IDs of the submissions.
+
+    Returns:
+        A dict of the versions, keyed by the IDs of the submissions.
+    """
+    keys = {
+        submission_id: _get_version_key(model, submission_id)
+        for submission_id in ids
+    }
+    versions = cache.get_many(keys.values())
+
+    new = {
+        key: uuid.uuid4().hex for key in keys.values() if key not in versions
+    }
+    if new:
+        cache.set_many(new, settings.MBOX_CACHE_TIMEOUT)
+        versions.update(new)
+
+    related = {
+        values[0]: values[1:]
+        for values in model.objects.filter(id__in=keys).values_list(
+            'id', *MBOX_RELATED_FIELDS[model._meta.model_name]
+        )
+    }
+
+    result = {}
+    for submission_id, key in keys.items():
+        version = versions[key]
+        if submission_id in related:
+            digest = hashlib.sha1(repr(related[submission_id]).encode('utf-8'))
+            version += '-' + digest.hexdigest()[:16]
+        result[submission_id] = version
+
+    return result
+
+
+def invalidate_mbox(model, ids):
+    """Stop using the cached mboxes of submissions.
+
+    The versions of the mboxes are dropped once the current transaction is
+    committed, so the mboxes are converted again the next time they are
+    requested, and get a new ETag.
+
+    Arguments:
+        model: The Patch or Cover model.
+        ids: The IDs of the submissions that changed.
+    """
+    if not settings.MBOX_CACHE_TIMEOUT:
+        return
+
+    keys = [_get_version_key(model, submission_id) for submission_id in ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,117 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0048_series_dependencies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageID',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('msgid', models.CharField(max_length=255)),
+                (
+                    'cover',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='patchwork.cover',
+                    ),
+                ),
+                (
+                    'cover_comment',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='patchwork.covercomment',
+                    ),
+                ),
+                (
+                    'patch',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='patchwork.patch',
+                    ),
+                ),
+                (
+                    'patch_comment',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='patchwork.patchcomment',
+                    ),
+                ),
+                (
+                    'project',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='patchwork.project',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Message ID',
+                'indexes': [
+                    models.Index(
+                        fields=['msgid', 'project'], name='msgid_project_idx'
+                    )
+                ],
+            },
+        ),
+        # Index the message IDs of all existing patches, cover letters and
+        # comments
+        migrations.RunSQL(
+            [
+                """INSERT INTO patchwork_messageid
+                      (msgid, project_id, patch_id)
+                    SELECT msgid, project_id, id FROM patchwork_patch
+                """,
+                """INSERT INTO patchwork_messageid
+                      (msgid, project_id, cover_id)
+                    SELECT msgid, project_id, id FROM patchwork_cover
+                """,
+                """INSERT INTO patchwork_messageid
+                      (msgid, project_id, patch_id, patch_comment_id)
+                    SELECT patchwork_patchcomment.msgid,
+                           patchwork_patch.project_id,
+                           patchwork_patch.id,
+                           patchwork_patchcomment.id
+                    FROM patchwork_patchcomment
+                    INNER JOIN patchwork_patch
+                      ON patchwork_patch.id = patchwork_patchcomment.patch_id
+                """,
+                """INSERT INTO patchwork_messageid
+                      (msgid, project_id, cover_id, cover_comment_id)
+                    SELECT patchwork_covercomment.msgid,
+                           patchwork_cover.project_id,
+                           patchwork_cover.id,
+                           patchwork_covercomment.id
+                    FROM patchwork_covercomment
+                    INNER JOIN patchwork_cover
+                      ON patchwork_cover.id = patchwork_covercomment.cover_id
+                """,
+            ],
+            migrations.RunSQL.noop,
+        ),
+    ]
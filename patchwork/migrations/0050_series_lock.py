@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0049_message_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeriesLock',
+            fields=[
+                (
+                    'slot',
+                    models.PositiveIntegerField(
+                        primary_key=True, serialize=False
+                    ),
+                ),
+            ],
+        ),
+    ]
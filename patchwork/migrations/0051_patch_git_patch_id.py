@@ -0,0 +1,18 @@
+import patchwork.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0050_series_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patch',
+            name='git_patch_id',
+            field=patchwork.fields.HashField(
+                blank=True, db_index=True, max_length=40, null=True
+            ),
+        ),
+    ]
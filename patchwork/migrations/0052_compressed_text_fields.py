@@ -0,0 +1,71 @@
+import patchwork.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0051_patch_git_patch_id'),
+    ]
+
+    # the columns themselves are unchanged, so avoid rebuilding the tables
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='cover',
+                    name='content',
+                    field=patchwork.fields.CompressedTextField(
+                        blank=True, null=True
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name='cover',
+                    name='headers',
+                    field=patchwork.fields.CompressedTextField(blank=True),
+                ),
+                migrations.AlterField(
+                    model_name='covercomment',
+                    name='content',
+                    field=patchwork.fields.CompressedTextField(
+                        blank=True, null=True
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name='covercomment',
+                    name='headers',
+                    field=patchwork.fields.CompressedTextField(blank=True),
+                ),
+                migrations.AlterField(
+                    model_name='patch',
+                    name='content',
+                    field=patchwork.fields.CompressedTextField(
+                        blank=True, null=True
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name='patch',
+                    name='diff',
+                    field=patchwork.fields.CompressedTextField(
+                        blank=True, null=True
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name='patch',
+                    name='headers',
+                    field=patchwork.fields.CompressedTextField(blank=True),
+                ),
+                migrations.AlterField(
+                    model_name='patchcomment',
+                    name='content',
+                    field=patchwork.fields.CompressedTextField(
+                        blank=True, null=True
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name='patchcomment',
+                    name='headers',
+                    field=patchwork.fields.CompressedTextField(blank=True),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,75 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_patches(apps, schema_editor):
+    Patch = apps.get_model('patchwork', 'Patch')
+    PatchCount = apps.get_model('patchwork', 'PatchCount')
+
+    fields = ('project', 'state', 'delegate', 'archived')
+    PatchCount.objects.bulk_create(
+        PatchCount(
+            project_id=project_id,
+            state_id=state_id,
+            delegate_id=delegate_id,
+            archived=archived,
+            count=count,
+        )
+        for project_id, state_id, delegate_id, archived, count in (
+            Patch.objects.values_list(*fields)
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0052_compressed_text_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatchCount',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('archived', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+                (
+                    'delegate',
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    'project',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='patchwork.project',
+                    ),
+                ),
+                (
+                    'state',
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='patchwork.state',
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(count_patches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+from django.conf import settings
+import itertools
+
+from django.db import migrations, models
+
+# see Check.STATE_CHOICES and Check.STATE_PRECEDENCE
+STATE_PENDING = 0
+STATE_PRECEDENCE = (3, 2, 0, 1)
+CHECK_COUNT_FIELDS = (
+    'checks_pending',
+    'checks_success',
+    'checks_warning',
+    'checks_fail',
+)
+
+
+def count_checks(apps, schema_editor):
+    Check = apps.get_model('patchwork', 'Check')
+    Patch = apps.get_model('patchwork', 'Patch')
+
+    checks = (
+        Check.objects.order_by('patch_id', 'id')
+        .values_list('patch_id', 'user_id', 'context', 'date', 'state')
+        .iterator()
+    )
+
+    updated = []
+    for patch_id, patch_checks in itertools.groupby(checks, lambda c: c[0]):
+        # the latest check of each context, as Patch.filter_unique_checks
+        latest = {}
+        for _, user_id, context, date, state in patch_checks:
+            key = (user_id, context)
+            if key in latest and latest[key][0] > date:
+                continue
+            latest[key] = (date, state)
+
+        counts = [0] * len(CHECK_COUNT_FIELDS)
+        for _, state in latest.values():
+            counts[state] += 1
+
+        patch = Patch(id=patch_id, **dict(zip(CHECK_COUNT_FIELDS, counts)))
+        patch.check_state = next(
+            (state for state in STATE_PRECEDENCE if counts[state]),
+            STATE_PENDING,
+        )
+        updated.append(patch)
+
+        if len(updated) >= 1000:
+            Patch.objects.bulk_update(
+                updated, ('check_state',) + CHECK_COUNT_FIELDS
+            )
+            updated = []
+
+    Patch.objects.bulk_update(updated, ('check_state',) + CHECK_COUNT_FIELDS)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0053_patch_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patch',
+            name='check_state',
+            field=models.SmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='checks_fail',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='checks_pending',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='checks_success',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='checks_warning',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='check',
+            index=models.Index(
+                fields=['patch', 'context', 'user', 'date'],
+                name='check_latest_idx',
+            ),
+        ),
+        migrations.RunPython(count_checks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+import itertools
+
+from django.db import migrations, models
+
+
+def store_tag_counts(apps, schema_editor):
+    Patch = apps.get_model('patchwork', 'Patch')
+    PatchTag = apps.get_model('patchwork', 'PatchTag')
+
+    patchtags = (
+        PatchTag.objects.order_by('patch_id')
+        .values_list('patch_id', 'tag_id', 'count')
+        .iterator()
+    )
+
+    updated = []
+    for patch_id, counts in itertools.groupby(patchtags, lambda t: t[0]):
+        updated.append(
+            Patch(
+                id=patch_id,
+                tag_counts={
+                    str(tag_id): count for _, tag_id, count in counts if count
+                },
+            )
+        )
+
+        if len(updated) >= 1000:
+            Patch.objects.bulk_update(updated, ['tag_counts'])
+            updated = []
+
+    Patch.objects.bulk_update(updated, ['tag_counts'])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0054_patch_check_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patch',
+            name='tag_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(store_tag_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+import django.db.models.deletion
+from django.db import connection, migrations, models
+
+
+def create_index(apps, schema_editor):
+    # see patchwork.search
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            """
+            CREATE INDEX patchwork_patchsearch_document_idx
+              ON patchwork_patchsearch
+              USING gin (to_tsvector('simple', document))
+            """
+        )
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(
+            """
+            CREATE FULLTEXT INDEX patchwork_patchsearch_document_idx
+              ON patchwork_patchsearch (document)
+            """
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            """
+            CREATE VIRTUAL TABLE patchwork_patchsearch_fts
+              USING fts5(
+                document,
+                content='patchwork_patchsearch',
+                content_rowid='patch_id'
+              )
+            """
+        )
+        schema_editor.execute(
+            """
+            CREATE TRIGGER patchwork_patchsearch_fts_insert
+              AFTER INSERT ON patchwork_patchsearch BEGIN
+                INSERT INTO patchwork_patchsearch_fts (rowid, document)
+                  VALUES (new.patch_id, new.document);
+              END
+            """
+        )
+        schema_editor.execute(
+            """
+            CREATE TRIGGER patchwork_patchsearch_fts_delete
+              AFTER DELETE ON patchwork_patchsearch BEGIN
+                INSERT INTO patchwork_patchsearch_fts
+                    (patchwork_patchsearch_fts, rowid, document)
+                  VALUES ('delete', old.patch_id, old.document);
+              END
+            """
+        )
+        schema_editor.execute(
+            """
+            CREATE TRIGGER patchwork_patchsearch_fts_update
+              AFTER UPDATE ON patchwork_patchsearch BEGIN
+                INSERT INTO patchwork_patchsearch_fts
+                    (patchwork_patchsearch_fts, rowid, document)
+                  VALUES ('delete', old.patch_id, old.document);
+                INSERT INTO patchwork_patchsearch_fts (rowid, document)
+                  VALUES (new.patch_id, new.document);
+              END
+            """
+        )
+
+
+def drop_index(apps, schema_editor):
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX patchwork_patchsearch_document_idx')
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(
+            'DROP INDEX patchwork_patchsearch_document_idx '
+            'ON patchwork_patchsearch'
+        )
+    elif connection.vendor == 'sqlite':
+        # the triggers are dropped with the table they are on
+        schema_editor.execute('DROP TABLE patchwork_patchsearch_fts')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0055_patch_tag_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatchSearch',
+            fields=[
+                (
+                    'patch',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='+',
+                        serialize=False,
+                        to='patchwork.patch',
+                    ),
+                ),
+                ('document', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,38 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patchwork', '0056_patch_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatchFile',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('path', models.CharField(db_index=True, max_length=255)),
+                (
+                    'patch',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='files',
+                        related_query_name='file',
+                        to='patchwork.patch',
+                    ),
+                ),
+            ],
+            options={
+                'unique_together': {('patch', 'path')},
+            },
+        ),
+    ]
@@ -6,6 +6,7 @@
 
 from collections import Counter
 import datetime
+import functools
 import random
 import re
 
@@ -13,13 +14,21 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_unicode_slug
+from django.db import connection
 from django.db import models
+from django.db import transaction
+from django.db.models import F
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.lookups import GreaterThan
 from django.urls import reverse
 from django.utils.functional import cached_property
 from django.utils import timezone as tz_utils
 
+from patchwork.fields import CompressedTextField
 from patchwork.fields import HashField
+from patchwork.hasher import git_patch_id
 from patchwork.hasher import hash_diff
+from patchwork.mbox import invalidate_mbox
 
 if settings.ENABLE_REST_API:
     from rest_framework.authtoken.models import Token
@@ -196,7 +205,9 @@ class UserProfile(models.Model):
 
     @property
     def n_todo_patches(self):
-        return self.todo_patches().count()
+        return PatchCount.total(
+            archived=False, delegate=self.user, state__action_required=True
+        )
 
     @property
     def token(self):
@@ -277,10 +288,6 @@ class Tag(models.Model):
         default=True,
     )
 
-    @property
-    def attr_name(self):
-        return 'tag_%d_count' % self.id
-
     def __str__(self):
         return self.name
 
@@ -288,6 +295,26 @@ class Tag(models.Model):
         ordering = ['abbrev']
 
 
+@functools.lru_cache(maxsize=16)
+def _compile_tag_patterns(patterns):
+    """Compile the patterns of a list of tags.
+
+    Returns:
+        A regex matching any of the patterns, or None if they can't be
+        combined, and a list of regexes matching each pattern
+    """
+    flags = re.MULTILINE | re.IGNORECASE
+
+    try:
+        combined = re.compile(
+            '|'.join('(?:%s)' % pattern for pattern in patterns), flags
+        )
+    except re.error:
+        combined = None
+
+    return combined, [re.compile(pattern, flags) for pattern in patterns]
+
+
 class PatchTag(models.Model):
     patch = models.ForeignKey('Patch', on_delete=models.CASCADE)
     tag = models.ForeignKey('Tag', on_delete=models.CASCADE)
@@ -301,51 +328,6 @@ def get_default_initial_patch_state():
     return State.objects.get(ordering=0)
 
 
-class PatchQuerySet(models.query.QuerySet):
-    def with_tag_counts(self, project=None):
-        if project and not project.use_tags:
-            return self
-
-        # We need the project's use_tags field loaded for Project.tags().
-        # Using prefetch_related means we'll share the one instance of
-        # Project, and share the project.tags cache between all patch.project
-        # references.
-        qs = self.prefetch_related('project')
-
-        # All projects have the same tags, so we're good to go here
-        if project:
-            tags = project.tags
-        else:
-            tags = Tag.objects.all()
-
-        # Annotate the count of each Tag in a column
-        for tag in tags:
-            qs = qs.annotate(
-                **{
-                    tag.attr_name: models.Sum(
-                        models.Case(
-                            models.When(
-                                patchtag__tag_id=tag.id,
-                                then=models.F('patchtag__count'),
-                            ),
-                            default=models.Value(0),
-                            output_field=models.IntegerField(),
-                        )
-                    )
-                }
-            )
-
-        return qs
-
-
-class PatchManager(models.Manager):
-    def get_queryset(self):
-        return PatchQuerySet(self.model, using=self.db)
-
-    def with_tag_counts(self, project):
-        return self.get_queryset().with_tag_counts(project)
-
-
 class EmailMixin(models.Model):
     """Mixin for models with an email-origin."""
 
@@ -353,12 +335,12 @@ class EmailMixin(models.Model):
 
     msgid = models.CharField(max_length=255)
     date = models.DateTimeField(default=tz_utils.now)
-    headers = models.TextField(blank=True)
+    headers = CompressedTextField(blank=True)
 
     # content
 
     submitter = models.ForeignKey(Person, on_delete=models.CASCADE)
-    content = models.TextField(null=True, blank=True)
+    content = CompressedTextField(null=True, blank=True)
 
     response_re = re.compile(
         r'^(Tested|Reviewed|Acked|Signed-off|Nacked|Reported)-by:.*$',
@@ -495,7 +477,7 @@ class Cover(SubmissionMixin):
 
 
 class Patch(SubmissionMixin):
-    diff = models.TextField(null=True, blank=True)
+    diff = CompressedTextField(null=True, blank=True)
     commit_ref = models.CharField(max_length=255, null=True, blank=True)
     pull_url = models.CharField(max_length=255, null=True, blank=True)
     tags = models.ManyToManyField(Tag, through=PatchTag)
@@ -511,6 +493,22 @@ class Patch(SubmissionMixin):
     state = models.ForeignKey(State, null=True, on_delete=models.CASCADE)
     archived = models.BooleanField(default=False)
     hash = HashField(null=True, blank=True, db_index=True)
+    # the hash 'git patch-id --stable' generates for the diff, if it's a git
+    # diff
+    git_patch_id = HashField(null=True, blank=True, db_index=True)
+
+    # the counts of the tags found in the patch and its comments, keyed by tag
+    # ID. These are kept in sync with the patch's ``PatchTag`` objects, so the
+    # counts of many patches can be shown without aggregating these
+    tag_counts = models.JSONField(default=dict, blank=True)
+
+    # the combined state of the latest check of each context, and the number
+    # of these in each state, kept up to date as checks are created
+    check_state = models.SmallIntegerField(default=0, db_index=True)
+    checks_pending = models.PositiveIntegerField(default=0)
+    checks_success = models.PositiveIntegerField(default=0)
+    checks_warning = models.PositiveIntegerField(default=0)
+    checks_fail = models.PositiveIntegerField(default=0)
 
     # series metadata
 
@@ -539,26 +537,53 @@ class Patch(SubmissionMixin):
         related_query_name='patch',
     )
 
-    objects = PatchManager()
+    # the fields counting the checks in each state, in the order of
+    # ``Check.STATE_CHOICES``
+    CHECK_COUNT_FIELDS = (
+        'checks_pending',
+        'checks_success',
+        'checks_warning',
+        'checks_fail',
+    )
+
+    # fields indexed for searches, whose loaded values are kept to find
+    # whether they change
+    SEARCH_FIELDS = ('name', 'content')
+
+    # fields whose previous values are passed to the signal handlers, see
+    # ``_get_original``
+    TRACKED_FIELDS = (
+        'project',
+        'state',
+        'delegate',
+        'archived',
+        'series',
+        'related',
+    )
 
     @staticmethod
     def extract_tags(content, tags):
         counts = Counter()
 
-        for tag in tags:
-            regex = re.compile(tag.pattern, re.MULTILINE | re.IGNORECASE)
-            counts[tag] = len(regex.findall(content))
+        tags = list(tags)
+        if not tags:
+            return counts
 
-        return counts
+        combined, regexes = _compile_tag_patterns(
+            tuple(tag.pattern for tag in tags)
+        )
 
-    def _set_tag(self, tag, count):
-        if count == 0:
-            self.patchtag_set.filter(tag=tag).delete()
-            return
-        patchtag, _ = PatchTag.objects.get_or_create(patch=self, tag=tag)
-        if patchtag.count != count:
-            patchtag.count = count
-            patchtag.save()
+        # most messages contain no tags, so check for any tag at all first.
+        # Tags can't be found before the first match of any of them.
+        start = 0
+        if combined:
+            match = combined.search(content)
+            start = match.start() if match else len(content) + 1
+
+        for tag, regex in zip(tags, regexes):
+            counts[tag] = len(regex.findall(content, start))
+
+        return counts
 
     def refresh_tag_counts(self):
         tags = self.project.tags
@@ -570,8 +595,77 @@ class Patch(SubmissionMixin):
         for comment in self.comments.all():
             counter = counter + self.extract_tags(comment.content, tags)
 
+        patchtags = {
+            patchtag.tag_id: patchtag for patchtag in self.patchtag_set.all()
+        }
+
         for tag in tags:
-            self._set_tag(tag, counter[tag])
+            patchtag = patchtags.get(tag.id)
+            count = counter[tag]
+            if not count:
+                if patchtag:
+                    patchtag.delete()
+            elif not patchtag:
+                PatchTag.objects.create(patch=self, tag=tag, count=count)
+            elif patchtag.count != count:
+                patchtag.count = count
+                patchtag.save()
+
+        self.store_tag_counts([self])
+
+    def update_tag_counts(self, content, sign=1):
+        """Add, or remove, the tags found in a comment to the tag counts.
+
+        This is cheaper than ``refresh_tag_counts`` as other comments don't
+        need to be scanned again.
+        """
+        if not content:
+            return
+
+        counts = self.extract_tags(content, self.project.tags)
+        if not any(counts.values()):
+            return
+
+        with transaction.atomic():
+            # comments added at the same time would otherwise both create the
+            # missing tag counts
+            Patch.objects.select_for_update().only('id').get(pk=self.pk)
+
+            for tag, count in counts.items():
+                if not count:
+                    continue
+
+                patchtags = PatchTag.objects.filter(patch=self, tag=tag)
+                if sign > 0:
+                    if not patchtags.update(count=F('count') + count):
+                        PatchTag.objects.create(
+                            patch=self, tag=tag, count=count
+                        )
+                else:
+                    patchtags.update(count=F('count') - count)
+                    patchtags.filter(count__lte=0).delete()
+
+            self.store_tag_counts([self])
+
+    @classmethod
+    def store_tag_counts(cls, patches):
+        """Store the tag counts of patches, as counted by their ``PatchTag``.
+
+        The counts of the patches given are updated too.
+        """
+        counts = {patch.pk: {} for patch in patches}
+        for patch_id, tag_id, count in PatchTag.objects.filter(
+            patch__in=list(counts)
+        ).values_list('patch_id', 'tag_id', 'count'):
+            counts[patch_id][str(tag_id)] = count
+
+        for patch in patches:
+            patch.tag_counts = counts[patch.pk]
+
+        cls.objects.bulk_update(patches, ['tag_counts'])
+
+    def get_tag_count(self, tag):
+        return self.tag_counts.get(str(tag.id), 0)
 
     def save(self, *args, **kwargs):
         if not hasattr(self, 'state') or not self.state:
@@ -579,10 +673,126 @@ class Patch(SubmissionMixin):
 
         if self.hash is None and self.diff is not None:
             self.hash = hash_diff(self.diff)
+            self.git_patch_id = git_patch_id(self.diff)
+
+        adding = self._state.adding
+
+        # the signal handlers need the previous values of some fields, so
+        # fetch these once for all of them
+        self._original = self._get_original()
+        try:
+            super(Patch, self).save(**kwargs)
+        finally:
+            del self._original
+
+        # tag counts only change with the content of the patch. Comments
+        # update them when they are saved or deleted
+        if adding or self._changed('content'):
+            self.refresh_tag_counts()
+
+        if adding or self._changed(*self.SEARCH_FIELDS):
+            PatchSearch.index([self])
+
+        self._set_loaded()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Patch, cls).from_db(db, field_names, values)
+        instance._set_loaded()
+        return instance
+
+    def _set_loaded(self):
+        self._loaded = {
+            field: self.__dict__.get(field) for field in self.SEARCH_FIELDS
+        }
+
+    def _get_original(self):
+        """Get the saved values of the fields tracked for signal handlers.
+
+        Returns:
+            A ``Patch`` with only the tracked fields loaded, or None if the
+            patch hasn't been saved yet.
+        """
+        if self.pk is None:
+            return None
+
+        return (
+            Patch.objects.filter(pk=self.pk).only(*self.TRACKED_FIELDS).first()
+        )
+
+    @classmethod
+    def bulk_set_state(cls, patches, state=None, commit_refs=None, actor=None):
+        """Set the state and commit reference of many patches at once.
+
+        The patches are saved using a bulk query, so no signals are sent.
+        Instead, the events and notifications that saving each patch would
+        create are created here.
+
+        Args:
+            patches (list): The patches to update, with their project and
+                state loaded
+            state (State): The new state, or None to keep the current states
+            commit_refs (dict): The new commit references, keyed by patch ID.
+                Patches not listed keep their commit reference.
+            actor (User): The user making the change, if any
+
+        Returns:
+            The list of patches changed.
+        """
+        commit_refs = commit_refs or {}
 
-        super(Patch, self).save(**kwargs)
+        updated = []
+        events = []
+        orig_states = {}
+        counts = Counter()
 
-        self.refresh_tag_counts()
+        for patch in patches:
+            commit_ref = commit_refs.get(patch.id, patch.commit_ref)
+            if state is None or patch.state_id == state.id:
+                if patch.commit_ref == commit_ref:
+                    continue
+            else:
+                events.append(
+                    Event(
+                        category=Event.CATEGORY_PATCH_STATE_CHANGED,
+                        project=patch.project,
+                        actor=actor,
+                        patch=patch,
+                        previous_state=patch.state,
+                        current_state=state,
+                    )
+                )
+                if patch.project.send_notifications:
+                    orig_states[patch.id] = patch.state_id
+                counts[PatchCount.get_key(patch)] -= 1
+                patch.state = state
+                counts[PatchCount.get_key(patch)] += 1
+
+            patch.commit_ref = commit_ref
+            updated.append(patch)
+
+        if not updated:
+            return updated
+
+        with transaction.atomic():
+            cls.objects.bulk_update(updated, ['state', 'commit_ref'])
+            Event.objects.bulk_create(events)
+            if orig_states:
+                PatchChangeNotification.bulk_record(orig_states)
+            PatchCount.add(counts)
+            invalidate_mbox(cls, [patch.id for patch in updated])
+
+        return updated
+
+    def _changed(self, *fields):
+        loaded = getattr(self, '_loaded', {})
+
+        return any(
+            # deferred fields that haven't been set since haven't changed
+            field in self.__dict__
+            and self.__dict__[field] != loaded.get(field)
+            for field in fields
+        )
 
     def is_editable(self, user):
         if not user.is_authenticated:
@@ -660,22 +870,7 @@ class Patch(SubmissionMixin):
           as pending
         * success, if latest checks for all contexts reports as success
         """
-        state_names = dict(Check.STATE_CHOICES)
-        states = [check.state for check in self.checks]
-
-        if not states:
-            return state_names[Check.STATE_PENDING]
-
-        # order sensitive
-        for state in (
-            Check.STATE_FAIL,
-            Check.STATE_WARNING,
-            Check.STATE_PENDING,
-        ):
-            if state in states:
-                return state_names[state]
-
-        return state_names[Check.STATE_SUCCESS]
+        return dict(Check.STATE_CHOICES)[self.check_state]
 
     @property
     def check_count(self):
@@ -688,12 +883,92 @@ class Patch(SubmissionMixin):
         regardless of its value. The end result will be a association
         of types to number of unique checks for said type.
         """
-        counts = {key: 0 for key, _ in Check.STATE_CHOICES}
+        return {
+            state: getattr(self, field)
+            for state, field in enumerate(self.CHECK_COUNT_FIELDS)
+        }
+
+    @staticmethod
+    def _combine_check_states(counts):
+        for state in Check.STATE_PRECEDENCE:
+            if counts[state]:
+                return state
+
+        return Check.STATE_PENDING
 
-        for check in self.checks:
+    def add_check(self, check):
+        """Update the check state and counts for a new check.
+
+        Only the previous latest check of the same context is needed for
+        this, rather than every check of the patch.
+        """
+        with transaction.atomic():
+            # checks of the same context created at the same time would
+            # otherwise both replace the same previous check
+            Patch.objects.select_for_update().only('id').get(pk=self.pk)
+            self._add_check(check)
+
+    def _add_check(self, check):
+        previous = (
+            Check.objects.filter(
+                patch=self, user_id=check.user_id, context=check.context
+            )
+            .exclude(pk=check.pk)
+            .order_by('-date', '-id')
+            .only('date', 'state')
+            .first()
+        )
+
+        # a check older than the latest one changes nothing
+        if previous and previous.date > check.date:
+            return
+
+        changes = Counter({check.state: 1})
+        if previous:
+            changes[previous.state] -= 1
+
+        values = {}
+        counts = []
+        for state, field in enumerate(self.CHECK_COUNT_FIELDS):
+            counts.append(F(field) + changes[state])
+            if changes[state]:
+                values[field] = counts[state]
+
+        if not values:
+            return
+
+        # the counts are updated in the database, as other checks may be
+        # created at the same time, so the state must be combined there too
+        values['check_state'] = models.Case(
+            *(
+                models.When(
+                    GreaterThan(counts[state], 0), then=models.Value(state)
+                )
+                for state in Check.STATE_PRECEDENCE
+            ),
+            default=models.Value(Check.STATE_PENDING),
+        )
+
+        Patch.objects.filter(pk=self.pk).update(**values)
+        self.refresh_from_db(fields=('check_state',) + self.CHECK_COUNT_FIELDS)
+
+    def refresh_check_counts(self):
+        """Count the checks of the patch again.
+
+        This is needed if checks are changed or deleted, rather than created.
+        """
+        counts = [0] * len(self.CHECK_COUNT_FIELDS)
+        for check in self.filter_unique_checks(
+            Check.objects.filter(patch=self).order_by('id')
+        ):
             counts[check.state] += 1
 
-        return counts
+        values = dict(zip(self.CHECK_COUNT_FIELDS, counts))
+        values['check_state'] = self._combine_check_states(counts)
+
+        Patch.objects.filter(pk=self.pk).update(**values)
+        for field, value in values.items():
+            setattr(self, field, value)
 
     def get_absolute_url(self):
         return reverse(
@@ -812,12 +1087,16 @@ class PatchComment(EmailMixin, models.Model):
         return reverse('comment-redirect', kwargs={'comment_id': self.id})
 
     def save(self, *args, **kwargs):
+        adding = self._state.adding
         super(PatchComment, self).save(*args, **kwargs)
-        self.patch.refresh_tag_counts()
+        if adding:
+            self.patch.update_tag_counts(self.content)
+        else:
+            self.patch.refresh_tag_counts()
 
     def delete(self, *args, **kwargs):
         super(PatchComment, self).delete(*args, **kwargs)
-        self.patch.refresh_tag_counts()
+        self.patch.update_tag_counts(self.content, sign=-1)
 
     def is_editable(self, user):
         if user == self.submitter.user:
@@ -968,7 +1247,8 @@ class Series(FilenameMixin, models.Model):
 
         patch.series = self
         patch.number = number
-        patch.save()
+        # the tag and check counts may have changed since the patch was loaded
+        patch.save(update_fields=['series', 'number'])
 
         return patch
 
@@ -1013,6 +1293,130 @@ class SeriesReference(models.Model):
         unique_together = [('project', 'msgid')]
 
 
+class SeriesLock(models.Model):
+    """A lock used to serialize the assignment of patches to series.
+
+    Finding or creating the series a patch belongs to is racy when several
+    parsers receive patches from the same series at once. To avoid this,
+    the parser locks one of a fixed number of these rows, chosen by hashing
+    the thread and series markers of the patch, until its transaction ends.
+    Parsers handling unrelated patches will rarely pick the same row.
+    """
+
+    slot = models.PositiveIntegerField(primary_key=True)
+
+    def __str__(self):
+        return str(self.slot)
+
+
+class MessageID(models.Model):
+    """An index of the message IDs of patches, cover letters and comments.
+
+    Replies are attached to the patch or cover letter referred to by the
+    closest message they reference. This index allows the parser to find
+    these using a single query, whatever the number of references and
+    whatever kind of message each refers to.
+
+    Like :class:`Event`, this uses nullable foreign keys rather than a
+    generic foreign key. Entries for comments also refer to the patch or
+    cover letter the comment belongs to. Entries are created when the
+    message is created and deleted along with it.
+    """
+
+    KIND_PATCH = 'patch'
+    KIND_COVER = 'cover'
+    KIND_PATCH_COMMENT = 'patch-comment'
+    KIND_COVER_COMMENT = 'cover-comment'
+
+    project = models.ForeignKey(
+        Project,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    msgid = models.CharField(max_length=255)
+    patch = models.ForeignKey(
+        Patch,
+        related_name='+',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    cover = models.ForeignKey(
+        Cover,
+        related_name='+',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    patch_comment = models.ForeignKey(
+        PatchComment,
+        related_name='+',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+    cover_comment = models.ForeignKey(
+        CoverComment,
+        related_name='+',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+
+    @classmethod
+    def from_message(cls, message):
+        """Build the entry for a patch, cover letter or comment."""
+        if isinstance(message, Patch):
+            return cls(
+                project_id=message.project_id,
+                msgid=message.msgid,
+                patch=message,
+            )
+        elif isinstance(message, Cover):
+            return cls(
+                project_id=message.project_id,
+                msgid=message.msgid,
+                cover=message,
+            )
+        elif isinstance(message, PatchComment):
+            return cls(
+                project_id=message.patch.project_id,
+                msgid=message.msgid,
+                patch=message.patch,
+                patch_comment=message,
+            )
+        elif isinstance(message, CoverComment):
+            return cls(
+                project_id=message.cover.project_id,
+                msgid=message.msgid,
+                cover=message.cover,
+                cover_comment=message,
+            )
+
+        raise TypeError('Unsupported message type: %r' % type(message))
+
+    @property
+    def kind(self):
+        if self.patch_comment_id:
+            return self.KIND_PATCH_COMMENT
+        elif self.cover_comment_id:
+            return self.KIND_COVER_COMMENT
+        elif self.patch_id:
+            return self.KIND_PATCH
+        return self.KIND_COVER
+
+    def __str__(self):
+        return self.msgid
+
+    class Meta:
+        verbose_name = 'Message ID'
+        indexes = [
+            models.Index(
+                name='msgid_project_idx', fields=['msgid', 'project']
+            ),
+        ]
+
+
 class Bundle(models.Model):
     owner = models.ForeignKey(
         User,
@@ -1114,6 +1518,14 @@ class Check(models.Model):
         (STATE_WARNING, 'warning'),
         (STATE_FAIL, 'fail'),
     )
+    # the state of a patch is that of the first of these any of its checks
+    # are in
+    STATE_PRECEDENCE = (
+        STATE_FAIL,
+        STATE_WARNING,
+        STATE_PENDING,
+        STATE_SUCCESS,
+    )
 
     patch = models.ForeignKey(Patch, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -1150,6 +1562,15 @@ class Check(models.Model):
     def __str__(self):
         return '%s (%s)' % (self.context, self.get_state_display())
 
+    class Meta:
+        indexes = [
+            # used to find the latest check of a context when adding checks
+            models.Index(
+                fields=['patch', 'context', 'user', 'date'],
+                name='check_latest_idx',
+            ),
+        ]
+
 
 class Event(models.Model):
     """An event raised against a patch.
@@ -1386,3 +1807,285 @@ class PatchChangeNotification(models.Model):
     )
     last_modified = models.DateTimeField(default=tz_utils.now)
     orig_state = models.ForeignKey(State, on_delete=models.CASCADE)
+
+    @classmethod
+    def bulk_record(cls, orig_states):
+        """Record the state changes of many patches at once.
+
+        This does what the ``patch_change_callback`` signal handler does when
+        each patch is saved.
+
+        Args:
+            orig_states (dict): The IDs of the states the patches had before
+                the change, keyed by patch ID. The patches are expected to be
+                in their new state already.
+        """
+        now = tz_utils.now()
+
+        notifications = cls.objects.filter(patch__in=list(orig_states))
+        existing = set(notifications.values_list('patch_id', flat=True))
+
+        # patches back in their original state no longer need a notification
+        notifications.filter(orig_state=F('patch__state')).delete()
+        notifications.update(last_modified=now)
+
+        cls.objects.bulk_create(
+            cls(patch_id=patch_id, orig_state_id=state_id, last_modified=now)
+            for patch_id, state_id in orig_states.items()
+            if patch_id not in existing
+        )
+
+
+class PatchCount(models.Model):
+    """The number of patches of a project with a given state and delegate.
+
+    These are updated as patches are created, changed and deleted, so that
+    the patches of a project needn't be counted each time a page shows how
+    many there are. As the counts are updated without locking, the same
+    patches may be counted by several rows: use :meth:`total` to get them.
+    """
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    state = models.ForeignKey(State, null=True, on_delete=models.CASCADE)
+    delegate = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    archived = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    # the fields of patches counted, which counts can be filtered on
+    FIELDS = ('project', 'state', 'delegate', 'archived')
+
+    @staticmethod
+    def get_key(patch):
+        """Get the values of the fields counted for a patch."""
+        return (
+            patch.project_id,
+            patch.state_id,
+            patch.delegate_id,
+            patch.archived,
+        )
+
+    @classmethod
+    def add(cls, changes):
+        """Add to the counts.
+
+        Args:
+            changes (dict): The numbers of patches to add, or remove, keyed by
+                the values of the fields counted, as given by
+                :meth:`get_key`
+        """
+        for key, count in changes.items():
+            if not count:
+                continue
+
+            values = dict(
+                zip(('project_id', 'state_id', 'delegate_id', 'archived'), key)
+            )
+            counts = cls.objects.filter(**values)
+            # rows are only created for patches added: a missing row for
+            # patches removed means the project, state or delegate is itself
+            # being deleted, along with its counts
+            if not counts.update(count=F('count') + count) and count > 0:
+                cls.objects.create(count=count, **values)
+
+    @classmethod
+    def total(cls, **kwargs):
+        """Get the number of patches matching the filters given.
+
+        Filters are given as for a patch query set, and may only use the
+        fields counted.
+
+        Returns:
+            The number of patches, or None if the filters given use other
+            fields.
+        """
+        for key in kwargs:
+            if key.split(LOOKUP_SEP)[0] not in cls.FIELDS:
+                return None
+
+        total = cls.objects.filter(**kwargs).aggregate(
+            total=models.Sum('count')
+        )['total']
+
+        return total or 0
+
+    @classmethod
+    def refresh(cls, project=None):
+        """Count the patches again, fixing any counts that are wrong.
+
+        Counts may be wrong if patches are changed without sending signals,
+        for example using ``QuerySet.update``.
+
+        Args:
+            project (Project): The project to count the patches of, or None
+                to count those of every project
+
+        Returns:
+            The number of counts fixed.
+        """
+        patches = Patch.objects.all()
+        counts = cls.objects.all()
+        if project:
+            patches = patches.filter(project=project)
+            counts = counts.filter(project=project)
+
+        changes = Counter()
+        for *key, count in (
+            patches.values_list(*cls.FIELDS)
+            .annotate(count=models.Count('id'))
+            .order_by()
+        ):
+            changes[tuple(key)] += count
+
+        for *key, count in counts.values_list(*cls.FIELDS, 'count'):
+            changes[tuple(key)] -= count
+
+        changes = {key: count for key, count in changes.items() if count}
+        cls.add(changes)
+
+        return len(changes)
+
+
+class PatchSearch(models.Model):
+    """The text of a patch that is searched.
+
+    The fields of patches may be stored compressed, so the name and commit
+    message of patches are stored again here, as text the database can index.
+    Diffs, which are most of the text of patches, aren't searched. The
+    full-text index of this is specific to each database, see
+    :mod:`patchwork.search`.
+    """
+
+    patch = models.OneToOneField(
+        Patch,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    document = models.TextField()
+
+    @staticmethod
+    def get_document(patch):
+        return '\n'.join([patch.name, patch.content or ''])
+
+    @classmethod
+    def index(cls, patches):
+        """Store the text searched for patches, replacing any stored before.
+
+        Args:
+            patches (list): The saved patches to index, with their name and
+                content loaded
+        """
+        kwargs = {}
+        if connection.features.supports_update_conflicts_with_target:
+            kwargs['unique_fields'] = ['patch']
+
+        cls.objects.bulk_create(
+            [
+                cls(patch=patch, document=cls.get_document(patch))
+                for patch in patches
+            ],
+            update_conflicts=True,
+            update_fields=['document'],
+            **kwargs,
+        )
+
+
+def _glob_to_regex(pattern):
+    """Translate a glob to a regex that all databases support.
+
+    This follows the syntax of ``fnmatch``, as used by delegation rules: ``*``
+    matches any characters, including ``/``.
+    """
+    regex = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            regex.append('.*')
+        elif c == '?':
+            regex.append('.')
+        elif c == '[':
+            # a ']' first in the set, after any '!', is part of it
+            j = i + 1 if pattern[i : i + 1] == '!' else i
+            j = j + 1 if pattern[j : j + 1] == ']' else j
+            end = pattern.find(']', j)
+            if end < 0:
+                regex.append(re.escape(c))
+                continue
+
+            # escape the characters that are special in sets of regexes
+            chars = re.sub(r'([\\&~|[])', r'\\\1', pattern[i:end])
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            elif chars.startswith('^'):
+                chars = '\\' + chars
+            regex.append('[%s]' % chars)
+            i = end + 1
+        else:
+            regex.append(re.escape(c))
+
+    return '^%s$' % ''.join(regex)
+
+
+class PatchFile(models.Model):
+    """A file changed by a patch.
+
+    These are found when patches are received, allowing patches to be found
+    by the files they change without parsing their diffs.
+    """
+
+    patch = models.ForeignKey(
+        Patch,
+        on_delete=models.CASCADE,
+        related_name='files',
+        related_query_name='file',
+    )
+    path = models.CharField(max_length=255, db_index=True)
+
+    @classmethod
+    def add(cls, files):
+        """Store the files changed by patches.
+
+        Args:
+            files (list): Pairs of a saved patch and the names of the files
+                it changes, as found by ``parser.find_filenames``
+        """
+        cls.objects.bulk_create(
+            [
+                cls(patch=patch, path=path)
+                for patch, filenames in files
+                # paths are truncated to fit, which can make them the same
+                for path in sorted({filename[:255] for filename in filenames})
+            ]
+        )
+
+    @classmethod
+    def match(cls, pattern):
+        """Get the files matching a path.
+
+        Args:
+            pattern (str): A glob, if it contains any of ``*?[``, else a
+                prefix of the paths to match, such as a directory
+
+        Returns:
+            A queryset of the files matching.
+        """
+        # the start of a glob, before any wildcards, can be found using the
+        # index of paths
+        prefix = re.split(r'[*?[]', pattern, maxsplit=1)[0]
+
+        files = cls.objects.filter(path__startswith=prefix)
+        if prefix != pattern:
+            regex = _glob_to_regex(pattern)
+            try:
+                re.compile(regex)
+            except re.error:  # e.g. a range of characters in reverse
+                return cls.objects.none()
+
+            files = files.filter(path__regex=regex)
+
+        return files
+
+    class Meta:
+        unique_together = [('patch', 'path')]
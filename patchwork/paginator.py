@@ -5,6 +5,10 @@
 
 from django.conf import settings
 from django.core import paginator
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
 
 
 DEFAULT_ITEMS_PER_PAGE = 100
@@ -20,14 +24,40 @@ ADJACENT_PAGES = 1
 #  http://blog.localkinegrinds.com/2007/09/06/digg-style-pagination-in-django/
 
 
-class Paginator(paginator.Paginator):
-    def __init__(self, request, objects):
-        items_per_page = settings.DEFAULT_ITEMS_PER_PAGE
+def get_items_per_page(request):
+    if request.user.is_authenticated:
+        return request.user.profile.items_per_page
+
+    return settings.DEFAULT_ITEMS_PER_PAGE
+
+
+def get_count(objects, limit=None):
+    """Count objects, giving up if there are more than the limit given.
+
+    Only the first objects matching, up to the limit, are counted, so the
+    cost of this doesn't depend on the number of objects.
+
+    Returns:
+        The number of objects, or None if there are more than the limit.
+    """
+    if limit is None:
+        return objects.count()
+
+    count = objects.order_by().values('pk')[: limit + 1].count()
+    if count > limit:
+        return None
 
-        if request.user.is_authenticated:
-            items_per_page = request.user.profile.items_per_page
+    return count
 
-        super().__init__(objects, items_per_page)
+
+class Paginator(paginator.Paginator):
+    def __init__(self, request, objects, count=None):
+        super().__init__(objects, get_items_per_page(request))
+
+        # avoid counting the objects again if we already know how many
+        # there are
+        if count is not None:
+            self.count = count
 
         try:
             page_no = int(request.GET.get('page', 1))
@@ -94,3 +124,184 @@ class Paginator(paginator.Paginator):
         self.long_page = (
             len(self.current_page.object_list) >= LONG_PAGE_THRESHOLD
         )
+
+
+def _is_nullable(model, path):
+    """Check whether a field, possibly of a related model, can be NULL."""
+    for name in path.split(LOOKUP_SEP):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return True
+
+        if field.null:
+            return True
+
+        model = field.related_model
+
+    return False
+
+
+def _get_cursor(request, param):
+    try:
+        return int(request.GET[param])
+    except (KeyError, ValueError):
+        return None
+
+
+class KeysetPage(object):
+    """A page of a :class:`KeysetPaginator`.
+
+    This provides the parts of the interface of Django's pages which don't
+    depend on page numbers.
+    """
+
+    number = None
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def previous_cursor(self):
+        """The ID of the first object, to get the previous page with."""
+        return self.object_list[0].pk if self.object_list else None
+
+    @property
+    def next_cursor(self):
+        """The ID of the last object, to get the next page with."""
+        return self.object_list[-1].pk if self.object_list else None
+
+
+class KeysetPaginator(object):
+    """Paginate objects using the position of the objects shown.
+
+    Rather than skipping the objects of the previous pages using an offset,
+    pages are fetched by seeking to the objects following the last object
+    shown, given by the ``after`` parameter, or preceding the first object
+    shown, given by the ``before`` parameter. The objects don't need to be
+    counted, and fetching a page costs the same whatever its position, but
+    pages can only be reached from the adjacent ones.
+
+    ``ordering`` is a list of ``(field, reversed)`` tuples, which must end
+    with a unique field. NULL values are ordered before other values.
+    """
+
+    keyset = True
+    count = None
+    num_pages = None
+
+    def __init__(self, request, objects, ordering):
+        self.per_page = get_items_per_page(request)
+        self.ordering = [
+            (path, reverse, _is_nullable(objects.model, path))
+            for path, reverse in ordering
+        ]
+
+        model = objects.model
+        page = None
+
+        before = _get_cursor(request, 'before')
+        after = _get_cursor(request, 'after')
+
+        if before is not None:
+            objs = self._seek(objects, model, before, reverse=True)
+            if objs is not None and len(objs) >= self.per_page:
+                objs.reverse()
+                page = KeysetPage(
+                    objs[-self.per_page :],
+                    self,
+                    has_previous=len(objs) > self.per_page,
+                    has_next=True,
+                )
+            # otherwise we've gone back to the start of the list
+        elif after is not None:
+            objs = self._seek(objects, model, after)
+            if objs is not None:
+                page = KeysetPage(
+                    objs[: self.per_page],
+                    self,
+                    has_previous=True,
+                    has_next=len(objs) > self.per_page,
+                )
+
+        if page is None:
+            objs = list(
+                objects.order_by(*self._order_by())[: self.per_page + 1]
+            )
+            page = KeysetPage(
+                objs[: self.per_page],
+                self,
+                has_previous=False,
+                has_next=len(objs) > self.per_page,
+            )
+
+        self.current_page = page
+        self.long_page = len(page.object_list) >= LONG_PAGE_THRESHOLD
+
+    def _order_by(self, reverse=False):
+        order_by = []
+        for path, descending, nullable in self.ordering:
+            descending ^= reverse
+            if not nullable:
+                order_by.append('-' + path if descending else path)
+            elif descending:
+                order_by.append(F(path).desc(nulls_last=True))
+            else:
+                order_by.append(F(path).asc(nulls_first=True))
+
+        return order_by
+
+    def _seek(self, objects, model, pk, reverse=False):
+        """Get the objects following, or preceding, the object given.
+
+        One more object than fits on a page is fetched, to find out whether
+        there's another page. The object itself needn't be one of the objects
+        paginated, as it may since have been changed.
+
+        Returns:
+            A list of the objects, or None if the object doesn't exist.
+        """
+        paths = [path for path, _, _ in self.ordering]
+        key = model._base_manager.filter(pk=pk).values_list(*paths).first()
+        if key is None:
+            return None
+
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        query = Q()
+        equal = Q()
+        for (path, descending, nullable), value in zip(self.ordering, key):
+            descending ^= reverse
+            if value is None:
+                if not descending:
+                    query |= equal & Q(**{path + '__isnull': False})
+                equal &= Q(**{path + '__isnull': True})
+                continue
+
+            if descending:
+                following = Q(**{path + '__lt': value})
+                if nullable:
+                    following |= Q(**{path + '__isnull': True})
+            else:
+                following = Q(**{path + '__gt': value})
+
+            query |= equal & following
+            equal &= Q(**{path: value})
+
+        objects = objects.filter(query).order_by(*self._order_by(reverse))
+
+        return list(objects[: self.per_page + 1])
@@ -11,13 +11,15 @@ from email.header import make_header
 from email.utils import mktime_tz
 from email.utils import parsedate_tz
 from email.errors import HeaderParseError
-from fnmatch import fnmatch
+import fnmatch
 import logging
+import os
 import re
+import time
 from urllib.parse import urlparse, parse_qs
+import zlib
 
 from django.contrib.auth.models import User
-from django.db.utils import IntegrityError
 from django.db import transaction
 from django.utils import timezone as tz_utils
 from django.urls import resolve, Resolver404
@@ -25,12 +27,14 @@ from django.urls import resolve, Resolver404
 from patchwork.models import Cover
 from patchwork.models import CoverComment
 from patchwork.models import DelegationRule
-from patchwork.models import get_default_initial_patch_state
+from patchwork.models import MessageID
 from patchwork.models import Patch
 from patchwork.models import PatchComment
+from patchwork.models import PatchFile
 from patchwork.models import Person
 from patchwork.models import Project
 from patchwork.models import Series
+from patchwork.models import SeriesLock
 from patchwork.models import SeriesReference
 from patchwork.models import State
 
@@ -46,6 +50,19 @@ list_id_headers = ['List-ID', 'X-Mailing-List', 'X-list']
 # (such as when the mail is not threaded)
 SERIES_DELAY_INTERVAL = 20
 
+# How many rows of the 'SeriesLock' table can be used to serialize the
+# assignment of patches to series?
+#
+# Patches of unrelated series that hash to the same row have to wait for each
+# other, so this should be much larger than the number of parallel parsers
+SERIES_LOCK_SLOTS = 1024
+
+# How many seconds may projects, states and delegation rules be cached for?
+#
+# Changes made by other processes, such as the web interface, only take
+# effect for long-running parsers, such as 'parsemaild', after this long
+CACHE_TIMEOUT = 60
+
 # @see https://git-scm.com/docs/git-diff#_generating_patches_with_p
 EXTENDED_HEADER_LINES = (
     'old mode ',
@@ -70,8 +87,157 @@ class DuplicateMailError(Exception):
         self.msgid = msgid
 
 
-class DuplicateSeriesError(Exception):
-    pass
+class DelegationMatcher(object):
+    """Match filenames against a project's delegation rules.
+
+    The result is the same as that of trying each rule's pattern in turn
+    using ``fnmatch``, but it does not depend on the number of rules. Rules
+    without wildcards are looked up in a dict, rules consisting of a literal
+    prefix followed by ``*`` are looked up in a prefix trie and all other
+    rules are combined into a single regular expression.
+
+    Args:
+        rules (list of `DelegationRule`): Rules in order of priority.
+    """
+
+    wildcard_re = re.compile(r'[*?[]')
+
+    def __init__(self, rules):
+        self.users = []
+        self.exact = {}
+        self.prefixes = {}
+        self.first_pattern = None
+        self.pattern = None
+
+        patterns = []
+        for index, rule in enumerate(rules):
+            self.users.append(rule.user)
+            path = os.path.normcase(rule.path)
+
+            wildcard = self.wildcard_re.search(path)
+            if not wildcard:
+                self.exact.setdefault(path, index)
+            elif wildcard.start() == len(path) - 1 and path[-1] == '*':
+                node = self.prefixes
+                for char in path[:-1]:
+                    node = node.setdefault(char, {})
+                # an empty key marks the end of a prefix; it can't be a char
+                node.setdefault('', index)
+            else:
+                if self.first_pattern is None:
+                    self.first_pattern = index
+                patterns.append(
+                    '(?P<rule%d>%s)' % (index, fnmatch.translate(path))
+                )
+
+        if patterns:
+            # alternatives are tried in order, so the first match wins
+            self.pattern = re.compile('|'.join(patterns))
+
+    def match(self, filename):
+        """Return the user a file should be delegated to, if any."""
+        filename = os.path.normcase(filename)
+        best = self.exact.get(filename)
+
+        node = self.prefixes
+        for char in filename:
+            index = node.get('')
+            if index is not None and (best is None or index < best):
+                best = index
+
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            index = node.get('')
+            if index is not None and (best is None or index < best):
+                best = index
+
+        if self.pattern and (best is None or best > self.first_pattern):
+            match = self.pattern.match(filename)
+            if match:
+                index = int(match.lastgroup[4:])
+                if best is None or index < best:
+                    best = index
+
+        if best is None:
+            return None
+
+        return self.users[best]
+
+
+class ParserCache(object):
+    """A cache of the mostly static data needed to parse mails.
+
+    Projects, states and delegation rules rarely change, so they are loaded
+    once and then reused for up to ``CACHE_TIMEOUT`` seconds. The cache is
+    cleared whenever one of these is saved or deleted in this process.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._entries = {}
+
+    def _get(self, key, load):
+        entries = self._entries
+        now = time.monotonic()
+
+        entry = entries.get(key)
+        if entry is None or entry[1] <= now:
+            entry = (load(), now + CACHE_TIMEOUT)
+            entries[key] = entry
+
+        return entry[0]
+
+    @staticmethod
+    def _load_projects():
+        projects = {}
+        for project in Project.objects.all():
+            subject_re = None
+            if project.subject_match:
+                subject_re = re.compile(
+                    project.subject_match, re.MULTILINE | re.IGNORECASE
+                )
+            projects.setdefault(project.listid, []).append(
+                (project, subject_re)
+            )
+        return projects
+
+    def get_projects(self, list_id):
+        """Return the projects for a list ID and their compiled regexes."""
+        return self._get('projects', self._load_projects).get(list_id, [])
+
+    @staticmethod
+    def _load_states():
+        return {state.name.lower(): state for state in State.objects.all()}
+
+    def get_state(self, name):
+        """Return the state with the given name, ignoring case, if any."""
+        return self._get('states', self._load_states).get(name.lower())
+
+    def get_default_state(self):
+        """Return the initial state of new patches."""
+        for state in self._get('states', self._load_states).values():
+            if state.ordering == 0:
+                return state
+
+        raise State.DoesNotExist('No default state found')
+
+    def get_delegation_matcher(self, project):
+        """Return a matcher for a project's delegation rules."""
+        return self._get(
+            ('rules', project.id),
+            lambda: DelegationMatcher(
+                DelegationRule.objects.filter(project=project).select_related(
+                    'user'
+                )
+            ),
+        )
+
+
+cache = ParserCache()
 
 
 def normalise_space(value):
@@ -162,14 +328,11 @@ def find_project_by_id_and_subject(list_id, subject):
     given `list_id` and empty `subject_match` field serves as a default
     (in case it exists) if no other match is found.
     """
-    projects = Project.objects.filter(listid=list_id)
     default = None
-    for project in projects:
-        if not project.subject_match:
+    for project, subject_re in cache.get_projects(list_id):
+        if not subject_re:
             default = project
-        elif re.search(
-            project.subject_match, subject, re.MULTILINE | re.IGNORECASE
-        ):
+        elif subject_re.search(subject):
             return project
 
     return default
@@ -252,12 +415,17 @@ def _find_series_by_references(project, mail):
     msg_id = find_message_id(mail)
     refs = [msg_id] + find_references(mail)
 
+    references = {
+        reference.msgid: reference
+        for reference in SeriesReference.objects.filter(
+            msgid__in=[ref[:255] for ref in refs],
+            project=project,
+        ).select_related('series')
+    }
+
     for ref in refs:
         try:
-            series = SeriesReference.objects.get(
-                msgid=ref[:255],
-                project=project,
-            ).series
+            series = references[ref[:255]].series
 
             if series.version != version:
                 # if the versions don't match, at least make sure these were
@@ -273,7 +441,7 @@ def _find_series_by_references(project, mail):
 
             # we want to return a queryset like '_find_series_by_markers'
             return Series.objects.filter(id=series.id)
-        except SeriesReference.DoesNotExist:
+        except KeyError:
             continue
 
 
@@ -318,6 +486,27 @@ def _find_series_by_markers(project, mail, author):
     )
 
 
+def lock_series(project, keys):
+    """Serialize the assignment of patches to series.
+
+    Lock the rows of ``SeriesLock`` that the given keys hash to until the end
+    of the current transaction. Rows are always locked in the same order to
+    avoid deadlocks. This has no effect on databases without row locks, such
+    as SQLite, but those only allow one writer at a time anyway.
+
+    Args:
+        project (patchwork.Project): The project the series belongs to
+        keys (list of tuple): Keys identifying the series
+    """
+    slots = {
+        zlib.crc32(repr((project.id,) + tuple(key)).encode())
+        % SERIES_LOCK_SLOTS
+        for key in keys
+    }
+    for slot in sorted(slots):
+        SeriesLock.objects.select_for_update().get_or_create(slot=slot)
+
+
 def find_series(project, mail, author):
     """Find a series, if any, for a given patch.
 
@@ -428,7 +617,15 @@ def get_original_sender(mail, name, email):
     return (name, email)
 
 
-def get_or_create_author(mail, project=None):
+def find_author(mail, project=None):
+    """Extract the name and email address of the author of a mail.
+
+    Returns:
+        A (name, email) tuple. The name may be None.
+
+    Raises:
+        ValueError if the 'From' header is missing or invalid.
+    """
     from_header = clean_header(mail.get('From'))
 
     if not from_header:
@@ -446,6 +643,12 @@ def get_or_create_author(mail, project=None):
     if project and email.lower() == project.listemail.lower():
         name, email = get_original_sender(mail, name, email)
 
+    return name, email
+
+
+def get_or_create_author(mail, project=None):
+    name, email = find_author(mail, project)
+
     # this correctly handles the case where we lose the race to create
     # the person and another process beats us to it. (If the record
     # does not exist, g_o_c invokes _create_object_from_params which
@@ -723,72 +926,86 @@ def find_comment_content(mail):
     return None, commentbuf
 
 
-def find_patch_for_comment(project, refs):
-    for ref in refs:
-        ref = ref[:255]
-        # first, check for a direct reply
-        try:
-            patch = Patch.objects.get(project=project, msgid=ref)
-            return patch
-        except Patch.DoesNotExist:
-            pass
+def _find_message_ids(project, refs):
+    """Find the indexed messages referred to by a list of message IDs.
 
-        # see if we have comments that refer to a patch
-        try:
-            comment = PatchComment.objects.get(
-                patch__project=project,
-                msgid=ref,
-            )
-            return comment.patch
-        except PatchComment.MultipleObjectsReturned:
-            # NOTE(stephenfin): This is a artifact of prior lack of support
-            # for cover letters in Patchwork. Previously all replies to
-            # patches were saved as comments. However, it's possible that
-            # someone could have created a new series as a reply to one of the
-            # comments on the original patch series. For example,
-            # '2015-November/002096.html' from the Patchwork archives. In this
-            # case, reparsing the archives will result in creation of a cover
-            # letter with the same message ID as the existing comment. Follow
-            # up comments will then apply to both this cover letter and the
-            # linked patch from the comment previously created. We choose to
-            # apply the comment to the cover letter. Note that this only
-            # happens when running 'parsearchive' or similar, so it should not
-            # affect every day use in any way.
-            comments = PatchComment.objects.filter(
-                patch__project=project,
-                msgid=ref,
-            )
-            # The latter item will be the cover letter
-            return comments.reverse()[0].patch
-        except PatchComment.DoesNotExist:
-            pass
+    Returns:
+        A dict mapping message IDs to lists of `MessageID` instances
+    """
+    message_ids = {}
+    for message_id in MessageID.objects.filter(
+        project=project, msgid__in=[ref[:255] for ref in refs]
+    ):
+        message_ids.setdefault(message_id.msgid, []).append(message_id)
+    return message_ids
 
-    return None
 
+def _find_parent_for_comment(message_ids, refs, kind):
+    """Find the ID of the patch or cover letter that a comment refers to.
 
-def find_cover_for_comment(project, refs):
+    Args:
+        message_ids (dict): The result of ``_find_message_ids``
+        refs (list): Message IDs referred to by the comment, closest first
+        kind (str): Either 'patch' or 'cover'
+
+    Returns:
+        The ID of the patch or cover letter, if any
+    """
     for ref in refs:
-        ref = ref[:255]
-        # first, check for a direct reply
-        try:
-            cover = Cover.objects.get(project=project, msgid=ref)
-            return cover
-        except Cover.DoesNotExist:
-            pass
+        parent_id = latest_id = None
+        for message_id in message_ids.get(ref[:255], []):
+            if getattr(message_id, kind + '_id') is None:
+                continue
 
-        # see if we have comments that refer to a patch
-        try:
-            comment = CoverComment.objects.get(
-                cover__project=project,
-                msgid=ref,
-            )
-            return comment.cover
-        except CoverComment.DoesNotExist:
-            pass
+            # first, check for a direct reply
+            if getattr(message_id, kind + '_comment_id') is None:
+                parent_id = getattr(message_id, kind + '_id')
+                break
+
+            # see if we have comments that refer to a patch or cover letter
+            #
+            # NOTE(stephenfin): There can be more than one. This is a
+            # artifact of prior lack of support for cover letters in
+            # Patchwork. Previously all replies to patches were saved as
+            # comments. However, it's possible that someone could have
+            # created a new series as a reply to one of the comments on the
+            # original patch series. For example, '2015-November/002096.html'
+            # from the Patchwork archives. In this case, reparsing the
+            # archives will result in creation of a cover letter with the
+            # same message ID as the existing comment. Follow up comments
+            # will then apply to both this cover letter and the linked patch
+            # from the comment previously created. We choose to apply the
+            # comment to the cover letter, which was indexed last. Note
+            # that this only happens when running 'parsearchive' or similar,
+            # so it should not affect every day use in any way.
+            if latest_id is None or message_id.id > latest_id:
+                parent_id = getattr(message_id, kind + '_id')
+                latest_id = message_id.id
+
+        if parent_id is not None:
+            return parent_id
 
     return None
 
 
+def find_patch_for_comment(project, refs):
+    message_ids = _find_message_ids(project, refs)
+    patch_id = _find_parent_for_comment(message_ids, refs, 'patch')
+    if patch_id is None:
+        return None
+
+    return Patch.objects.get(id=patch_id)
+
+
+def find_cover_for_comment(project, refs):
+    message_ids = _find_message_ids(project, refs)
+    cover_id = _find_parent_for_comment(message_ids, refs, 'cover')
+    if cover_id is None:
+        return None
+
+    return Cover.objects.get(id=cover_id)
+
+
 def split_prefixes(prefix):
     """Turn a prefix string into a list of prefix tokens."""
     tokens = []
@@ -1142,27 +1359,21 @@ def find_state(mail):
     """Return the state with the given name or the default."""
     state_name = clean_header(mail.get('X-Patchwork-State', ''))
     if state_name:
-        try:
-            return State.objects.get(name__iexact=state_name)
-        except State.DoesNotExist:
-            pass
-    return get_default_initial_patch_state()
+        state = cache.get_state(state_name)
+        if state:
+            return state
+    return cache.get_default_state()
 
 
 def find_delegate_by_filename(project, filenames):
     if not filenames:
         return None
 
-    rules = list(DelegationRule.objects.filter(project=project))
-
+    matcher = cache.get_delegation_matcher(project)
     patch_delegate = None
 
     for filename in filenames:
-        file_delegate = None
-        for rule in rules:
-            if fnmatch(filename, rule.path):
-                file_delegate = rule.user
-                break
+        file_delegate = matcher.match(filename)
 
         if file_delegate is None:
             return None
@@ -1261,12 +1472,25 @@ def parse_mail(mail, list_id=None):
         # we delay the saving until we know we have a patch.
         author = get_or_create_author(mail, project)
 
+        filenames = find_filenames(diff) if diff else []
+
         delegate = find_delegate_by_header(mail)
-        if not delegate and diff:
-            filenames = find_filenames(diff)
+        if not delegate and filenames:
             delegate = find_delegate_by_filename(project, filenames)
 
         with transaction.atomic():
+            # patches from the same series may be received at once by
+            # different processes. Make them wait for each other so they
+            # don't each create a series. Such patches share either the
+            # start of their thread or, if they aren't threaded, their
+            # series markers. This must come first so that, on databases
+            # using snapshots, we see everything committed before we got
+            # the lock.
+            keys = [('thread', (refs or [msgid])[-1][:255])]
+            if n:
+                keys.append(('markers', author.id, version, n))
+            lock_series(project, keys)
+
             if Patch.objects.filter(project=project, msgid=msgid):
                 raise DuplicateMailError(msgid=msgid)
 
@@ -1283,112 +1507,72 @@ def parse_mail(mail, list_id=None):
                 delegate=delegate,
                 state=find_state(mail),
             )
+            PatchFile.add([(patch, filenames)])
             logger.debug('Patch saved')
 
-        for attempt in range(1, 11):  # arbitrary retry count
-            try:
-                with transaction.atomic():
-                    # if we don't have a series marker, we will never have an
-                    # existing series to match against.
-                    series = None
-                    if n:
-                        series = find_series(project, mail, author)
-                        if len(series) > 1:
-                            # if this isn't our final attempt, go again
-                            if attempt != 10:
-                                raise DuplicateSeriesError()
-
-                            # if it is and we still haven't been able to save a
-                            # series, it's time to give up and just save yet
-                            # another duplicate - find the best possible match
-                            for series in series.order_by('-date'):
-                                if Patch.objects.filter(
-                                    series=series, number=x
-                                ).count():
-                                    continue
-                                break
-                            else:
-                                series = None
-                        elif len(series) == 1:
-                            series = series.first()
-                    else:
-                        x = n = 1
-
-                    # We will create a new series if:
-                    # - there is no existing series to assign this patch to, or
-                    # - there is an existing series, but it already has a patch
-                    #   with this number in it
-                    if (
-                        not series
-                        or Patch.objects.filter(
+            # if we don't have a series marker, we will never have an
+            # existing series to match against.
+            series = None
+            if n:
+                series = find_series(project, mail, author)
+                if len(series) > 1:
+                    # there are already duplicate series, created by an
+                    # older version or by hand - find the best possible match
+                    for series in series.order_by('-date'):
+                        if Patch.objects.filter(
                             series=series, number=x
-                        ).count()
-                    ):
-                        series = Series.objects.create(
-                            project=project,
-                            date=date,
-                            submitter=author,
-                            version=version,
-                            total=n,
-                        )
-
-                        # NOTE(stephenfin) We must save references for series.
-                        # We do this to handle the case where a later patch is
-                        # received first. Without storing references, it would
-                        # not be possible to identify the relationship between
-                        # patches as the earlier patch does not reference the
-                        # later one.
-                        for ref in refs + [msgid]:
-                            ref = ref[:255]
-                            # We could have a ref to a previous series. (For
-                            # example, a series sent in reply to another
-                            # series.) That should not create a series ref for
-                            # this series, so check for the msg-id only, not
-                            # the msg-id/series pair. Use get_or_create to
-                            # avoid races when multiple parsemail processes run
-                            # in parallel.
-                            SeriesReference.objects.get_or_create(
-                                msgid=ref,
-                                project=project,
-                                defaults={'series': series},
-                            )
-
-                        # attempt to pull the series in again, raising an
-                        # exception if we lost the race when creating a series
-                        # and force us to go through this again
-                        if (
-                            attempt != 10
-                            and find_series(project, mail, author).count() > 1
-                        ):
-                            raise DuplicateSeriesError()
-
-                    break
-            except (IntegrityError, DuplicateSeriesError):
-                # we lost the race so go again
-                logger.warning(
-                    'Conflict while saving series. This is '
-                    'probably because multiple patches belonging '
-                    'to the same series have been received at '
-                    'once. Trying again (attempt %02d/10)',
-                    attempt,
+                        ).count():
+                            continue
+                        break
+                    else:
+                        series = None
+                elif len(series) == 1:
+                    series = series.first()
+            else:
+                x = n = 1
+
+            # We will create a new series if:
+            # - there is no existing series to assign this patch to, or
+            # - there is an existing series, but it already has a patch with
+            #   this number in it
+            if (
+                not series
+                or Patch.objects.filter(series=series, number=x).count()
+            ):
+                series = Series.objects.create(
+                    project=project,
+                    date=date,
+                    submitter=author,
+                    version=version,
+                    total=n,
                 )
-        else:
-            # we failed to save the series so return the series-less patch
-            logger.warning(
-                'Failed to save series. Your patch with message ID '
-                '%s has been saved but this should not happen. '
-                'Please report this as a bug and include logs',
-                msgid,
-            )
-            return patch
 
-        # add to a series if we have found one, and we have a numbered
-        # patch. Don't add unnumbered patches (for example diffs sent
-        # in reply, or just messages with random refs/in-reply-tos)
-        if series and x:
-            # TODO(stephenfin): Remove 'series' from the conditional as we will
-            # always have a series
-            series.add_patch(patch, x)
+                # NOTE(stephenfin) We must save references for series. We do
+                # this to handle the case where a later patch is received
+                # first. Without storing references, it would not be possible
+                # to identify the relationship between patches as the earlier
+                # patch does not reference the later one.
+                for ref in refs + [msgid]:
+                    ref = ref[:255]
+                    # We could have a ref to a previous series. (For example,
+                    # a series sent in reply to another series.) That should
+                    # not create a series ref for this series, so check for
+                    # the msg-id only, not the msg-id/series pair. Use
+                    # get_or_create as patches of another thread could refer
+                    # to the same message.
+                    SeriesReference.objects.get_or_create(
+                        msgid=ref,
+                        project=project,
+                        defaults={'series': series},
+                    )
+
+            # add to a series if we have found one, and we have a numbered
+            # patch. Don't add unnumbered patches (for example diffs sent
+            # in reply, or just messages with random refs/in-reply-tos)
+            if series and x:
+                # TODO(stephenfin): Remove 'series' from the conditional as we
+                # will always have a series
+                series.add_patch(patch, x)
 
         # parse patch dependencies
         series.add_dependencies(parse_depends_on(message))
@@ -1415,37 +1599,50 @@ def parse_mail(mail, list_id=None):
         if is_cover_letter:
             author = get_or_create_author(mail, project)
 
-            # we don't use 'find_series' here as a cover letter will
-            # always be the first item in a thread, thus the references
-            # could only point to a different series or unrelated
-            # message
-            try:
-                series = SeriesReference.objects.get(
-                    msgid=msgid, project=project
-                ).series
-            except SeriesReference.DoesNotExist:
-                series = None
-
-            if not series:
-                series = Series.objects.create(
-                    project=project,
-                    date=date,
-                    submitter=author,
-                    version=version,
-                    total=n,
-                )
-
-                # we don't save the in-reply-to or references fields
-                # for a cover letter, as they can't refer to the same
-                # series
-                SeriesReference.objects.get_or_create(
-                    msgid=msgid, project=project, defaults={'series': series}
+            with transaction.atomic():
+                # see above. Patches may refer to either the cover letter or
+                # the start of its thread.
+                lock_series(
+                    project,
+                    [
+                        ('thread', msgid[:255]),
+                        ('thread', (refs or [msgid])[-1][:255]),
+                        ('markers', author.id, version, n),
+                    ],
                 )
 
-            with transaction.atomic():
                 if Cover.objects.filter(project=project, msgid=msgid):
                     raise DuplicateMailError(msgid=msgid)
 
+                # we don't use 'find_series' here as a cover letter will
+                # always be the first item in a thread, thus the references
+                # could only point to a different series or unrelated
+                # message
+                try:
+                    series = SeriesReference.objects.get(
+                        msgid=msgid, project=project
+                    ).series
+                except SeriesReference.DoesNotExist:
+                    series = None
+
+                if not series:
+                    series = Series.objects.create(
+                        project=project,
+                        date=date,
+                        submitter=author,
+                        version=version,
+                        total=n,
+                    )
+
+                    # we don't save the in-reply-to or references fields
+                    # for a cover letter, as they can't refer to the same
+                    # series
+                    SeriesReference.objects.get_or_create(
+                        msgid=msgid,
+                        project=project,
+                        defaults={'series': series},
+                    )
+
                 cover_letter = Cover.objects.create(
                     msgid=msgid,
                     project=project,
@@ -1456,9 +1653,9 @@ def parse_mail(mail, list_id=None):
                     content=message,
                 )
 
-            logger.debug('Cover letter saved')
+                series.add_cover_letter(cover_letter)
 
-            series.add_cover_letter(cover_letter)
+            logger.debug('Cover letter saved')
 
             # cover letters are permitted to specify dependencies for the
             # entire patch series; parse them
@@ -1469,8 +1666,11 @@ def parse_mail(mail, list_id=None):
     # comments
 
     # we only save comments if we have the parent email
-    patch = find_patch_for_comment(project, refs)
-    if patch:
+    message_ids = _find_message_ids(project, refs)
+
+    patch_id = _find_parent_for_comment(message_ids, refs, 'patch')
+    if patch_id is not None:
+        patch = Patch.objects.get(id=patch_id)
         author = get_or_create_author(mail, project)
         addressed = find_comment_addressed_by_header(mail)
 
@@ -1491,10 +1691,11 @@ def parse_mail(mail, list_id=None):
 
         return comment
 
-    cover = find_cover_for_comment(project, refs)
-    if not cover:
+    cover_id = _find_parent_for_comment(message_ids, refs, 'cover')
+    if cover_id is None:
         return
 
+    cover = Cover.objects.get(id=cover_id)
     author = get_or_create_author(mail, project)
 
     with transaction.atomic():
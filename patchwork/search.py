@@ -0,0 +1,76 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Full-text search of patches.
+
+The text of patches is stored by :class:`~patchwork.models.PatchSearch` and
+indexed using the full-text search of each database: a ``tsvector`` GIN
+index on PostgreSQL, an FTS5 table on SQLite and a ``FULLTEXT`` index on
+MySQL. Searches match the patches containing every word searched for, or
+words starting with them. On other databases, only the names of patches are
+searched.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from patchwork.models import PatchSearch
+
+# the name of the FTS5 table indexing PatchSearch on SQLite
+SQLITE_TABLE = 'patchwork_patchsearch_fts'
+
+_word_re = re.compile(r'\w+')
+
+
+def _postgresql_sql(table, words):
+    sql = (
+        "SELECT patch_id FROM %s WHERE to_tsvector('simple', document) @@ "
+        "to_tsquery('simple', %%s)" % table
+    )
+    return sql, [' & '.join('%s:*' % word for word in words)]
+
+
+def _sqlite_sql(table, words):
+    sql = 'SELECT rowid FROM %s WHERE %s MATCH %%s' % (
+        SQLITE_TABLE,
+        SQLITE_TABLE,
+    )
+    return sql, [' '.join('"%s"*' % word for word in words)]
+
+
+def _mysql_sql(table, words):
+    sql = (
+        'SELECT patch_id FROM %s WHERE MATCH (document) '
+        'AGAINST (%%s IN BOOLEAN MODE)' % table
+    )
+    return sql, [' '.join('+%s*' % word for word in words)]
+
+
+_backends = {
+    'postgresql': _postgresql_sql,
+    'sqlite': _sqlite_sql,
+    'mysql': _mysql_sql,
+}
+
+
+def get_search_kwargs(query):
+    """Get the filter arguments for the patches matching a search.
+
+    Args:
+        query (str): The words to search for
+
+    Returns:
+        A dict of the arguments to ``QuerySet.filter`` for the patches
+        matching the search.
+    """
+    words = _word_re.findall(query)
+    backend = _backends.get(connection.vendor)
+    if not words or not backend:
+        return {'name__icontains': query}
+
+    table = connection.ops.quote_name(PatchSearch._meta.db_table)
+    return {'id__in': RawSQL(*backend(table, words))}
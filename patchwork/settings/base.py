@@ -174,8 +174,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'patchwork.api.base.LinkHeaderPagination',
     'DEFAULT_FILTER_BACKENDS': (
         'patchwork.api.filters.DjangoFilterBackend',
-        'rest_framework.filters.SearchFilter',
-        'rest_framework.filters.OrderingFilter',
+        'patchwork.api.filters.SearchFilter',
+        'patchwork.api.filters.OrderingFilter',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
@@ -242,6 +242,11 @@ LOGGING = {
             'level': 'WARNING',
             'propagate': True,
         },
+        'patchwork.management.commands.parsemaild': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
@@ -251,6 +256,24 @@ LOGGING = {
 
 DEFAULT_ITEMS_PER_PAGE = 100
 
+# The maximum number of patches counted to number the pages of the list
+# pages. Set to None to always count them
+LIST_COUNT_LIMIT = 10000
+
+# The number of seconds the highlighted diffs of patches are cached for. This
+# needs a cache that can hold large items, such as Redis. Set to 0 to highlight
+# them every time they are shown
+DIFF_CACHE_TIMEOUT = 0
+
+# The maximum size, in characters, of the highlighted diffs cached. This
+# defaults to the largest item memcached stores by default
+DIFF_CACHE_MAX_SIZE = 1024 * 1024
+
+# The number of seconds the mboxes of patches and cover letters are cached for.
+# This needs a cache shared by all processes, including the mail parser. Set to
+# 0 to generate them every time they are downloaded
+MBOX_CACHE_TIMEOUT = 0
+
 CONFIRMATION_VALIDITY_DAYS = 7
 
 NOTIFICATION_DELAY_MINUTES = 10
@@ -277,3 +300,7 @@ FORCE_HTTPS_LINKS = False
 
 # Set to True to hide admin details from the about page (/about)
 ADMINS_HIDE = False
+
+# Set to 'zlib' or 'zstd' to compress the headers, content and diffs of mails
+# when storing them. zstd requires Python 3.14 or the zstandard package
+TEXT_FIELD_COMPRESSION = None
@@ -3,19 +3,42 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.utils import timezone as tz_utils
 
+from patchwork.mbox import invalidate_mbox
 from patchwork.models import Check
 from patchwork.models import Cover
 from patchwork.models import CoverComment
+from patchwork.models import DelegationRule
 from patchwork.models import Event
+from patchwork.models import MessageID
 from patchwork.models import Patch
 from patchwork.models import PatchChangeNotification
 from patchwork.models import PatchComment
+from patchwork.models import PatchCount
+from patchwork.models import Person
+from patchwork.models import Project
 from patchwork.models import Series
+from patchwork.models import State
+from patchwork import parser
+
+
+def _get_original_patch(instance):
+    """Get the patch being saved as it was before the save.
+
+    This is fetched once by ``Patch.save`` for all of the handlers below, and
+    only the fields listed in ``Patch.TRACKED_FIELDS`` are loaded. Compare
+    foreign keys using their IDs to avoid fetching the related objects.
+
+    Returns:
+        The original patch, or None if the patch is new.
+    """
+    return getattr(instance, '_original', None)
 
 
 @receiver(pre_save, sender=Patch)
@@ -27,14 +50,13 @@ def patch_change_callback(sender, instance, raw, **kwargs):
     if instance.project is None or not instance.project.send_notifications:
         return
 
-    try:
-        orig_patch = Patch.objects.get(pk=instance.pk)
-    except Patch.DoesNotExist:
+    orig_patch = _get_original_patch(instance)
+    if orig_patch is None:
         return
 
     # If there's no interesting changes, abort without creating the
     # notification
-    if orig_patch.state == instance.state:
+    if orig_patch.state_id == instance.state_id:
         return
 
     notification = None
@@ -45,7 +67,7 @@ def patch_change_callback(sender, instance, raw, **kwargs):
 
     if notification is None:
         notification = PatchChangeNotification(
-            patch=instance, orig_state=orig_patch.state
+            patch=instance, orig_state_id=orig_patch.state_id
         )
     elif notification.orig_state == instance.state:
         # If we're back at the original state, there is no need to notify
@@ -56,6 +78,86 @@ def patch_change_callback(sender, instance, raw, **kwargs):
     notification.save()
 
 
+@receiver(post_save, sender=Patch)
+def update_patch_counts(sender, instance, created, raw, **kwargs):
+    # don't trigger for items loaded from fixtures
+    if raw:
+        return
+
+    key = PatchCount.get_key(instance)
+
+    if created:
+        PatchCount.add({key: 1})
+        return
+
+    orig_patch = _get_original_patch(instance)
+    if orig_patch is None:
+        return
+
+    orig_key = PatchCount.get_key(orig_patch)
+    if orig_key != key:
+        PatchCount.add({orig_key: -1, key: 1})
+
+
+@receiver(post_delete, sender=Patch)
+def remove_patch_count(sender, instance, **kwargs):
+    PatchCount.add({PatchCount.get_key(instance): -1})
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+@receiver(post_save, sender=DelegationRule)
+@receiver(post_delete, sender=DelegationRule)
+def clear_parser_cache(sender, **kwargs):
+    # the parser caches these, so make sure it sees any changes
+    parser.cache.clear()
+
+
+@receiver(post_save, sender=Patch)
+@receiver(post_delete, sender=Patch)
+@receiver(post_save, sender=Cover)
+@receiver(post_delete, sender=Cover)
+def invalidate_submission_mbox(sender, instance, **kwargs):
+    # new submissions have nothing cached yet
+    if kwargs.get('raw') or kwargs.get('created'):
+        return
+
+    invalidate_mbox(sender, [instance.id])
+
+
+@receiver(post_save, sender=PatchComment)
+@receiver(post_delete, sender=PatchComment)
+def invalidate_patch_mbox(sender, instance, **kwargs):
+    # the responses of comments, such as tags, are included in the mbox
+    if kwargs.get('raw'):
+        return
+
+    invalidate_mbox(Patch, [instance.patch_id])
+
+
+@receiver(post_save, sender=CoverComment)
+@receiver(post_delete, sender=CoverComment)
+def invalidate_cover_mbox(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+
+    invalidate_mbox(Cover, [instance.cover_id])
+
+
+@receiver(post_save, sender=Patch)
+@receiver(post_save, sender=Cover)
+@receiver(post_save, sender=PatchComment)
+@receiver(post_save, sender=CoverComment)
+def create_message_id(sender, instance, created, raw, **kwargs):
+    # don't trigger for items loaded from fixtures or existing items
+    if raw or not created:
+        return
+
+    MessageID.from_message(instance).save()
+
+
 @receiver(post_save, sender=Cover)
 def create_cover_created_event(sender, instance, created, raw, **kwargs):
     def create_event(cover):
@@ -96,7 +198,7 @@ def create_patch_state_changed_event(sender, instance, raw, **kwargs):
             project=patch.project,
             actor=getattr(patch, '_edited_by', None),
             patch=patch,
-            previous_state=before,
+            previous_state_id=before,
             current_state=after,
         )
 
@@ -104,12 +206,11 @@ def create_patch_state_changed_event(sender, instance, raw, **kwargs):
     if raw or not instance.pk:
         return
 
-    orig_patch = Patch.objects.get(pk=instance.pk)
-
-    if orig_patch.state == instance.state:
+    orig_patch = _get_original_patch(instance)
+    if orig_patch is None or orig_patch.state_id == instance.state_id:
         return
 
-    create_event(instance, orig_patch.state, instance.state)
+    create_event(instance, orig_patch.state_id, instance.state)
 
 
 @receiver(pre_save, sender=Patch)
@@ -120,7 +221,7 @@ def create_patch_delegated_event(sender, instance, raw, **kwargs):
             project=patch.project,
             actor=getattr(patch, '_edited_by', None),
             patch=patch,
-            previous_delegate=before,
+            previous_delegate_id=before,
             current_delegate=after,
         )
 
@@ -128,12 +229,11 @@ def create_patch_delegated_event(sender, instance, raw, **kwargs):
     if raw or not instance.pk:
         return
 
-    orig_patch = Patch.objects.get(pk=instance.pk)
-
-    if orig_patch.delegate == instance.delegate:
+    orig_patch = _get_original_patch(instance)
+    if orig_patch is None or orig_patch.delegate_id == instance.delegate_id:
         return
 
-    create_event(instance, orig_patch.delegate, instance.delegate)
+    create_event(instance, orig_patch.delegate_id, instance.delegate)
 
 
 @receiver(pre_save, sender=Patch)
@@ -150,9 +250,8 @@ def create_patch_relation_changed_event(sender, instance, raw, **kwargs):
     if raw or not instance.pk:
         return
 
-    orig_patch = Patch.objects.get(pk=instance.pk)
-
-    if orig_patch.related == instance.related:
+    orig_patch = _get_original_patch(instance)
+    if orig_patch is None or orig_patch.related_id == instance.related_id:
         return
 
     create_event(instance)
@@ -170,14 +269,16 @@ def create_patch_completed_event(sender, instance, raw, **kwargs):
 
     # don't trigger for items loaded from fixtures, new items or items that
     # (still) don't have a series
-    if raw or not instance.pk or not instance.series:
+    if raw or not instance.pk or not instance.series_id:
         return
 
-    orig_patch = Patch.objects.get(pk=instance.pk)
+    orig_patch = _get_original_patch(instance)
+    if orig_patch is None:
+        return
 
     # we don't currently allow users to change a series, though this might
     # change in the future. However, we handle that here nonetheless
-    if orig_patch.series == instance.series:
+    if orig_patch.series_id == instance.series_id:
         return
 
     # if dependencies not met, don't raise event. There's also no point raising
@@ -203,6 +304,41 @@ def create_patch_completed_event(sender, instance, raw, **kwargs):
         count += 1
 
 
+@receiver(post_save, sender=Check)
+def update_patch_check_state(sender, instance, created, raw, **kwargs):
+    # don't trigger for items loaded from fixtures
+    if raw:
+        return
+
+    if created:
+        instance.patch.add_check(instance)
+    else:
+        instance.patch.refresh_check_counts()
+
+
+def _deletes_patches(origin):
+    """Check if deleting an object also deletes the patches of its checks.
+
+    Checks are deleted along with their patch, or the user who created them.
+    Deleting any of the other objects that patches belong to deletes the
+    patches too, so their checks don't need to be counted again.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Patch, Project, Person, State, Series)
+
+
+@receiver(post_delete, sender=Check)
+def remove_patch_check(sender, instance, origin=None, **kwargs):
+    if _deletes_patches(origin):
+        return
+
+    # the patch itself may still be deleted, such as when deleting a user
+    # deletes the patches delegated to them
+    patch = Patch.objects.filter(pk=instance.patch_id).only('id').first()
+    if patch:
+        patch.refresh_check_counts()
+
+
 @receiver(post_save, sender=Check)
 def create_check_created_event(sender, instance, created, raw, **kwargs):
     def create_event(check):
@@ -256,15 +392,17 @@ def create_series_completed_event(sender, instance, raw, **kwargs):
 
     # don't trigger for items loaded from fixtures, new items or items that
     # (still) don't have a series
-    if raw or not instance.pk or not instance.series:
+    if raw or not instance.pk or not instance.series_id:
         return
 
-    orig_patch = Patch.objects.get(pk=instance.pk)
+    orig_patch = _get_original_patch(instance)
+    if orig_patch is None:
+        return
 
     # we don't currently allow users to change a series (though this might
     # change in the future) meaning if the patch already had a series, there's
     # nothing to notify about
-    if orig_patch.series:
+    if orig_patch.series_id:
         return
 
     # we can't use "series.received_all" here since we haven't actually saved
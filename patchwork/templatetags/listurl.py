@@ -16,7 +16,7 @@ from patchwork.filters import FILTERS
 register = template.Library()
 
 # params to preserve across views
-list_params = [c.param for c in FILTERS] + ['order', 'page']
+list_params = [c.param for c in FILTERS] + ['order', 'page', 'before', 'after']
 
 
 class ListURLNode(template.defaulttags.URLNode):
@@ -20,7 +20,7 @@ def patch_tags(patch):
     titles = []
 
     for tag in [t for t in patch.project.tags if t.show_column]:
-        count = getattr(patch, tag.attr_name)
+        count = patch.get_tag_count(tag)
         titles.append('%d %s' % (count, tag.name))
         if count == 0:
             counts.append('-')
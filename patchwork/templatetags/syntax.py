@@ -3,9 +3,12 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import hashlib
 import re
 
 from django import template
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
@@ -18,15 +21,13 @@ def _compile(value):
     return re.compile(regex, re.M | re.I), cls
 
 
-_patch_span_res = [
-    _compile(x)
-    for x in [
-        (r'^(Index:?|diff|\-\-\-|\+\+\+|\*\*\*) .*$', 'p_header'),
-        (r'^\+.*$', 'p_add'),
-        (r'^-.*$', 'p_del'),
-        (r'^!.*$', 'p_mod'),
-    ]
-]
+_patch_header_re = re.compile(r'(Index:?|diff|\-\-\-|\+\+\+|\*\*\*) ', re.I)
+
+_patch_line_classes = {
+    '+': 'p_add',
+    '-': 'p_del',
+    '!': 'p_mod',
+}
 
 _patch_chunk_re = re.compile(
     r'^(@@ \-\d+(?:,\d+)? \+\d+(?:,\d+)? @@)(.*)$', re.M | re.I
@@ -52,22 +53,65 @@ _comment_link_re = re.compile(r'(https|http|git|ftp)://[^<)\s]+', re.I)
 _link = '<a href="%s">%s</a>'
 
 
+# The version of the markup generated by ``patchsyntax``, which is part of the
+# cache keys. Increase this when changing the markup so that the diffs cached
+# with the previous markup are rendered again
+PATCHSYNTAX_VERSION = 1
+
+
+def _highlight_patch_line(line):
+    if _patch_header_re.match(line):
+        return _span % ('p_header', line)
+
+    cls = _patch_line_classes.get(line[:1])
+    if cls:
+        return _span % (cls, line)
+
+    if line.startswith('@@'):
+        match = _patch_chunk_re.match(line)
+        if match:
+            return ' '.join(
+                [
+                    _span % ('p_chunk', match.group(1)),
+                    _span % ('p_context', match.group(2)),
+                ],
+            )
+
+    return line
+
+
+def highlight_patch(diff):
+    """Highlight a diff, marking up each line according to its type.
+
+    Each line is classified once, rather than running a substitution for each
+    type of line over the whole diff.
+    """
+    diff = escape(diff).replace('\r\n', '\n')
+
+    return '\n'.join(_highlight_patch_line(line) for line in diff.split('\n'))
+
+
+def _get_patchsyntax_key(diff):
+    digest = hashlib.sha1(diff.encode('utf-8')).hexdigest()
+    return 'patchsyntax:%d:%s' % (PATCHSYNTAX_VERSION, digest)
+
+
 @register.filter
 def patchsyntax(patch):
-    diff = escape(patch.diff).replace('\r\n', '\n')
-
-    for regex, cls in _patch_span_res:
-        diff = regex.sub(lambda x: _span % (cls, x.group(0)), diff)
-
-    diff = _patch_chunk_re.sub(
-        lambda x: ' '.join(
-            [
-                _span % ('p_chunk', x.group(1)),
-                _span % ('p_context', x.group(2)),
-            ],
-        ),
-        diff,
-    )
+    # highlighting a large diff is slow, so the markup is cached. This is
+    # keyed by the diff itself rather than the patch, as the hash of a patch
+    # ignores some of the differences between diffs
+    if not settings.DIFF_CACHE_TIMEOUT:
+        return mark_safe(highlight_patch(patch.diff))
+
+    key = _get_patchsyntax_key(patch.diff)
+    diff = cache.get(key)
+    if diff is None:
+        diff = highlight_patch(patch.diff)
+        # caches such as memcached silently drop items that are too large,
+        # so these aren't stored at all rather than evicting other items
+        if len(diff) <= settings.DIFF_CACHE_MAX_SIZE:
+            cache.set(key, diff, settings.DIFF_CACHE_TIMEOUT)
 
     return mark_safe(diff)
 
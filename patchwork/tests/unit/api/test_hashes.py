@@ -0,0 +1,196 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from django.test import override_settings
+from django.urls import NoReverseMatch
+from django.urls import reverse
+from rest_framework import status
+
+from patchwork.models import Event
+from patchwork.models import Patch
+from patchwork.tests.unit.api import utils
+from patchwork.tests.utils import create_maintainer
+from patchwork.tests.utils import create_patch
+from patchwork.tests.utils import create_project
+from patchwork.tests.utils import create_state
+from patchwork.tests.utils import create_user
+
+SAMPLE_DIFF = """--- a/file
++++ b/file
+@@ -0,0 +1 @@
++%d
+"""
+
+
+@override_settings(ENABLE_REST_API=True)
+class TestHashLookupAPI(utils.APITestCase):
+    fixtures = ['default_tags']
+
+    @staticmethod
+    def api_url(version=None):
+        kwargs = {}
+        if version:
+            kwargs['version'] = version
+
+        return reverse('api-patch-hash-lookup', kwargs=kwargs)
+
+    def setUp(self):
+        super(TestHashLookupAPI, self).setUp()
+        self.project = create_project()
+        self.user = create_maintainer(self.project)
+        self.state = create_state(name='Accepted', slug='accepted')
+        self.patches = [
+            create_patch(project=self.project, diff=SAMPLE_DIFF % i)
+            for i in range(3)
+        ]
+
+    def test_lookup_old_version(self):
+        """Lookup hashes using an old API version."""
+        with self.assertRaises(NoReverseMatch):
+            self.client.post(self.api_url(version='1.3'))
+
+    @utils.store_samples('patch-hash-lookup')
+    def test_lookup(self):
+        """Lookup patches by hash."""
+        other_patch = create_patch(diff=SAMPLE_DIFF % 0)
+        hashes = [
+            {'hash': self.patches[0].hash},
+            {'hash': self.patches[2].hash.upper()},
+            {'hash': '0' * 40},
+        ]
+
+        with self.assertNumQueries(1):
+            resp = self.client.post(self.api_url(), {'hashes': hashes})
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual(
+            [self.patches[0].hash, self.patches[2].hash, '0' * 40],
+            [item['hash'] for item in resp.data],
+        )
+        self.assertEqual(
+            [self.patches[0].id, other_patch.id],
+            [patch['id'] for patch in resp.data[0]['patches']],
+        )
+        self.assertEqual(
+            [self.patches[2].id],
+            [patch['id'] for patch in resp.data[1]['patches']],
+        )
+        self.assertEqual([], resp.data[2]['patches'])
+
+    def test_lookup_project(self):
+        """Lookup patches by hash in a given project."""
+        create_patch(diff=SAMPLE_DIFF % 0)
+
+        for project in (self.project.linkname, str(self.project.id)):
+            resp = self.client.post(
+                self.api_url(),
+                {
+                    'hashes': [{'hash': self.patches[0].hash}],
+                    'project': project,
+                },
+            )
+
+            self.assertEqual(status.HTTP_200_OK, resp.status_code)
+            self.assertEqual(
+                [self.patches[0].id],
+                [patch['id'] for patch in resp.data[0]['patches']],
+            )
+
+    @utils.store_samples('patch-hash-lookup-update')
+    def test_update(self):
+        """Update the state and commit refs of patches found by hash."""
+        orig_state = self.patches[0].state
+        hashes = [
+            {'hash': self.patches[0].hash, 'commit_ref': 'a' * 40},
+            {'hash': self.patches[1].hash, 'commit_ref': 'b' * 40},
+        ]
+
+        self.client.authenticate(user=self.user)
+        resp = self.client.post(
+            self.api_url(), {'hashes': hashes, 'state': 'accepted'}
+        )
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.assertEqual('accepted', resp.data[0]['patches'][0]['state'])
+        self.assertEqual('a' * 40, resp.data[0]['patches'][0]['commit_ref'])
+
+        for patch, commit_ref in zip(self.patches, ('a' * 40, 'b' * 40)):
+            patch.refresh_from_db()
+            self.assertEqual(self.state, patch.state)
+            self.assertEqual(commit_ref, patch.commit_ref)
+
+        self.patches[2].refresh_from_db()
+        self.assertNotEqual(self.state, self.patches[2].state)
+
+        event = Event.objects.get(
+            patch=self.patches[0],
+            category=Event.CATEGORY_PATCH_STATE_CHANGED,
+        )
+        self.assertEqual(orig_state, event.previous_state)
+        self.assertEqual(self.state, event.current_state)
+        self.assertEqual(self.user, event.actor)
+
+    def test_update_anonymous(self):
+        """Update patches found by hash when not logged in."""
+        resp = self.client.post(
+            self.api_url(),
+            {'hashes': [{'hash': self.patches[0].hash}], 'state': 'accepted'},
+        )
+
+        self.assertEqual(status.HTTP_403_FORBIDDEN, resp.status_code)
+
+    @utils.store_samples('patch-hash-lookup-error-forbidden')
+    def test_update_non_maintainer(self):
+        """Update patches found by hash as a non-maintainer."""
+        self.client.authenticate(user=create_user())
+        resp = self.client.post(
+            self.api_url(),
+            {'hashes': [{'hash': self.patches[0].hash}], 'state': 'accepted'},
+        )
+
+        self.assertEqual(status.HTTP_403_FORBIDDEN, resp.status_code)
+        self.assertFalse(Patch.objects.filter(state=self.state).exists())
+
+    def test_update_other_project(self):
+        """Update patches found by hash, some in an unmaintained project."""
+        create_patch(diff=SAMPLE_DIFF % 0)
+
+        self.client.authenticate(user=self.user)
+        resp = self.client.post(
+            self.api_url(),
+            {'hashes': [{'hash': self.patches[0].hash}], 'state': 'accepted'},
+        )
+
+        self.assertEqual(status.HTTP_403_FORBIDDEN, resp.status_code)
+        self.assertFalse(Patch.objects.filter(state=self.state).exists())
+
+        # but limiting the lookup to the maintained project works
+        resp = self.client.post(
+            self.api_url(),
+            {
+                'hashes': [{'hash': self.patches[0].hash}],
+                'project': self.project.linkname,
+                'state': 'accepted',
+            },
+        )
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        self.patches[0].refresh_from_db()
+        self.assertEqual(self.state, self.patches[0].state)
+
+    @utils.store_samples('patch-hash-lookup-error-bad-request')
+    def test_lookup_invalid(self):
+        """Lookup patches using invalid values."""
+        for data in (
+            {'hashes': []},
+            {'hashes': [{'hash': 'xyz'}]},
+            {'hashes': [{'hash': '0' * 40}], 'project': 'xyz123random'},
+            {'hashes': [{'hash': '0' * 40}], 'state': 'xyz123random'},
+        ):
+            with self.subTest(data=data):
+                resp = self.client.post(
+                    self.api_url(), data, validate_request=False
+                )
+                self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
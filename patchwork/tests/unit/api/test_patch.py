@@ -5,14 +5,19 @@
 
 import email.parser
 from email.utils import make_msgid
+from unittest import mock
 
 from django.test import override_settings
 from django.urls import NoReverseMatch
 from django.urls import reverse
 from rest_framework import status
 
+from patchwork.api.patch import PatchDetailSerializer
+from patchwork.models import Check
 from patchwork.models import Patch
+from patchwork.models import PatchFile
 from patchwork.tests.unit.api import utils
+from patchwork.tests.utils import create_check
 from patchwork.tests.utils import create_maintainer
 from patchwork.tests.utils import create_patch
 from patchwork.tests.utils import create_patches
@@ -21,6 +26,7 @@ from patchwork.tests.utils import create_project
 from patchwork.tests.utils import create_series
 from patchwork.tests.utils import create_state
 from patchwork.tests.utils import create_user
+from patchwork.tests.utils import read_patch
 
 # a diff different from the default, required to test hash filtering
 SAMPLE_DIFF = """--- /dev/null\t2019-01-01 00:00:00.000000000 +0800
@@ -211,6 +217,92 @@ class TestPatchAPI(utils.APITestCase):
         )
         self.assertEqual(1, len(resp.data))
 
+    def test_list_filter_git_patch_id(self):
+        """Filter patches by git patch ID."""
+        patch = create_patch(diff=read_patch('0001-add-line.patch'))
+        create_patch()
+
+        resp = self.client.get(
+            self.api_url(), {'git_patch_id': patch.git_patch_id.upper()}
+        )
+        self.assertEqual([patch.id], [x['id'] for x in resp.data])
+        self.assertEqual(patch.git_patch_id, resp.data[0]['git_patch_id'])
+
+    def test_list_filter_q(self):
+        """Filter patches by searching them."""
+        patch = create_patch(
+            name='[PATCH] Fix the frobnicator', content='Widgets break.'
+        )
+        create_patch()
+
+        resp = self.client.get(self.api_url(), {'q': 'fix widget'})
+        self.assertEqual([patch.id], [x['id'] for x in resp.data])
+
+        resp = self.client.get(self.api_url(), {'q': 'nicator'})
+        self.assertEqual([], resp.data)
+
+    def test_list_filter_q_old_version(self):
+        """Filter patches by searching their names using an old API."""
+        patch = create_patch(
+            name='[PATCH] Fix the frobnicator', content='Widgets break.'
+        )
+        create_patch()
+
+        resp = self.client.get(self.api_url(version='1.3'), {'q': 'nicator'})
+        self.assertEqual([patch.id], [x['id'] for x in resp.data])
+
+        resp = self.client.get(self.api_url(version='1.3'), {'q': 'widget'})
+        self.assertEqual([], resp.data)
+
+    def test_list_filter_path(self):
+        """Filter patches by the files they change."""
+        patch = create_patch()
+        PatchFile.add([(patch, ['drivers/net/foo.c'])])
+        PatchFile.add([(create_patch(), ['drivers/usb/foo.c'])])
+
+        resp = self.client.get(self.api_url(), {'path': 'drivers/net/'})
+        self.assertEqual([patch.id], [x['id'] for x in resp.data])
+
+        resp = self.client.get(self.api_url(), {'path': '*/net/*.c'})
+        self.assertEqual([patch.id], [x['id'] for x in resp.data])
+
+        resp = self.client.get(self.api_url(), {'path': 'net/'})
+        self.assertEqual(0, len(resp.data))
+
+    def test_list_filter_path_version_1_3(self):
+        """Filter patches by the files they change using API v1.3."""
+        self._create_patch()
+
+        # we still see the patch since the path field is ignored
+        resp = self.client.get(self.api_url(version='1.3'), {'path': 'foo'})
+        self.assertEqual(1, len(resp.data))
+
+    def test_list_filter_git_patch_id_version_1_3(self):
+        """Filter patches by git patch ID using API v1.3."""
+        self._create_patch()
+
+        # we still see the patch since the git_patch_id field is ignored
+        resp = self.client.get(
+            self.api_url(version='1.3'), {'git_patch_id': 'garbagevalue'}
+        )
+        self.assertEqual(1, len(resp.data))
+        self.assertNotIn('git_patch_id', resp.data[0])
+
+    def test_list_order_check(self):
+        """Order patches by the combined state of their checks."""
+        patches = create_patches(3)
+        create_check(patch=patches[0], state=Check.STATE_FAIL)
+        create_check(patch=patches[2], state=Check.STATE_SUCCESS)
+
+        resp = self.client.get(self.api_url(), {'order': '-check'})
+        self.assertEqual(
+            [patches[0].id, patches[2].id, patches[1].id],
+            [x['id'] for x in resp.data],
+        )
+        self.assertEqual(
+            ['fail', 'success', 'pending'], [x['check'] for x in resp.data]
+        )
+
     def test_list_filter_msgid(self):
         """Filter patches by msgid."""
         patch = self._create_patch()
@@ -238,6 +330,8 @@ class TestPatchAPI(utils.APITestCase):
         series = create_series()
         create_patches(5, series=series)
 
+        # the checks aren't fetched, as their state is stored with the patch,
+        # and neither are the tags, beyond the list of tags for the project
         with self.assertNumQueries(5):
             self.client.get(self.api_url())
 
@@ -261,7 +355,10 @@ class TestPatchAPI(utils.APITestCase):
 
         self.assertEqual(patch.content, resp.data['content'])
         self.assertEqual(patch.diff, resp.data['diff'])
-        self.assertEqual(0, len(resp.data['tags']))
+        self.assertEqual(
+            {'Acked-by': 0, 'Reviewed-by': 1, 'Tested-by': 0},
+            resp.data['tags'],
+        )
 
     @utils.store_samples('patch-detail-1-0')
     def test_detail_version_1_0(self):
@@ -357,6 +454,30 @@ class TestPatchAPI(utils.APITestCase):
         self.assertEqual(status.HTTP_200_OK, resp.status_code, resp)
         self.assertIsNone(Patch.objects.get(id=patch.id).delegate)
 
+    def test_update_counts_kept(self):
+        """Ensure updates don't overwrite the counts of checks added since."""
+        project = create_project()
+        patch = create_patch(project=project)
+        state = create_state()
+        user = create_maintainer(project)
+
+        def add_check(attrs):
+            create_check(patch=patch, state=Check.STATE_FAIL)
+            return attrs
+
+        self.client.authenticate(user=user)
+        with mock.patch.object(
+            PatchDetailSerializer, 'validate', side_effect=add_check
+        ):
+            resp = self.client.patch(
+                self.api_url(patch.id), {'state': state.slug}
+            )
+
+        self.assertEqual(status.HTTP_200_OK, resp.status_code, resp)
+        patch = Patch.objects.get(id=patch.id)
+        self.assertEqual(state, patch.state)
+        self.assertEqual(Check.STATE_FAIL, patch.check_state)
+
     def test_update_maintainer_version_1_0(self):
         """Update patch as maintainer on v1.1."""
         project = create_project()
@@ -4,12 +4,16 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 from datetime import timedelta
+import random
+from unittest import mock
 
 from django.test import TransactionTestCase
 from django.utils import timezone as tz_utils
 
 from patchwork.models import Check
+from patchwork.models import Patch
 from patchwork.tests.utils import create_check
+from patchwork.tests.utils import create_patch
 from patchwork.tests.utils import create_patches
 from patchwork.tests.utils import create_user
 
@@ -138,3 +142,62 @@ class PatchChecksTest(TransactionTestCase):
         self._create_check()
         self._create_check(context='new/test1')
         self.assertCheckEqual(self.patch, Check.STATE_SUCCESS)
+
+    def test_check__stored(self):
+        """Ensure the state and counts stored match the checks."""
+        users = [self.user, create_user()]
+        now = tz_utils.now()
+        rng = random.Random(0)
+
+        for _ in range(50):
+            self._create_check(
+                user=rng.choice(users),
+                context=rng.choice(['a', 'b', 'c']),
+                state=rng.choice(Check.STATE_CHOICES)[0],
+                date=now - timedelta(minutes=rng.randint(0, 20)),
+            )
+
+            patch = Patch.objects.get(pk=self.patch.pk)
+            self.assertEqual(
+                (patch.check_state, patch.check_count),
+                (self.patch.check_state, self.patch.check_count),
+            )
+
+            patch.refresh_check_counts()
+            self.assertEqual(
+                (patch.check_state, patch.check_count),
+                (self.patch.check_state, self.patch.check_count),
+            )
+
+    def test_check__deleted(self):
+        self._create_check()
+        check = self._create_check(context='new/test1', state=Check.STATE_FAIL)
+        check.delete()
+
+        self.patch.refresh_from_db()
+        self.assertCheckEqual(self.patch, Check.STATE_SUCCESS)
+        self.assertCheckCountEqual(self.patch, 1, {Check.STATE_SUCCESS: 1})
+
+    def test_check__user_deleted(self):
+        self._create_check()
+        user = create_user()
+        self._create_check(user=user, state=Check.STATE_FAIL)
+        user.delete()
+
+        self.patch.refresh_from_db()
+        self.assertCheckEqual(self.patch, Check.STATE_SUCCESS)
+        self.assertCheckCountEqual(self.patch, 1, {Check.STATE_SUCCESS: 1})
+
+    def test_check__patch_deleted(self):
+        """Ensure the checks of deleted patches aren't counted again."""
+        other = create_patch(project=self.patch.project)
+        for i in range(3):
+            self._create_check(context='test%d' % i)
+            self._create_check(patch=other, context='test%d' % i)
+
+        with mock.patch.object(Patch, 'refresh_check_counts') as refresh:
+            self.patch.delete()
+            other.project.delete()
+
+        refresh.assert_not_called()
+        self.assertFalse(Check.objects.exists())
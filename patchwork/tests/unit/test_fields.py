@@ -3,9 +3,17 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import unittest
+
+from django.db import connection
 from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
 
 from patchwork import fields
+from patchwork.models import Patch
+from patchwork.tests.utils import create_patch
+from patchwork.tests.utils import read_patch
 
 
 class TestHashField(SimpleTestCase):
@@ -16,3 +24,92 @@ class TestHashField(SimpleTestCase):
         """
         field = fields.HashField()
         self.assertEqual(field.n_bytes, 40)
+
+
+class TestCompressText(SimpleTestCase):
+    def test_compress(self):
+        """Compress and decompress a value."""
+        value = 'foo bar\n' * 100
+
+        for method in ('zlib', 'zstd'):
+            if method == 'zstd' and fields.zstd is None:
+                continue
+
+            with self.subTest(method=method):
+                compressed = fields.compress_text(value, method)
+                self.assertTrue(
+                    compressed.startswith(fields.COMPRESSION_PREFIXES[method])
+                )
+                self.assertLess(len(compressed), len(value))
+                self.assertEqual(value, fields.decompress_text(compressed))
+
+    def test_compress_disabled(self):
+        """Store values uncompressed if compression is disabled."""
+        value = 'foo bar\n' * 100
+
+        self.assertEqual(value, fields.compress_text(value, None))
+        self.assertIsNone(fields.compress_text(None, 'zlib'))
+
+    def test_compress_short(self):
+        """Store short or incompressible values uncompressed."""
+        self.assertEqual('foo', fields.compress_text('foo', 'zlib'))
+
+        value = ''.join(chr(0x100 + i) for i in range(300))
+        self.assertEqual(value, fields.compress_text(value, 'zlib'))
+
+    def test_compress_prefix(self):
+        """Store values looking compressed so that they are read back."""
+        for value in ('\x1b', '\x1bz:Zm9v', '\x1bz:' + 'a' * 300):
+            with self.subTest(value=value):
+                compressed = fields.compress_text(value, None)
+                self.assertNotEqual(value, compressed)
+                self.assertEqual(value, fields.decompress_text(compressed))
+
+    def test_decompress_uncompressed(self):
+        """Read values stored before compression was enabled."""
+        for value in (None, '', 'foo', '\x1bz:not base64', '\x1bz:Zm9v'):
+            with self.subTest(value=value):
+                self.assertEqual(value, fields.decompress_text(value))
+
+
+class TestCompressedTextField(TestCase):
+    def get_stored_diff(self, patch):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT diff FROM patchwork_patch WHERE id = %s', [patch.id]
+            )
+            return cursor.fetchone()[0]
+
+    @override_settings(TEXT_FIELD_COMPRESSION='zlib')
+    def test_save(self):
+        """Store a compressed value and read it back."""
+        diff = read_patch('0001-add-line.patch') * 10
+        patch = create_patch(diff=diff)
+
+        self.assertTrue(self.get_stored_diff(patch).startswith('\x1bz:'))
+        self.assertEqual(diff, Patch.objects.get(id=patch.id).diff)
+        self.assertEqual(
+            [diff], list(Patch.objects.values_list('diff', flat=True))
+        )
+
+    def test_save_uncompressed(self):
+        """Read values stored both compressed and uncompressed."""
+        diff = read_patch('0001-add-line.patch') * 10
+        patch_a = create_patch(diff=diff)
+        with override_settings(TEXT_FIELD_COMPRESSION='zlib'):
+            patch_b = create_patch(diff=diff)
+
+        self.assertEqual(diff, self.get_stored_diff(patch_a))
+        self.assertNotEqual(diff, self.get_stored_diff(patch_b))
+        for patch in (patch_a, patch_b):
+            self.assertEqual(diff, Patch.objects.get(id=patch.id).diff)
+
+    @unittest.skipIf(fields.zstd is None, 'zstd is not available')
+    @override_settings(TEXT_FIELD_COMPRESSION='zstd')
+    def test_save_zstd(self):
+        """Store a value compressed with zstd and read it back."""
+        diff = read_patch('0001-add-line.patch') * 10
+        patch = create_patch(diff=diff)
+
+        self.assertTrue(self.get_stored_diff(patch).startswith('\x1bs:'))
+        self.assertEqual(diff, Patch.objects.get(id=patch.id).diff)
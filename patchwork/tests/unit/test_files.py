@@ -0,0 +1,106 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import fnmatch
+
+from django.test import TestCase
+
+from patchwork.models import PatchFile
+from patchwork.tests.utils import create_patch
+
+PATHS = [
+    'Makefile',
+    'drivers/net/foo/foo.c',
+    'drivers/net/foo/foo.h',
+    'drivers/net/foobar.c',
+    'drivers/usb/bar.c',
+    'include/linux/foo.h',
+    'a+b[1].txt',
+]
+
+
+class PatchFileTest(TestCase):
+    def setUp(self):
+        self.patches = {}
+        for path in PATHS:
+            self.patches[path] = create_patch()
+        PatchFile.add(
+            [(patch, [path]) for path, patch in self.patches.items()]
+        )
+
+    def assertMatchEqual(self, pattern, paths):  # noqa
+        self.assertEqual(
+            sorted(paths),
+            sorted(PatchFile.match(pattern).values_list('path', flat=True)),
+        )
+
+    def test_prefix(self):
+        """Ensure paths without wildcards match the paths they start."""
+        self.assertMatchEqual(
+            'drivers/net/foo',
+            [
+                'drivers/net/foo/foo.c',
+                'drivers/net/foo/foo.h',
+                'drivers/net/foobar.c',
+            ],
+        )
+        self.assertMatchEqual(
+            'drivers/net/foo/',
+            ['drivers/net/foo/foo.c', 'drivers/net/foo/foo.h'],
+        )
+        self.assertMatchEqual('Makefile', ['Makefile'])
+        self.assertMatchEqual('a+b', ['a+b[1].txt'])
+        self.assertMatchEqual('net', [])
+
+    def test_glob(self):
+        """Ensure globs match like delegation rules."""
+        for pattern in (
+            '*.c',
+            '*.h',
+            'drivers/*/foo*',
+            'drivers/net/foo/foo.?',
+            'drivers/*/[!n]*',
+            'drivers/[a-m]*',
+            'include/*',
+            '*/foo.[ch]',
+            'a+b[[]1].txt',
+            '[]]*',
+            '[!]]*',
+            '*[',
+            '[^a]*',
+            '[\\]*',
+            '*foo',
+            '?',
+        ):
+            with self.subTest(pattern=pattern):
+                self.assertMatchEqual(
+                    pattern,
+                    [
+                        path
+                        for path in PATHS
+                        if fnmatch.fnmatchcase(path, pattern)
+                    ],
+                )
+
+    def test_invalid_glob(self):
+        """Ensure globs fnmatch can't match anything don't match."""
+        self.assertMatchEqual('[z-a]*', [])
+
+    def test_add(self):
+        """Ensure paths are stored once per patch."""
+        patch = create_patch()
+        PatchFile.add([(patch, ['foo', 'foo', 'x' * 300, 'x' * 301])])
+
+        self.assertEqual(
+            ['foo', 'x' * 255],
+            sorted(patch.files.values_list('path', flat=True)),
+        )
+
+    def test_delete(self):
+        """Ensure the files of deleted patches are deleted."""
+        patch = self.patches['Makefile']
+        patch.delete()
+
+        self.assertMatchEqual('Makefile', [])
@@ -0,0 +1,185 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import hashlib
+import io
+import mailbox
+import os
+import re
+import shutil
+import subprocess
+import unittest
+
+from django.test import SimpleTestCase
+
+from patchwork import hasher
+from patchwork.parser import find_patch_content
+from patchwork.tests import TEST_FUZZ_DIR
+from patchwork.tests import TEST_MAIL_DIR
+from patchwork.tests import TEST_PATCH_DIR
+from patchwork.tests import TEST_SERIES_DIR
+
+
+def reference_hash_diff(diff):
+    """The original implementation of 'hash_diff', kept for comparison."""
+    hunk_re = re.compile(r'^\@\@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? \@\@')
+    filename_re = re.compile(r'^(---|\+\+\+) (\S+)')
+
+    diff = diff.replace('\r', '')
+    diff = diff.strip() + '\n'
+
+    hashed = hashlib.sha1()
+
+    for line in diff.split('\n'):
+        if len(line) <= 0:
+            continue
+
+        hunk_match = hunk_re.match(line)
+        filename_match = filename_re.match(line)
+
+        if filename_match:
+            if filename_match.group(1) == '---':
+                filename = 'a/'
+            else:
+                filename = 'b/'
+            filename += '/'.join(filename_match.group(2).split('/')[1:])
+
+            line = filename_match.group(1) + ' ' + filename
+        elif hunk_match:
+            line_nos = [int(x) if x else 1 for x in hunk_match.groups()]
+            line = '@@ -%d +%d @@' % tuple(line_nos)
+        elif line[0] not in ['-', '+', ' ']:
+            continue
+
+        hashed.update((line + '\n').encode('utf-8'))
+
+    return hashed.hexdigest()
+
+
+def read_diffs():
+    """Yield the name and diff of every mail in the test data.
+
+    Both the diff found by the parser and the whole mail are yielded, as the
+    latter contains a lot of lines that are ignored.
+    """
+    for path in (
+        TEST_MAIL_DIR,
+        TEST_PATCH_DIR,
+        TEST_SERIES_DIR,
+        TEST_FUZZ_DIR,
+    ):
+        for filename in sorted(os.listdir(path)):
+            file_path = os.path.join(path, filename)
+
+            with open(file_path, encoding='utf-8', errors='replace') as f:
+                yield filename, f.read()
+
+            if not filename.endswith('.mbox'):
+                continue
+
+            for i, mail in enumerate(mailbox.mbox(file_path, create=False)):
+                try:
+                    diff, _ = find_patch_content(mail)
+                except Exception:  # the fuzzed mails can be broken
+                    continue
+                if diff:
+                    yield '%s:%d' % (filename, i), diff
+
+
+class HashDiffTest(SimpleTestCase):
+    def assertHashEqual(self, diff):
+        expected = reference_hash_diff(diff)
+        self.assertEqual(expected, hasher.hash_diff(diff))
+        self.assertEqual(expected, hasher.hash_diff(io.StringIO(diff)))
+
+    def test_corpus(self):
+        """Ensure hashes of the test data are unchanged."""
+        for name, diff in read_diffs():
+            with self.subTest(name=name):
+                self.assertHashEqual(diff)
+
+    def test_whitespace(self):
+        """Ensure whitespace is handled as before."""
+        for diff in (
+            '',
+            '\n \n\t\n',
+            '  --- a/foo\n',
+            '\r\n+foo\r\n \r\n+bar \r\n',
+            ' \n+foo\n \n\t\n \n',
+            '+foo\n \n  \n\n\t\n',
+            '+foo\n\x1c+bar \n',
+            '--- \n+++  b/foo\n@@ -1 +1 @@  \n',
+            '+foo\n\x85',
+        ):
+            with self.subTest(diff=diff):
+                self.assertHashEqual(diff)
+
+    def test_blocks(self):
+        """Ensure diffs longer than a block are hashed as a whole."""
+        diff = ' foo\n \n+bar\n' * hasher.BLOCK_SIZE + ' \n\n'
+        self.assertHashEqual(diff)
+
+    def test_iterable(self):
+        """Ensure lines can be given without line endings."""
+        diff = '--- a/foo\n+++ b/foo\n@@ -1 +1,2 @@\n foo\n+bar\n'
+        self.assertEqual(
+            hasher.hash_diff(diff), hasher.hash_diff(diff.split('\n'))
+        )
+
+
+class GitPatchIdTest(SimpleTestCase):
+    def test_patch(self):
+        """Ensure the patch ID of a git diff is generated."""
+        with open(os.path.join(TEST_PATCH_DIR, '0001-add-line.patch')) as f:
+            diff = f.read()
+
+        self.assertEqual(
+            '5781f94ae94b282944acbfa9bb5cf1e8920f82dd',
+            hasher.git_patch_id(diff),
+        )
+
+    def test_invalid_utf8(self):
+        """Ensure diffs decoded with undecodable bytes escaped are hashed."""
+        diff = (
+            b'diff --git a/foo b/foo\n'
+            b'index 257cc56..5716ca5 100644\n'
+            b'--- a/foo\n'
+            b'+++ b/foo\n'
+            b'@@ -1 +1 @@\n'
+            b'-caf\xe9\n'
+            b'+caf\xe9s\n'
+        ).decode('utf-8', 'surrogateescape')
+
+        # as given by 'git patch-id --stable' for the original bytes
+        self.assertEqual(
+            '81ec0f573ea3e8942ee1d75227d012275350f152',
+            hasher.git_patch_id(diff),
+        )
+        self.assertEqual(
+            'dff324d656d71438735e33189a16dba4b58baa5f',
+            hasher.hash_diff(diff),
+        )
+
+    def test_no_diff(self):
+        """Ensure diffs not generated by git have no patch ID."""
+        self.assertIsNone(hasher.git_patch_id(''))
+        self.assertIsNone(
+            hasher.git_patch_id('--- foo\n+++ foo\n@@ -1 +1 @@\n-foo\n+bar\n')
+        )
+
+    @unittest.skipIf(not shutil.which('git'), 'git is not available')
+    def test_corpus(self):
+        """Compare patch IDs of the test data with those generated by git."""
+        for name, diff in read_diffs():
+            with self.subTest(name=name):
+                output = subprocess.run(
+                    ['git', 'patch-id', '--stable'],
+                    input=diff.encode('utf-8'),
+                    stdout=subprocess.PIPE,
+                    check=True,
+                ).stdout.decode()
+                expected = output.split()[0] if output else None
+
+                self.assertEqual(expected, hasher.git_patch_id(diff))
@@ -0,0 +1,217 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import mailbox
+import os
+import unittest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from patchwork import ingest
+from patchwork import models
+from patchwork import parser
+from patchwork.tests import TEST_SERIES_DIR
+from patchwork.tests import utils
+from patchwork.views.utils import Mbox
+
+
+def _load_mails():
+    mails = []
+    for name in sorted(os.listdir(TEST_SERIES_DIR)):
+        if not name.endswith('.mbox'):
+            continue
+
+        mbox = mailbox.mbox(os.path.join(TEST_SERIES_DIR, name), create=False)
+        mails.extend(mbox)
+        mbox.close()
+
+    return mails
+
+
+def _dump():
+    """Dump the parsed state of the database, without any IDs."""
+
+    def msgid(obj):
+        return obj.msgid if obj else None
+
+    def series_key(series):
+        if not series:
+            return None
+
+        return (
+            series.name,
+            series.date,
+            series.version,
+            series.total,
+            series.submitter.email,
+            msgid(series.cover_letter),
+            tuple(sorted(series.patches.values_list('msgid', flat=True))),
+        )
+
+    return {
+        'persons': sorted(models.Person.objects.values_list('email', 'name')),
+        'covers': sorted(
+            (c.msgid, c.name, c.date, c.headers, c.content, c.submitter.email)
+            for c in models.Cover.objects.all()
+        ),
+        'patches': sorted(
+            (
+                p.msgid,
+                p.name,
+                p.date,
+                p.headers,
+                p.content,
+                p.diff,
+                p.hash,
+                p.pull_url,
+                p.submitter.email,
+                p.delegate_id,
+                p.state.name,
+                series_key(p.series),
+                p.number,
+                sorted(p.tag_counts.items()),
+            )
+            for p in models.Patch.objects.all()
+        ),
+        'series': sorted(series_key(s) for s in models.Series.objects.all()),
+        'references': sorted(
+            (r.msgid, series_key(r.series))
+            for r in models.SeriesReference.objects.all()
+        ),
+        'patch-comments': sorted(
+            (c.msgid, c.patch.msgid, c.content, c.submitter.email)
+            for c in models.PatchComment.objects.all()
+        ),
+        'cover-comments': sorted(
+            (c.msgid, c.cover.msgid, c.content, c.submitter.email)
+            for c in models.CoverComment.objects.all()
+        ),
+        'tags': sorted(
+            (t.patch.msgid, t.tag.name, t.count)
+            for t in models.PatchTag.objects.all()
+        ),
+        'events': [
+            (
+                e.category,
+                msgid(e.patch),
+                series_key(e.series),
+                msgid(e.cover),
+                msgid(e.patch_comment),
+                msgid(e.cover_comment),
+            )
+            for e in models.Event.objects.order_by('id')
+        ],
+    }
+
+
+def _summarize(results):
+    return [
+        type(result).__name__ if result is not None else None
+        for result in results
+    ]
+
+
+class ParseMailsTest(TestCase):
+    fixtures = ['default_tags', 'default_states']
+
+    def setUp(self):
+        self.project = utils.create_project()
+        user = utils.create_user()
+        models.DelegationRule.objects.create(
+            project=self.project, user=user, path='*/*.c'
+        )
+        self.mails = _load_mails()
+
+    def _parse_serial(self, mails):
+        results = []
+        for mail in mails:
+            try:
+                results.append(parser.parse_mail(mail, self.project.listid))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    def _parse_bulk(self, mails, batch_size):
+        return list(ingest.parse_mails(mails, self.project.listid, batch_size))
+
+    def _reset(self):
+        models.Event.objects.all().delete()
+        models.Series.objects.all().delete()
+        models.Cover.objects.all().delete()
+        models.Patch.objects.all().delete()
+        models.Person.objects.filter(user=None).delete()
+
+    def assertEquivalent(self, batch_size, passes=1):
+        expected_results = []
+        for _ in range(passes):
+            expected_results += _summarize(self._parse_serial(self.mails))
+        expected = _dump()
+
+        self._reset()
+
+        results = []
+        for _ in range(passes):
+            results += _summarize(self._parse_bulk(self.mails, batch_size))
+
+        self.assertEqual(expected_results, results)
+        self.assertEqual(expected, _dump())
+
+    def test_single_batch(self):
+        self.assertEquivalent(len(self.mails))
+
+    def test_many_batches(self):
+        self.assertEquivalent(7)
+
+    def test_duplicates(self):
+        self.assertEquivalent(20, passes=2)
+
+    @unittest.skipUnless(
+        connection.features.can_return_rows_from_bulk_insert,
+        'mails are parsed one at a time on this database',
+    )
+    def test_query_count(self):
+        # the number of queries must not depend on the number of mails,
+        # though some backends split large inserts into multiple queries
+        with CaptureQueriesContext(connection) as context:
+            self._parse_bulk(self.mails, len(self.mails))
+
+        self.assertLess(len(context.captured_queries), 32)
+
+    @override_settings(MBOX_CACHE_TIMEOUT=60)
+    def test_mbox_invalidated(self):
+        cache.clear()
+        half = len(self.mails) // 2
+        self._parse_bulk(self.mails[:half], half)
+
+        def get_state():
+            return {
+                patch.id: (
+                    patch.comments.count(),
+                    Mbox(models.Patch, [patch.id]).etag,
+                )
+                for patch in models.Patch.objects.all()
+            }
+
+        before = get_state()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._parse_bulk(self.mails[half:], len(self.mails))
+
+        after = get_state()
+        commented = [
+            patch_id
+            for patch_id, (count, etag) in before.items()
+            if after[patch_id][0] > count
+        ]
+        self.assertTrue(commented)
+        for patch_id, (count, etag) in before.items():
+            with self.subTest(patch_id=patch_id):
+                self.assertEqual(
+                    patch_id in commented, after[patch_id][1] != etag
+                )
@@ -3,19 +3,47 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import email
+import gzip
+import json
+import mailbox
+import multiprocessing
 import os
+import shutil
+import subprocess
 import sys
 import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
 from io import StringIO
+from unittest import mock
+import unittest
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError
+from django.db import connection
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
 
 from patchwork import models
+from patchwork.management.commands import parsearchive
+from patchwork.management.commands import parsemaild
+from patchwork.management.commands import updatecommits
+from patchwork.search import get_search_kwargs
 from patchwork.tests import TEST_MAIL_DIR
+from patchwork.tests import TEST_SERIES_DIR
 from patchwork.tests import utils
 
 
+def skip_unless_can_fork(test):
+    # the processes running tests in parallel can't have worker processes
+    if multiprocessing.current_process().daemon:
+        test.skipTest('requires running tests in the main process')
+
+
 class ParsemailTest(TestCase):
     def test_invalid_path(self):
         # this can raise IOError, CommandError, or FileNotFoundError,
@@ -126,6 +154,460 @@ class ParsearchiveTest(TestCase):
         self.assertIn('Processed 1 messages -->', out.getvalue())
         self.assertIn('  1 dropped', out.getvalue())
 
+    def test_valid_mbox(self):
+        project = utils.create_project()
+        utils.create_state()
+
+        out = StringIO()
+        call_command(
+            'parsearchive',
+            os.path.join(TEST_SERIES_DIR, 'base-cover-letter.mbox'),
+            list_id=project.listid,
+            stdout=out,
+        )
+
+        self.assertIn('Processed 3 messages -->', out.getvalue())
+        self.assertIn('  1 cover letters', out.getvalue())
+        self.assertIn('  2 patches', out.getvalue())
+        self.assertEqual(models.Patch.objects.count(), 2)
+
+    def test_batch_size(self):
+        project = utils.create_project()
+        utils.create_state()
+
+        out = StringIO()
+        call_command(
+            'parsearchive',
+            os.path.join(TEST_SERIES_DIR, 'base-cover-letter.mbox'),
+            list_id=project.listid,
+            batch_size=2,
+            stdout=out,
+        )
+
+        self.assertIn('Processed 3 messages -->', out.getvalue())
+        self.assertIn('  1 cover letters', out.getvalue())
+        self.assertIn('  2 patches', out.getvalue())
+        self.assertEqual(models.Patch.objects.count(), 2)
+        self.assertEqual(models.Series.objects.count(), 1)
+
+    def test_compressed_mbox(self):
+        project = utils.create_project()
+        utils.create_state()
+
+        path = os.path.join(TEST_SERIES_DIR, 'base-cover-letter.mbox')
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        with tempfile.NamedTemporaryFile(suffix='.mbox.gz') as f:
+            f.write(gzip.compress(data))
+            f.flush()
+
+            out = StringIO()
+            call_command(
+                'parsearchive', f.name, list_id=project.listid, stdout=out
+            )
+
+        self.assertIn('Processed 3 messages -->', out.getvalue())
+        self.assertEqual(models.Patch.objects.count(), 2)
+
+    def test_stdin(self):
+        project = utils.create_project()
+        utils.create_state()
+
+        path = os.path.join(TEST_SERIES_DIR, 'base-cover-letter.mbox')
+        sys.stdin.close()
+        sys.stdin = open(path)
+        out = StringIO()
+        call_command(
+            'parsearchive', infile=None, list_id=project.listid, stdout=out
+        )
+        sys.stdin.close()
+
+        self.assertIn('Processed 3 messages -->', out.getvalue())
+        self.assertEqual(models.Patch.objects.count(), 2)
+
+    def test_broken_mail(self):
+        project = utils.create_project()
+        utils.create_state()
+
+        path = os.path.join(TEST_MAIL_DIR, '0001-git-pull-request.mbox')
+        with tempfile.NamedTemporaryFile(suffix='.mbox') as f:
+            # a mail with no 'From' header
+            f.write(
+                b'From nobody Thu Jan  1 00:00:00 1970\n'
+                b'Subject: [PATCH] Broken\n'
+                b'Message-Id: <broken@example.com>\n'
+                b'\n'
+                b'Hello\n'
+                b'\n'
+            )
+            with open(path, 'rb') as mail:
+                f.write(mail.read())
+            f.flush()
+
+            out = StringIO()
+            call_command(
+                'parsearchive', f.name, list_id=project.listid, stdout=out
+            )
+
+        # the broken mail shouldn't stop us parsing the rest of the archive
+        self.assertIn('Processed 2 messages -->', out.getvalue())
+        self.assertIn('  1 errors', out.getvalue())
+        self.assertEqual(models.Patch.objects.count(), 1)
+
+    def test_split_mbox(self):
+        path = os.path.join(TEST_SERIES_DIR, 'base-cover-letter.mbox')
+        mbox = mailbox.mbox(path, create=False)
+        expected = [mbox.get_bytes(key) for key in mbox.iterkeys()]
+        mbox.close()
+
+        with open(path, 'rb') as f:
+            self.assertEqual(expected, list(parsearchive.split_mbox(f)))
+
+    def test_invalid_jobs(self):
+        out = StringIO()
+        with self.assertRaises(SystemExit) as exc:
+            call_command(
+                'parsearchive',
+                os.path.join(TEST_MAIL_DIR, '0001-git-pull-request.mbox'),
+                jobs=0,
+                stdout=out,
+            )
+        self.assertEqual(exc.exception.code, 1)
+
+    def test_invalid_batch_size(self):
+        out = StringIO()
+        with self.assertRaises(SystemExit) as exc:
+            call_command(
+                'parsearchive',
+                os.path.join(TEST_MAIL_DIR, '0001-git-pull-request.mbox'),
+                batch_size=0,
+                stdout=out,
+            )
+        self.assertEqual(exc.exception.code, 1)
+
+    def test_partition_by_thread(self):
+        keys = [
+            ['<a>'],
+            ['<b>'],
+            ['<c>', '<a>'],
+            ['<d>', '<c>', '<a>'],
+            ['<e>', '<b>'],
+            ['<f>'],
+        ]
+        self.assertEqual(
+            [[0, 2, 3], [1, 4], [5]],
+            parsearchive.partition_by_thread(keys),
+        )
+
+    def test_partition_by_thread_merges_threads(self):
+        # a mail referencing two otherwise unrelated threads joins them
+        keys = [['<a>'], ['<b>'], ['<c>', '<a>', '<b>']]
+        self.assertEqual([[0, 1, 2]], parsearchive.partition_by_thread(keys))
+
+    def test_partition_by_thread_series(self):
+        mbox = mailbox.mbox(
+            os.path.join(TEST_SERIES_DIR, 'base-no-references.mbox'),
+            create=False,
+        )
+        keys = [parsearchive._thread_keys(mail) for mail in mbox]
+        mbox.close()
+
+        # unthreaded patches of the same series must stay together
+        self.assertEqual(
+            [list(range(len(keys)))], parsearchive.partition_by_thread(keys)
+        )
+
+    def test_partition_by_thread_series_dates(self):
+        def mail(msgid, date):
+            return email.message_from_string(
+                'Message-Id: <%s>\n'
+                'From: foo@example.com\n'
+                'Subject: [PATCH 1/2] foo\n'
+                'Date: %s\n\n' % (msgid, date)
+            )
+
+        keys = [
+            parsearchive._thread_keys(mail(msgid, date))
+            for msgid, date in (
+                ('a', 'Tue, 23 May 2017 13:19:05 +0000'),
+                ('b', 'Tue, 23 May 2017 13:21:05 +0000'),
+                ('c', 'Wed, 24 May 2017 13:21:05 +0000'),
+                ('d', 'Tue, 23 May 2017 13:32:05 +0000'),
+            )
+        ]
+
+        # only patches sent around the same time can be in the same series
+        self.assertEqual(
+            [[0, 1, 3], [2]], parsearchive.partition_by_thread(keys)
+        )
+
+    def test_create_senders(self):
+        person = utils.create_person(email='Old@example.com')
+
+        parsearchive.create_senders(
+            {
+                'old@example.com': ('Old', 'old@example.com'),
+                'new@example.com': ('New', 'new@example.com'),
+            }
+        )
+
+        # people are found without regard to the case of their email address
+        self.assertEqual(
+            person, models.Person.objects.get(email__iexact='old@example.com')
+        )
+        self.assertEqual(
+            'New', models.Person.objects.get(email='new@example.com').name
+        )
+
+
+class ParsearchiveJobsTest(TransactionTestCase):
+    def setUp(self):
+        skip_unless_can_fork(self)
+
+        # workers can't share an in-memory database, and with SQLite they
+        # fail to take turns writing to it
+        if connection.vendor == 'sqlite':
+            self.skipTest('requires a database allowing concurrent writes')
+
+        utils.create_state()
+
+        f = tempfile.NamedTemporaryFile(suffix='.mbox')
+        self.addCleanup(f.close)
+        for name in (
+            'base-no-references.mbox',
+            'revision-basic.mbox',
+            'mercurial-cover-letter.mbox',
+            'bugs-multiple-references.mbox',
+            'bugs-spamming.mbox',
+        ):
+            with open(os.path.join(TEST_SERIES_DIR, name), 'rb') as mbox:
+                f.write(mbox.read())
+        f.flush()
+        self.path = f.name
+
+    def _parse(self, jobs):
+        project = utils.create_project()
+
+        out = StringIO()
+        call_command(
+            'parsearchive',
+            self.path,
+            list_id=project.listid,
+            jobs=jobs,
+            stdout=out,
+        )
+        self.assertIn('  0 errors', out.getvalue())
+
+        return sorted(
+            (
+                series.name,
+                series.version,
+                series.total,
+                series.cover_letter.name if series.cover_letter else None,
+                sorted(series.patches.values_list('name', flat=True)),
+            )
+            for series in models.Series.objects.filter(project=project)
+        )
+
+    def test_jobs(self):
+        """Validate parsing in parallel gives the same series."""
+        series = self._parse(jobs=2)
+
+        self.assertEqual(self._parse(jobs=1), series)
+        self.assertEqual(
+            [2, 2, 4, 2, 2, 1, 1, 1],
+            [len(patches) for _, _, _, _, patches in series],
+        )
+
+    def test_jobs_new_sender(self):
+        """Validate workers don't race to create the same new sender."""
+        path = os.path.join(TEST_MAIL_DIR, '0001-git-pull-request.mbox')
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        f = tempfile.NamedTemporaryFile(suffix='.mbox')
+        self.addCleanup(f.close)
+        mbox = mailbox.mbox(f.name)
+        for i in range(2):
+            mail = email.message_from_bytes(data)
+            del mail['Message-ID']
+            mail['Message-ID'] = '<new-sender-%d@example.com>' % i
+            del mail['From']
+            mail['From'] = 'New Sender <new-sender@example.com>'
+            mbox.add(mail)
+        mbox.close()
+        self.path = f.name
+
+        self._parse(jobs=2)
+
+        person = models.Person.objects.get(email='new-sender@example.com')
+        self.assertEqual(
+            2, models.Patch.objects.filter(submitter=person).count()
+        )
+
+
+class ParsemaildTest(TransactionTestCase):
+    def setUp(self):
+        self.project = utils.create_project()
+        utils.create_state()
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.spool = parsemaild.Spool(
+            os.path.join(tmpdir.name, 'spool'),
+            os.path.join(tmpdir.name, 'failed'),
+        )
+
+        path = os.path.join(TEST_MAIL_DIR, '0001-git-pull-request.mbox')
+        with open(path, 'rb') as f:
+            self.mail = f.read()
+
+    def _create_daemon(self, **kwargs):
+        kwargs.setdefault('retry_delay', 0)
+        return parsemaild.Daemon(
+            self.spool, list_id=self.project.listid, **kwargs
+        )
+
+    def test_lmtp_session(self):
+        rfile = BytesIO(
+            b'LHLO localhost\r\n'
+            b'MAIL FROM:<sender@example.com>\r\n'
+            b'RCPT TO:<patchwork@example.com>\r\n'
+            b'RCPT TO:<patches@example.com>\r\n'
+            b'DATA\r\n'
+            b'Subject: test\r\n'
+            b'\r\n'
+            b'..dot-stuffed\r\n'
+            b'.\r\n'
+            b'QUIT\r\n'
+        )
+        wfile = BytesIO()
+        mails = []
+
+        def deliver(data):
+            mails.append(data)
+            return 'queued'
+
+        session = parsemaild.LMTPSession(rfile, wfile, deliver, 'localhost')
+        session.run()
+
+        self.assertEqual([b'Subject: test\n\n.dot-stuffed\n'], mails)
+        self.assertEqual(
+            [
+                b'220 localhost LMTP Patchwork ready',
+                b'250-localhost',
+                b'250-PIPELINING',
+                b'250-8BITMIME',
+                b'250 ENHANCEDSTATUSCODES',
+                b'250 2.1.0 Ok',
+                b'250 2.1.5 Ok',
+                b'250 2.1.5 Ok',
+                b'354 End data with <CR><LF>.<CR><LF>',
+                b'250 2.0.0 Ok: queued as queued',
+                b'250 2.0.0 Ok: queued as queued',
+                b'221 2.0.0 Bye',
+            ],
+            wfile.getvalue().splitlines(),
+        )
+
+    def test_lmtp_session_invalid_sequence(self):
+        rfile = BytesIO(
+            b'MAIL FROM:<sender@example.com>\r\n'
+            b'LHLO localhost\r\n'
+            b'DATA\r\n'
+            b'HELO localhost\r\n'
+        )
+        wfile = BytesIO()
+
+        session = parsemaild.LMTPSession(rfile, wfile, None, 'localhost')
+        session.run()
+
+        replies = wfile.getvalue().splitlines()
+        self.assertEqual(b'503 5.5.1 Send LHLO first', replies[1])
+        self.assertEqual(b'503 5.5.1 Send RCPT first', replies[6])
+        self.assertEqual(b'500 5.5.2 Command not recognized', replies[7])
+
+    def test_process(self):
+        daemon = self._create_daemon()
+        name = self.spool.deliver(self.mail)
+
+        self.assertEqual('parsed', daemon.process(name))
+        self.assertEqual(1, models.Patch.objects.count())
+        self.assertEqual([], self.spool.names())
+
+    def test_process_invalid_mail(self):
+        daemon = self._create_daemon()
+        name = self.spool.deliver(b'Subject: test\n\nNo sender\n')
+
+        self.assertEqual('failed', daemon.process(name))
+        self.assertEqual([], self.spool.names())
+        self.assertEqual(
+            [name],
+            os.listdir(os.path.join(self.spool.dead_letter_path, 'new')),
+        )
+
+    def test_process_transient_error(self):
+        daemon = self._create_daemon()
+        name = self.spool.deliver(self.mail)
+
+        with mock.patch.object(
+            parsemaild,
+            'parse_mail',
+            side_effect=[OperationalError('connection lost'), None],
+        ) as parse_mail:
+            self.assertEqual('parsed', daemon.process(name))
+
+        self.assertEqual(2, parse_mail.call_count)
+        self.assertEqual([], self.spool.names())
+
+    def test_process_transient_error_deferred(self):
+        daemon = self._create_daemon(retries=2)
+        name = self.spool.deliver(self.mail)
+
+        with mock.patch.object(
+            parsemaild,
+            'parse_mail',
+            side_effect=OperationalError('connection lost'),
+        ) as parse_mail:
+            self.assertEqual('deferred', daemon.process(name))
+
+        self.assertEqual(3, parse_mail.call_count)
+        self.assertEqual([name], self.spool.names())
+
+    def test_scan(self):
+        daemon = self._create_daemon(queue_size=2)
+        for _ in range(3):
+            self.spool.deliver(self.mail)
+
+        daemon.scan()
+        self.assertEqual(2, daemon.queued)
+        self.assertEqual(3, daemon.depth)
+
+        # mails that are already queued must not be queued again
+        daemon.scan()
+        self.assertEqual(2, daemon.queued)
+        self.assertEqual(3, daemon.depth)
+
+    def test_workers(self):
+        daemon = self._create_daemon(workers=2)
+        daemon.start()
+        try:
+            daemon.deliver(self.mail)
+
+            for _ in range(100):
+                if not self.spool.names():
+                    break
+                time.sleep(0.1)
+        finally:
+            daemon.stop()
+
+        self.assertEqual(1, models.Patch.objects.count())
+        self.assertIn(
+            'Queue depth 0, 0 queued, parsed 1, deferred 0, failed 0',
+            daemon.stats.report(daemon.depth, daemon.queued),
+        )
+
 
 class ReplacerelationsTest(TestCase):
     def test_invalid_path(self):
@@ -168,3 +650,424 @@ class ReplacerelationsTest(TestCase):
         call_command('replacerelations', f2.name, stdout=out)
         self.assertEqual(models.PatchRelation.objects.count(), 3)
         os.unlink(f2.name)
+
+
+class CompresstextTest(TestCase):
+    def get_stored(self, patch):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT diff FROM patchwork_patch WHERE id = %s', [patch.id]
+            )
+            return cursor.fetchone()[0]
+
+    def test_compress(self):
+        diff = utils.read_patch('0001-add-line.patch') * 10
+        patches = [utils.create_patch(diff=diff) for _ in range(3)]
+        utils.create_patch_comment(patch=patches[0], content='foo ' * 100)
+
+        with override_settings(TEXT_FIELD_COMPRESSION='zlib'):
+            out = StringIO()
+            call_command('compresstext', chunk_size=2, stdout=out)
+            self.assertIn('patches: 000003/000003', out.getvalue())
+            self.assertIn('patch comments: 000001/000001', out.getvalue())
+
+            for patch in patches:
+                self.assertTrue(self.get_stored(patch).startswith('\x1bz:'))
+                patch.refresh_from_db()
+                self.assertEqual(diff, patch.diff)
+
+            # nothing is left to compress
+            out = StringIO()
+            call_command('compresstext', stdout=out)
+            self.assertIn('patches: 000000/000000', out.getvalue())
+
+        # disabling compression decompresses everything again
+        call_command('compresstext', stdout=StringIO())
+
+        for patch in patches:
+            self.assertEqual(diff, self.get_stored(patch))
+
+    def test_invalid_method(self):
+        with override_settings(TEXT_FIELD_COMPRESSION='foo'):
+            with self.assertRaises(CommandError):
+                call_command('compresstext', stdout=StringIO())
+
+
+class RehashTest(TestCase):
+    def test_rehash(self):
+        patches = utils.create_patches(3)
+        models.Patch.objects.filter(id__in=[p.id for p in patches]).update(
+            hash=None
+        )
+
+        call_command('rehash', stdout=StringIO())
+
+        for patch in patches:
+            patch.refresh_from_db()
+            self.assertIsNotNone(patch.hash)
+
+    def test_rehash_git_patch_id(self):
+        patch = utils.create_patch(
+            diff=utils.read_patch('0001-add-line.patch')
+        )
+        git_patch_id = patch.git_patch_id
+        models.Patch.objects.update(hash=None, git_patch_id=None)
+
+        call_command('rehash', stdout=StringIO())
+
+        patch.refresh_from_db()
+        self.assertIsNotNone(git_patch_id)
+        self.assertEqual(git_patch_id, patch.git_patch_id)
+
+    def test_rehash_patch_ids(self):
+        patches = utils.create_patches(2)
+        models.Patch.objects.update(hash=None)
+
+        call_command('rehash', patches[0].id, stdout=StringIO())
+
+        patches[0].refresh_from_db()
+        patches[1].refresh_from_db()
+        self.assertIsNotNone(patches[0].hash)
+        self.assertIsNone(patches[1].hash)
+
+    def test_rehash_project(self):
+        project = utils.create_project()
+        patch_a = utils.create_patch(project=project)
+        patch_b = utils.create_patch()
+        models.Patch.objects.update(hash=None)
+
+        call_command('rehash', project=project.linkname, stdout=StringIO())
+
+        patch_a.refresh_from_db()
+        patch_b.refresh_from_db()
+        self.assertIsNotNone(patch_a.hash)
+        self.assertIsNone(patch_b.hash)
+
+    def test_rehash_since(self):
+        patch_a = utils.create_patch(date=datetime(2020, 1, 2))
+        patch_b = utils.create_patch(date=datetime(2019, 12, 31))
+        models.Patch.objects.update(hash=None)
+
+        call_command('rehash', since='2020-01-01', stdout=StringIO())
+
+        patch_a.refresh_from_db()
+        patch_b.refresh_from_db()
+        self.assertIsNotNone(patch_a.hash)
+        self.assertIsNone(patch_b.hash)
+
+    def test_invalid_options(self):
+        for options in (
+            {'project': 'xyz123random'},
+            {'since': 'yesterday'},
+            {'jobs': 0},
+            {'chunk_size': 0},
+        ):
+            with self.subTest(options=options):
+                with self.assertRaises(CommandError):
+                    call_command('rehash', stdout=StringIO(), **options)
+
+
+class RetagTest(TestCase):
+    fixtures = ['default_tags']
+
+    def test_retag(self):
+        project = utils.create_project(use_tags=True)
+        patch = utils.create_patch(project=project)
+        utils.create_patch_comment(
+            patch=patch, content='Acked-by: Test User <test@example.com>\n'
+        )
+        utils.create_patch_comment(
+            patch=patch, content='Tested-by: Test User <test@example.com>\n'
+        )
+        acked_by = models.Tag.objects.get(name='Acked-by')
+        reviewed_by = models.Tag.objects.get(name='Reviewed-by')
+        tested_by = models.Tag.objects.get(name='Tested-by')
+
+        models.PatchTag.objects.all().delete()
+        models.PatchTag.objects.create(patch=patch, tag=tested_by, count=3)
+        models.PatchTag.objects.create(patch=patch, tag=reviewed_by, count=1)
+        models.Patch.objects.filter(pk=patch.pk).update(
+            tag_counts={str(tested_by.id): 3, str(reviewed_by.id): 1}
+        )
+
+        call_command('retag', chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            dict(
+                models.PatchTag.objects.filter(patch=patch).values_list(
+                    'tag__name', 'count'
+                )
+            ),
+            {acked_by.name: 1, tested_by.name: 1},
+        )
+        patch.refresh_from_db()
+        self.assertEqual(
+            {str(acked_by.id): 1, str(tested_by.id): 1}, patch.tag_counts
+        )
+
+    def test_retag_project_without_tags(self):
+        project = utils.create_project(use_tags=False)
+        patch = utils.create_patch(project=project)
+        utils.create_patch_comment(
+            patch=patch, content='Acked-by: Test User <test@example.com>\n'
+        )
+
+        call_command('retag', stdout=StringIO())
+
+        self.assertFalse(models.PatchTag.objects.exists())
+
+    def test_checkpoint(self):
+        project = utils.create_project(use_tags=True)
+        patches = utils.create_patches(3, project=project)
+        for patch in patches:
+            utils.create_patch_comment(
+                patch=patch, content='Acked-by: Test User <test@example.com>\n'
+            )
+        models.PatchTag.objects.all().delete()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'checkpoint')
+            key = {
+                'command': 'retag',
+                'patch_ids': [],
+                'project': None,
+                'since': None,
+            }
+            with open(path, 'w') as f:
+                json.dump({'key': key, 'done': [[0, patches[1].id]]}, f)
+
+            call_command('retag', checkpoint=path, stdout=StringIO())
+
+            self.assertFalse(os.path.exists(path))
+
+        self.assertEqual(
+            list(models.PatchTag.objects.values_list('patch', flat=True)),
+            [patches[2].id],
+        )
+
+    def test_checkpoint_mismatch(self):
+        utils.create_patch()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'checkpoint')
+            key = {
+                'command': 'rehash',
+                'patch_ids': [],
+                'project': None,
+                'since': None,
+            }
+            with open(path, 'w') as f:
+                json.dump({'key': key, 'done': []}, f)
+
+            with self.assertRaises(CommandError):
+                call_command('retag', checkpoint=path, stdout=StringIO())
+
+            self.assertTrue(os.path.exists(path))
+
+
+@unittest.skipUnless(shutil.which('git'), 'requires git')
+class ReindexTest(TestCase):
+    def test_reindex(self):
+        patches = utils.create_patches(2, content='Fix the frobnicator')
+        models.PatchSearch.objects.all().delete()
+
+        call_command('reindex', stdout=StringIO())
+
+        self.assertEqual(
+            sorted(p.id for p in patches),
+            sorted(
+                models.Patch.objects.filter(
+                    **get_search_kwargs('frobnicator')
+                ).values_list('id', flat=True)
+            ),
+        )
+
+
+class UpdatefilesTest(TestCase):
+    def test_updatefiles(self):
+        patch = utils.create_patch(
+            diff=utils.read_patch('0001-add-line.patch')
+        )
+        other = utils.create_patch(diff=None)
+        models.PatchFile.objects.create(patch=patch, path='stale')
+
+        call_command('updatefiles', stdout=StringIO())
+
+        self.assertEqual(
+            ['meep.text'],
+            list(patch.files.values_list('path', flat=True)),
+        )
+        self.assertFalse(other.files.exists())
+
+
+class _UpdatecommitsMixin(object):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.repo = self.tmpdir.name
+
+        self._git('init', '-q')
+        self.revs = []
+        for i in range(3):
+            with open(os.path.join(self.repo, 'file'), 'a') as f:
+                f.write('line %d\n' % i)
+            self._git('add', 'file')
+            self._git('commit', '-q', '-m', 'Commit %d' % i)
+            self.revs.append(self._git('rev-parse', 'HEAD').strip())
+
+        self.project = utils.create_project(send_notifications=True)
+        self.state = utils.create_state(name='Accepted')
+
+    def _git(self, *args):
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME='Test',
+            GIT_AUTHOR_EMAIL='test@example.com',
+            GIT_COMMITTER_NAME='Test',
+            GIT_COMMITTER_EMAIL='test@example.com',
+        )
+        return subprocess.check_output(
+            ['git', '-C', self.repo, *args], env=env, text=True
+        )
+
+    def _create_patch(self, rev, **kwargs):
+        diff = self._git('diff', '%s~..%s' % (rev, rev))
+        return utils.create_patch(project=self.project, diff=diff, **kwargs)
+
+
+class UpdatecommitsTest(_UpdatecommitsMixin, TestCase):
+    def test_update(self):
+        patch_a = self._create_patch(self.revs[1])
+        patch_b = self._create_patch(self.revs[2])
+        patch_c = utils.create_patch(project=self.project)
+
+        out = StringIO()
+        call_command(
+            'updatecommits', self.repo, '%s..' % self.revs[0], stdout=out
+        )
+
+        self.assertIn('2 patch(es) updated to state Accepted', out.getvalue())
+
+        for patch, rev in ((patch_a, self.revs[1]), (patch_b, self.revs[2])):
+            orig_state = patch.state
+            patch.refresh_from_db()
+            self.assertEqual(patch.state, self.state)
+            self.assertEqual(patch.commit_ref, rev)
+
+            event = models.Event.objects.get(
+                patch=patch, category=models.Event.CATEGORY_PATCH_STATE_CHANGED
+            )
+            self.assertEqual(event.previous_state, orig_state)
+            self.assertEqual(event.current_state, self.state)
+
+            notification = models.PatchChangeNotification.objects.get(
+                patch=patch
+            )
+            self.assertEqual(notification.orig_state, orig_state)
+
+        patch_c.refresh_from_db()
+        self.assertIsNone(patch_c.commit_ref)
+        self.assertNotEqual(patch_c.state, self.state)
+
+    def test_update_batches(self):
+        patches = [self._create_patch(rev) for rev in self.revs[1:]]
+
+        call_command(
+            'updatecommits',
+            self.repo,
+            'HEAD',
+            batch_size=1,
+            stdout=StringIO(),
+        )
+
+        for patch, rev in zip(patches, self.revs[1:]):
+            patch.refresh_from_db()
+            self.assertEqual(patch.commit_ref, rev)
+
+    def test_update_project(self):
+        patch_a = self._create_patch(self.revs[1])
+        patch_b = self._create_patch(self.revs[1])
+        patch_b.project = utils.create_project()
+        patch_b.save()
+
+        call_command(
+            'updatecommits',
+            self.repo,
+            'HEAD',
+            project=self.project.linkname,
+            stdout=StringIO(),
+        )
+
+        patch_a.refresh_from_db()
+        patch_b.refresh_from_db()
+        self.assertEqual(patch_a.commit_ref, self.revs[1])
+        self.assertIsNone(patch_b.commit_ref)
+
+    def test_update_unchanged(self):
+        patch = self._create_patch(
+            self.revs[1], state=self.state, commit_ref=self.revs[1]
+        )
+
+        out = StringIO()
+        call_command('updatecommits', self.repo, 'HEAD', stdout=out)
+
+        self.assertIn('0 patch(es) updated', out.getvalue())
+        self.assertFalse(
+            models.Event.objects.filter(
+                patch=patch,
+                category=models.Event.CATEGORY_PATCH_STATE_CHANGED,
+            ).exists()
+        )
+
+    def test_invalid_options(self):
+        for options in (
+            {'state': 'xyz123random'},
+            {'project': 'xyz123random'},
+            {'jobs': 0},
+            {'batch_size': 0},
+        ):
+            with self.subTest(options=options):
+                with self.assertRaises(CommandError):
+                    call_command(
+                        'updatecommits',
+                        self.repo,
+                        'HEAD',
+                        stdout=StringIO(),
+                        **options,
+                    )
+
+    def test_invalid_revision(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'updatecommits', self.repo, 'xyz123random', stdout=StringIO()
+            )
+
+    def test_read_commits_invalid_utf8(self):
+        """Ensure diffs that aren't valid UTF-8 are read unchanged."""
+        with open(os.path.join(self.repo, 'file'), 'ab') as f:
+            f.write(b'caf\xe9\n')
+        self._git('commit', '-q', '-a', '-m', 'Latin-1')
+        rev = self._git('rev-parse', 'HEAD').strip()
+
+        commits = dict(updatecommits.read_commits(self.repo, ['HEAD~..']))
+
+        diff = commits[rev].encode('utf-8', 'surrogateescape')
+        self.assertIn(b'+caf\xe9\n', diff)
+
+
+class UpdatecommitsJobsTest(_UpdatecommitsMixin, TransactionTestCase):
+    def setUp(self):
+        skip_unless_can_fork(self)
+        super(UpdatecommitsJobsTest, self).setUp()
+
+    def test_update_jobs(self):
+        patches = [self._create_patch(rev) for rev in self.revs[1:]]
+
+        out = StringIO()
+        call_command('updatecommits', self.repo, 'HEAD', jobs=2, stdout=out)
+
+        self.assertIn('2 patch(es) updated', out.getvalue())
+        for patch, rev in zip(patches, self.revs[1:]):
+            patch.refresh_from_db()
+            self.assertEqual(patch.commit_ref, rev)
+            self.assertEqual(patch.state, self.state)
@@ -4,9 +4,13 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 from django.test import TestCase
+from django.test import override_settings
 from django.urls import reverse
 
+from patchwork.models import Patch
+from patchwork.paginator import get_count
 from patchwork.tests.utils import create_patches
+from patchwork.tests.utils import create_person
 from patchwork.tests.utils import create_project
 from patchwork.tests.utils import create_user
 
@@ -105,3 +109,127 @@ class PaginatorTest(TestCase):
         self.assertEqual(
             response.context['page'].object_list[0].id, self.patches[-1].id
         )
+
+
+@override_settings(LIST_COUNT_LIMIT=5)
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.user.profile.items_per_page = 3
+        self.user.profile.save()
+        self.project = create_project()
+        self.patches = create_patches(10, project=self.project)
+
+        # add some duplicate and NULL values to order by
+        unnamed = create_person(name=None)
+        for i, patch in enumerate(self.patches):
+            patch.name = 'patch%d' % (i % 3)
+            if i % 2:
+                patch.submitter = unnamed
+            if i % 4 == 0:
+                patch.delegate = self.user
+            patch.save()
+
+        self.client.login(
+            username=self.user.username, password=self.user.username
+        )
+
+    def _get_patches(self, params):
+        # searching the patches stops them being counted as they change
+        return self.client.get(
+            reverse(
+                'patch-list', kwargs={'project_id': self.project.linkname}
+            ),
+            dict({'q': 'patch'}, **params),
+        )
+
+    def _get_pages(self, params):
+        """Follow the next links from the first page, then the previous."""
+        response = self._get_patches(params)
+        self.assertEqual(response.status_code, 200)
+        pages = [response.context['page']]
+        self.assertFalse(pages[0].has_previous())
+        self.assertIsNone(pages[0].paginator.count)
+
+        while pages[-1].has_next():
+            response = self._get_patches(
+                dict(params, after=pages[-1].next_cursor)
+            )
+            pages.append(response.context['page'])
+            self.assertTrue(pages[-1].has_previous())
+
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            response = self._get_patches(
+                dict(params, before=back[-1].previous_cursor)
+            )
+            back.append(response.context['page'])
+            self.assertTrue(back[-1].has_next())
+
+        self.assertEqual(
+            [[p.id for p in page.object_list] for page in pages],
+            [[p.id for p in page.object_list] for page in reversed(back)],
+        )
+
+        return [p.id for page in pages for p in page.object_list]
+
+    def test_count(self):
+        """Ensure patches are counted up to the limit only."""
+        patches = Patch.objects.filter(project=self.project)
+        self.assertEqual(get_count(patches), 10)
+        self.assertEqual(get_count(patches, 10), 10)
+        self.assertIsNone(get_count(patches, 9))
+
+        with self.settings(LIST_COUNT_LIMIT=10):
+            response = self._get_patches({})
+        self.assertEqual(response.context['page'].paginator.count, 10)
+        self.assertEqual(response.context['page'].number, 1)
+
+    def test_navigation(self):
+        """Ensure all patches can be reached, in the same order as before."""
+        with self.settings(LIST_COUNT_LIMIT=None):
+            self.user.profile.items_per_page = 100
+            self.user.profile.save()
+            response = self._get_patches({})
+            expected = [p.id for p in response.context['page'].object_list]
+            self.user.profile.items_per_page = 3
+            self.user.profile.save()
+
+        self.assertEqual(self._get_pages({}), expected)
+
+        response = self._get_patches({})
+        self.assertContains(response, 'after=%d' % expected[2])
+        self.assertNotContains(response, 'page=2')
+
+    def test_order(self):
+        """Ensure all patches are reached whatever the order."""
+        for order in ('name', '-state', 'submitter', '-submitter', 'delegate'):
+            with self.subTest(order=order):
+                ids = self._get_pages({'order': order})
+                self.assertEqual(
+                    sorted(ids), sorted(p.id for p in self.patches)
+                )
+
+    def test_filtered(self):
+        """Ensure the cursor needn't be one of the patches shown."""
+        response = self._get_patches(
+            {'submitter': self.patches[0].submitter.id}
+        )
+        self.assertEqual(response.context['page'].paginator.count, 5)
+
+        with self.settings(LIST_COUNT_LIMIT=2):
+            response = self._get_patches(
+                {'delegate': self.user.id, 'after': self.patches[1].id}
+            )
+        ids = [p.id for p in response.context['page'].object_list]
+        self.assertEqual(ids, [self.patches[0].id])
+
+    def test_cursor_invalid(self):
+        """Ensure invalid cursors give the first page."""
+        for params in ({'after': 'foo'}, {'before': '0'}):
+            with self.subTest(params=params):
+                response = self._get_patches(params)
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page']
+                self.assertFalse(page.has_previous())
+                self.assertEqual(len(page.object_list), 3)
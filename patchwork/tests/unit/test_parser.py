@@ -8,7 +8,10 @@ from email import message_from_string
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import make_msgid
+import fnmatch
 import os
+import types
+from unittest import mock
 
 from django.test import TestCase
 from django.test import TransactionTestCase
@@ -17,6 +20,7 @@ from django.db import connection
 
 from patchwork.models import Cover
 from patchwork.models import CoverComment
+from patchwork.models import DelegationRule
 from patchwork.models import Patch
 from patchwork.models import PatchComment
 from patchwork.models import Person
@@ -923,6 +927,33 @@ class DelegateRequestTest(TestCase):
         self.assertDelegate(None)
 
 
+class PatchFilesTest(TestCase):
+    def test_files(self):
+        """Ensure the files changed by received patches are stored."""
+        project = create_project()
+        email = create_email(
+            read_patch('0001-add-line.patch'), listid=project.listid
+        )
+
+        parse_mail(email)
+
+        patch = Patch.objects.get(project=project)
+        self.assertEqual(
+            ['meep.text'], list(patch.files.values_list('path', flat=True))
+        )
+
+    def test_no_files(self):
+        """Ensure pull requests without diffs have no files."""
+        project = create_project()
+
+        parse_mail(
+            read_mail('0001-git-pull-request.mbox'), list_id=project.listid
+        )
+
+        patch = Patch.objects.get(project=project)
+        self.assertFalse(patch.files.exists())
+
+
 class CommentActionRequiredTest(TestCase):
     fixtures = ['default_tags']
 
@@ -1040,6 +1071,129 @@ class InitialPatchStateTest(TestCase):
         self.assertState(self.default_state)
 
 
+class DelegationMatcherTest(TestCase):
+    filenames = [
+        'README',
+        'Makefile',
+        'drivers/net/foo.c',
+        'drivers/net/foo.h',
+        'drivers/net/wireless/bar.c',
+        'drivers/gpu/baz.c',
+        'include/net/foo.h',
+        'net/core/dev.c',
+        'Documentation/index.rst',
+        'a[b].c',
+    ]
+
+    def assertMatches(self, paths):  # noqa
+        rules = [
+            types.SimpleNamespace(path=path, user=i)
+            for i, path in enumerate(paths)
+        ]
+        matcher = parser.DelegationMatcher(rules)
+
+        for filename in self.filenames:
+            expected = None
+            for rule in rules:
+                if fnmatch.fnmatch(filename, rule.path):
+                    expected = rule.user
+                    break
+
+            self.assertEqual(expected, matcher.match(filename), filename)
+
+    def test_no_rules(self):
+        self.assertMatches([])
+
+    def test_exact(self):
+        self.assertMatches(['README', 'drivers/net/foo.c', 'drivers/net'])
+
+    def test_prefix(self):
+        self.assertMatches(['drivers/net/*', 'drivers/*', '*', 'README*'])
+        self.assertMatches(['*', 'drivers/*', 'drivers/net/*'])
+
+    def test_pattern(self):
+        self.assertMatches(['*.h', 'drivers/*/*.c', '*/foo.?', 'a[b].c'])
+        self.assertMatches(['[A-Z]*', '*net*.c', '*[!c]', 'a[[]b].c'])
+
+    def test_priority(self):
+        self.assertMatches(
+            ['drivers/net/foo.c', 'drivers/*.c', 'drivers/*', '*.h', '*']
+        )
+        self.assertMatches(
+            ['*.c', 'drivers/*', 'drivers/net/foo.c', 'drivers/net/*']
+        )
+        self.assertMatches(['*/foo.?', 'README', '*', 'drivers/net/foo.c'])
+
+
+class ParserCacheTest(TestCase):
+    def setUp(self):
+        self.project = create_project(listid='test.example.com')
+        self.state = create_state(ordering=0)
+        self.user = create_user()
+        parser.cache.clear()
+
+    def test_project(self):
+        find = parser.find_project_by_id_and_subject
+        self.assertEqual(find('test.example.com', 'foo'), self.project)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(find('test.example.com', 'foo'), self.project)
+            self.assertIsNone(find('other.example.com', 'foo'))
+
+    def test_project_changed(self):
+        find = parser.find_project_by_id_and_subject
+        self.assertEqual(find('test.example.com', '[foo] bar'), self.project)
+
+        project = create_project(
+            listid='test.example.com', subject_match=r'\[foo\]'
+        )
+        self.assertEqual(find('test.example.com', '[foo] bar'), project)
+
+        project.subject_match = r'\[baz\]'
+        project.save()
+        self.assertEqual(find('test.example.com', '[foo] bar'), self.project)
+
+        self.project.delete()
+        self.assertIsNone(find('test.example.com', '[foo] bar'))
+
+    def test_state(self):
+        mail = create_email('test', headers={'X-Patchwork-State': 'new'})
+        self.assertEqual(parser.find_state(mail), self.state)
+
+        state = create_state(name='New')
+        with self.assertNumQueries(1):
+            self.assertEqual(parser.find_state(mail), state)
+            self.assertEqual(parser.find_state(mail), state)
+
+    def test_delegation_rule(self):
+        find = parser.find_delegate_by_filename
+        self.assertIsNone(find(self.project, ['foo.c']))
+
+        rule = DelegationRule.objects.create(
+            project=self.project, user=self.user, path='*.c'
+        )
+        self.assertEqual(find(self.project, ['foo.c']), self.user)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(find(self.project, ['foo.c']), self.user)
+
+        rule.path = '*.h'
+        rule.save()
+        self.assertIsNone(find(self.project, ['foo.c']))
+
+    def test_timeout(self):
+        parser.find_project_by_id_and_subject('test.example.com', 'foo')
+
+        with mock.patch.object(parser, 'CACHE_TIMEOUT', 0):
+            parser.cache.clear()
+            parser.find_project_by_id_and_subject('test.example.com', 'foo')
+
+            with self.assertNumQueries(1):
+                parser.find_project_by_id_and_subject(
+                    'test.example.com', 'foo'
+                )
+
+
 class ParseInitialTagsTest(PatchTest):
     fixtures = ['default_tags']
     patch_filename = '0001-add-line.patch'
@@ -1519,6 +1673,64 @@ class TestCommentCorrelation(TestCase):
 
         self.assertEqual(cover, result)
 
+    def test_find_patch_for_comment__closest_reply(self):
+        """Test that the closest reference wins, whatever its kind."""
+        project = create_project()
+        patch_a = create_patch(project=project)
+        patch_b = create_patch(project=project)
+        comment = create_patch_comment(patch=patch_b)
+
+        result = parser.find_patch_for_comment(
+            project, [comment.msgid, patch_a.msgid]
+        )
+
+        self.assertEqual(patch_b, result)
+
+    def test_find_patch_for_comment__other_project(self):
+        """Test that messages from other projects are ignored."""
+        patch = create_patch()
+
+        result = parser.find_patch_for_comment(create_project(), [patch.msgid])
+
+        self.assertIsNone(result)
+
+    def test_find_patch_for_comment__deleted(self):
+        """Test that deleted messages are no longer found."""
+        patch = create_patch()
+        comment = create_patch_comment(patch=patch)
+        comment.delete()
+
+        result = parser.find_patch_for_comment(patch.project, [comment.msgid])
+
+        self.assertIsNone(result)
+
+    def test_find_patch_for_comment__query_count(self):
+        """Test that the number of queries doesn't depend on the refs."""
+        project = create_project()
+        patch = create_patch(project=project)
+        refs = [make_msgid() for _ in range(30)] + [patch.msgid]
+
+        with self.assertNumQueries(2):
+            result = parser.find_patch_for_comment(project, refs)
+
+        self.assertEqual(patch, result)
+
+    def test_find_series__query_count(self):
+        """Test that the number of queries doesn't depend on the refs."""
+        project = create_project()
+        series = create_series(project=project)
+        msgid = make_msgid()
+        create_series_reference(project=project, series=series, msgid=msgid)
+        email = create_email(
+            'test',
+            references=' '.join([msgid] + [make_msgid() for _ in range(30)]),
+        )
+
+        with self.assertNumQueries(1):
+            result = parser._find_series_by_references(project, email)
+
+        self.assertEqual([series], list(result))
+
 
 class TestParseDependsOn(TestCase):
     def setUp(self):
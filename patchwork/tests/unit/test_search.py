@@ -0,0 +1,102 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+from django.test import TestCase
+
+from patchwork.models import Patch
+from patchwork.models import PatchSearch
+from patchwork.search import get_search_kwargs
+from patchwork.tests.utils import create_patch
+
+DIFF = """\
+--- a/drivers/net/foo.c
++++ b/drivers/net/foo.c
+@@ -1 +1 @@
+-int foo_probe(void)
++int foo_probe_device(void)
+"""
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.patch = create_patch(
+            name='[PATCH] net: Fix the widget driver',
+            content='The frobnicator was broken.\n\nSigned-off-by: Someone',
+            diff=DIFF,
+        )
+        self.other = create_patch(name='[PATCH] mm: Add a thing')
+
+    def assertSearchEqual(self, query, patches):  # noqa
+        self.assertEqual(
+            sorted(p.id for p in patches),
+            sorted(
+                Patch.objects.filter(**get_search_kwargs(query)).values_list(
+                    'id', flat=True
+                )
+            ),
+        )
+
+    def test_name(self):
+        """Ensure words of the name are found."""
+        self.assertSearchEqual('widget', [self.patch])
+        self.assertSearchEqual('WIDGET', [self.patch])
+        self.assertSearchEqual('PATCH', [self.patch, self.other])
+
+    def test_content(self):
+        """Ensure words of the commit message are found."""
+        self.assertSearchEqual('frobnicator', [self.patch])
+
+    def test_prefix(self):
+        """Ensure words starting with the words searched for are found."""
+        self.assertSearchEqual('frob', [self.patch])
+        self.assertSearchEqual('nicator', [])
+
+    def test_all_words(self):
+        """Ensure only patches containing every word are found."""
+        self.assertSearchEqual('net widget', [self.patch])
+        self.assertSearchEqual('net thing', [])
+        self.assertSearchEqual('"widget" (net)', [self.patch])
+
+    def test_no_words(self):
+        """Ensure searches without words search the names."""
+        self.assertSearchEqual('[', [self.patch, self.other])
+        self.assertSearchEqual(':', [self.patch, self.other])
+        self.assertSearchEqual('-', [])
+
+    def test_diff(self):
+        """Ensure the diff isn't searched."""
+        self.assertSearchEqual('foo_probe_device', [])
+        self.assertNotIn(
+            self.patch.diff,
+            PatchSearch.objects.get(patch=self.patch).document,
+        )
+
+    def test_update(self):
+        """Ensure changes to patches are searched."""
+        self.patch.name = '[PATCH] net: Fix the gadget driver'
+        self.patch.save()
+
+        self.assertSearchEqual('widget', [])
+        self.assertSearchEqual('gadget', [self.patch])
+
+    def test_update_other_fields(self):
+        """Ensure the patch isn't indexed again if its text is unchanged."""
+        patch = Patch.objects.defer('content', 'diff').get(pk=self.patch.pk)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(patch._changed(*Patch.SEARCH_FIELDS))
+
+        patch.archived = True
+        patch.save()
+
+        self.assertSearchEqual('frobnicator', [self.patch])
+
+    def test_delete(self):
+        """Ensure deleted patches aren't searched."""
+        patch_id = self.patch.id
+        self.patch.delete()
+
+        self.assertSearchEqual('widget', [])
+        self.assertFalse(PatchSearch.objects.filter(patch=patch_id).exists())
@@ -3,12 +3,19 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+from email.mime.text import MIMEText
+from email.utils import make_msgid
 import mailbox
 import os
+import random
+import threading
 import unittest
 import tempfile
 
+from django.db import connection
+from django.db import transaction
 from django.test import TestCase
+from django.test import TransactionTestCase
 
 from patchwork import models
 from patchwork import parser
@@ -683,6 +690,83 @@ class MercurialSeriesTest(_BaseTestCase):
         self.assertSerialized(patches, [2])
 
 
+class SeriesLockTest(TransactionTestCase):
+    def setUp(self):
+        utils.create_state()
+        self.project = utils.create_project()
+
+    def _create_mail(self, subject, msgid, in_reply_to=None, diff=None):
+        mail = MIMEText('Test message\n' + (diff or ''))
+        mail['Message-Id'] = msgid
+        mail['Subject'] = subject
+        mail['From'] = 'Test Author <test-author@example.com>'
+        mail['List-Id'] = self.project.listid
+        mail['Date'] = 'Sun, 1 Jan 2017 00:00:00 +0000'
+        if in_reply_to:
+            mail['In-Reply-To'] = in_reply_to
+            mail['References'] = in_reply_to
+        return mail
+
+    def _create_series(self, total):
+        cover_msgid = make_msgid()
+        mails = [self._create_mail('[PATCH 0/%d] Test' % total, cover_msgid)]
+        for number in range(1, total + 1):
+            mails.append(
+                self._create_mail(
+                    '[PATCH %d/%d] Test %d' % (number, total, number),
+                    make_msgid(),
+                    cover_msgid,
+                    utils.SAMPLE_DIFF,
+                )
+            )
+        return mails
+
+    def test_lock_series(self):
+        keys = [('thread', '<foo@example.com>'), ('markers', 1, 1, 2)]
+
+        with transaction.atomic():
+            parser.lock_series(self.project, keys)
+            count = models.SeriesLock.objects.count()
+            parser.lock_series(self.project, keys)
+
+        self.assertIn(count, [1, 2])
+        self.assertEqual(count, models.SeriesLock.objects.count())
+
+    @unittest.skipUnless(
+        connection.features.has_select_for_update,
+        'the database does not support concurrent writers',
+    )
+    def test_concurrent(self):
+        """Parse the patches of a series concurrently."""
+        mails = self._create_series(20)
+        random.Random(0).shuffle(mails)
+        errors = []
+
+        def parse(mails):
+            try:
+                for mail in mails:
+                    parser.parse_mail(mail, self.project.listid)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=parse, args=(mails[i::4],))
+            for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(1, models.Series.objects.count())
+        self.assertEqual(1, models.Cover.objects.count())
+        self.assertEqual(20, models.Patch.objects.count())
+        self.assertFalse(models.Patch.objects.filter(series=None).exists())
+
+
 class SeriesNameTestCase(TestCase):
     def setUp(self):
         self.project = utils.create_project()
@@ -805,6 +889,22 @@ class SeriesNameTestCase(TestCase):
         mbox.close()
 
 
+class SeriesAddPatchTest(TestCase):
+    def test_counts_kept(self):
+        """Ensure adding a patch doesn't overwrite its check counts."""
+        series = utils.create_series()
+        patch = utils.create_patch(project=series.project)
+        stale = models.Patch.objects.get(pk=patch.pk)
+        utils.create_check(patch=patch, state=models.Check.STATE_FAIL)
+
+        series.add_patch(stale, 1)
+
+        patch = models.Patch.objects.get(pk=patch.pk)
+        self.assertEqual(series, patch.series)
+        self.assertEqual(1, patch.number)
+        self.assertEqual(1, patch.checks_fail)
+
+
 class SeriesDependencyBase(TestCase):
     """
     Base class for test cases that test series dependencies.
@@ -6,6 +6,8 @@
 from django.test import TestCase
 
 from patchwork.models import Event
+from patchwork.models import Patch
+from patchwork.models import PatchCount
 from patchwork.tests import utils
 
 BASE_FIELDS = [
@@ -130,6 +132,26 @@ class PatchChangedTest(_BaseTestCase):
             events[1], previous_state=old_state, current_state=new_state
         )
 
+    def test_patch_state_changed_queries(self):
+        patch = utils.create_patch()
+        new_state = utils.create_state()
+        patch = Patch.objects.get(pk=patch.pk)
+
+        patch.state = new_state
+
+        # the original values of the tracked fields are fetched once for all
+        # signal handlers; then the project is fetched for the event, the
+        # event and patch are saved, and the counts of both states updated,
+        # creating that of the new state
+        with self.assertNumQueries(7):
+            patch.save()
+
+        events = _get_events(
+            patch=patch, category=Event.CATEGORY_PATCH_STATE_CHANGED
+        )
+        self.assertEqual(events.count(), 1)
+        self.assertEqual(events[0].current_state, new_state)
+
     def test_patch_delegated(self):
         # purposefully setting series to None to minimize additional events
         patch = utils.create_patch(series=None)
@@ -311,3 +333,75 @@ class PatchCommentCreatedTest(_BaseTestCase):
         )
         self.assertEqual(events[0].project, comment.patch.project)
         self.assertEventFields(events[0])
+
+
+class PatchCountTest(TestCase):
+    def assertCounts(self, project, active, archived):
+        self.assertEqual(
+            PatchCount.total(project=project, archived=False), active
+        )
+        self.assertEqual(
+            PatchCount.total(project=project, archived=True), archived
+        )
+
+    def test_patch_count(self):
+        """Ensure patches are counted as they're changed."""
+        project = utils.create_project()
+        state = utils.create_state()
+        user = utils.create_user()
+        patches = utils.create_patches(3, project=project)
+        self.assertCounts(project, 3, 0)
+
+        patches[0].archived = True
+        patches[0].save()
+        self.assertCounts(project, 2, 1)
+
+        patches[1].state = state
+        patches[1].delegate = user
+        patches[1].save()
+        self.assertEqual(PatchCount.total(project=project, state=state), 1)
+        self.assertEqual(PatchCount.total(delegate=user), 1)
+
+        patches[1].delete()
+        self.assertCounts(project, 1, 1)
+        self.assertEqual(PatchCount.total(delegate=user), 0)
+
+        Patch.bulk_set_state([patches[2]], state)
+        self.assertEqual(PatchCount.total(project=project, state=state), 1)
+
+    def test_delete_project(self):
+        """Ensure projects with patches can be deleted."""
+        project = utils.create_project()
+        utils.create_patches(2, project=project)
+
+        project.delete()
+
+        self.assertFalse(PatchCount.objects.filter(project=project.id))
+
+    def test_delete_state(self):
+        """Ensure states with patches can be deleted."""
+        project = utils.create_project()
+        state = utils.create_state()
+        utils.create_patches(2, project=project, state=state)
+        utils.create_patches(1, project=project)
+
+        state.delete()
+
+        self.assertFalse(PatchCount.objects.filter(state=state.id))
+        self.assertCounts(project, 1, 0)
+
+    def test_total_other_fields(self):
+        """Ensure patches filtered on other fields aren't counted."""
+        self.assertIsNone(PatchCount.total(name__icontains='foo'))
+        self.assertEqual(PatchCount.total(state__action_required=True), 0)
+
+    def test_refresh(self):
+        """Ensure counts can be fixed after changes without signals."""
+        project = utils.create_project()
+        utils.create_patches(3, project=project)
+        Patch.objects.filter(project=project).update(archived=True)
+        self.assertCounts(project, 3, 0)
+
+        self.assertEqual(PatchCount.refresh(project=project), 2)
+        self.assertCounts(project, 0, 3)
+        self.assertEqual(PatchCount.refresh(), 0)
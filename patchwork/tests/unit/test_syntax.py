@@ -0,0 +1,134 @@
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+import re
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.test import override_settings
+from django.utils.html import escape
+
+from patchwork.templatetags import syntax
+from patchwork.tests.unit.test_hasher import read_diffs
+
+
+def reference_highlight_patch(diff):
+    """The original implementation of 'patchsyntax', kept for comparison."""
+    span = '<span class="%s">%s</span>'
+    patch_span_res = [
+        (re.compile(regex, re.M | re.I), cls)
+        for regex, cls in [
+            (r'^(Index:?|diff|\-\-\-|\+\+\+|\*\*\*) .*$', 'p_header'),
+            (r'^\+.*$', 'p_add'),
+            (r'^-.*$', 'p_del'),
+            (r'^!.*$', 'p_mod'),
+        ]
+    ]
+    patch_chunk_re = re.compile(
+        r'^(@@ \-\d+(?:,\d+)? \+\d+(?:,\d+)? @@)(.*)$', re.M | re.I
+    )
+
+    diff = escape(diff).replace('\r\n', '\n')
+
+    for regex, cls in patch_span_res:
+        diff = regex.sub(lambda x: span % (cls, x.group(0)), diff)
+
+    diff = patch_chunk_re.sub(
+        lambda x: ' '.join(
+            [
+                span % ('p_chunk', x.group(1)),
+                span % ('p_context', x.group(2)),
+            ],
+        ),
+        diff,
+    )
+
+    return diff
+
+
+class HighlightPatchTest(SimpleTestCase):
+    def assertMarkupEqual(self, diff):  # noqa
+        self.assertEqual(
+            reference_highlight_patch(diff), syntax.highlight_patch(diff)
+        )
+
+    def test_corpus(self):
+        """Ensure the markup of the test data is unchanged."""
+        for name, diff in read_diffs():
+            with self.subTest(name=name):
+                self.assertMarkupEqual(diff)
+
+    def test_lines(self):
+        """Ensure each type of line is marked up as before."""
+        for diff in (
+            '',
+            '\n',
+            'Index: foo\n',
+            'index 3d75d48..a57f4dd 100644\n',
+            'DIFF --git a/foo b/foo\n',
+            'diff\n',
+            '--- a/foo\n+++ b/foo\n*** foo\n',
+            '---\n+++\n-- \n++ \n',
+            '+<foo & "bar">\n-\'baz\'\n!qux\n',
+            '@@ -1 +1 @@\n@@ -1,2 +1,3 @@ int foo(void)\n',
+            '@@ -1 +1\n@@ -a +b @@\n@@@ -1,2 -1,2 +1,3 @@@\n',
+            '\r\n+foo\r\n-bar\r\r\n\rbaz\n',
+            '+foo\n\x1c+bar\x85-baz !qux\n',
+            ' foo\n+bar',
+        ):
+            with self.subTest(diff=diff):
+                self.assertMarkupEqual(diff)
+
+
+@override_settings(DIFF_CACHE_TIMEOUT=60)
+class PatchSyntaxTest(SimpleTestCase):
+    diff = '--- a/foo\n+++ b/foo\n@@ -1 +1,2 @@\n foo\n+bar\n'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached(self):
+        """Ensure the markup of a diff is only generated once."""
+        patch = mock.Mock(diff=self.diff)
+
+        with mock.patch.object(
+            syntax, 'highlight_patch', wraps=syntax.highlight_patch
+        ) as highlight:
+            first = syntax.patchsyntax(patch)
+            second = syntax.patchsyntax(mock.Mock(diff=self.diff))
+
+        highlight.assert_called_once_with(self.diff)
+        self.assertEqual(syntax.highlight_patch(self.diff), first)
+        self.assertEqual(first, second)
+
+    def test_cached_by_diff(self):
+        """Ensure the markup of a different diff isn't reused."""
+        first = syntax.patchsyntax(mock.Mock(diff=self.diff))
+        second = syntax.patchsyntax(mock.Mock(diff=self.diff + '-baz\n'))
+
+        self.assertNotEqual(first, second)
+
+    @override_settings(DIFF_CACHE_TIMEOUT=0)
+    def test_not_cached(self):
+        """Ensure the markup isn't cached if disabled."""
+        with mock.patch.object(
+            syntax, 'highlight_patch', wraps=syntax.highlight_patch
+        ) as highlight:
+            syntax.patchsyntax(mock.Mock(diff=self.diff))
+            syntax.patchsyntax(mock.Mock(diff=self.diff))
+
+        self.assertEqual(2, highlight.call_count)
+
+    @override_settings(DIFF_CACHE_MAX_SIZE=10)
+    def test_not_cached_large(self):
+        """Ensure the markup of large diffs isn't cached."""
+        with mock.patch.object(
+            syntax, 'highlight_patch', wraps=syntax.highlight_patch
+        ) as highlight:
+            syntax.patchsyntax(mock.Mock(diff=self.diff))
+            syntax.patchsyntax(mock.Mock(diff=self.diff))
+
+        self.assertEqual(2, highlight.call_count)
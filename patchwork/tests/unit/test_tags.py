@@ -3,6 +3,8 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+from unittest import mock
+
 from django.test import TestCase
 from django.test import TransactionTestCase
 
@@ -69,6 +71,17 @@ class ExtractTagsTest(TestCase):
     def test_ack_in_reply(self):
         self.assertTagsEqual('> Acked-by: %s\n' % self.name_email, 0, 0, 0)
 
+    def test_ack_after_text(self):
+        str = 'foo\nbar\nAcked-by: %s\nAcked-by: %s' % ((self.email,) * 2)
+        self.assertTagsEqual(str, 2, 0, 0)
+
+    def test_overlapping_patterns(self):
+        tag = Tag.objects.create(name='Acked', pattern=r'^Acked', abbrev='X')
+        str = 'Acked-by: %s\nAcked' % self.email
+        counts = Patch.extract_tags(str, Tag.objects.all())
+        self.assertEqual(1, counts[Tag.objects.get(name='Acked-by')])
+        self.assertEqual(2, counts[tag])
+
 
 class PatchTagsTest(TransactionTestCase):
     fixtures = ['default_tags']
@@ -169,28 +182,53 @@ class PatchTagsTest(TransactionTestCase):
         c1.save()
         self.assertTagsEqual(self.patch, 1, 1, 0)
 
+    def test_patch_update(self):
+        self.patch.content += '\n' + self.create_tag(self.ACK)
+        self.patch.save()
+        self.assertTagsEqual(self.patch, 1, 0, 0)
+
+    def test_patch_update_no_content_change(self):
+        self.create_tag_comment(self.patch, self.ACK)
+        patch = Patch.objects.get(pk=self.patch.pk)
+
+        with mock.patch.object(Patch, 'refresh_tag_counts') as refresh:
+            patch.archived = True
+            patch.save()
+
+        refresh.assert_not_called()
+        self.assertTagsEqual(self.patch, 1, 0, 0)
+
+    def test_comment_add_incremental(self):
+        self.create_tag_comment(self.patch, self.ACK)
 
-class PatchTagManagerTest(PatchTagsTest):
+        with mock.patch.object(Patch, 'refresh_tag_counts') as refresh:
+            self.create_tag_comment(self.patch, self.REVIEW)
+            self.create_tag_comment(self.patch, None)
+
+        refresh.assert_not_called()
+        self.assertTagsEqual(self.patch, 1, 1, 0)
+
+    def test_comment_delete_multiple(self):
+        self.create_tag_comment(self.patch, self.ACK)
+        comment = self.create_tag_comment(self.patch, self.ACK)
+        self.assertTagsEqual(self.patch, 2, 0, 0)
+        comment.delete()
+        self.assertTagsEqual(self.patch, 1, 0, 0)
+
+
+class PatchTagCountsTest(PatchTagsTest):
     def assertTagsEqual(self, patch, acks, reviews, tests):  # noqa
-        tagattrs = {}
-        for tag in Tag.objects.all():
-            tagattrs[tag.name] = tag.attr_name
-
-        # force project.tags to be queried outside of the assertNumQueries
-        patch.project.tags
-
-        # we should be able to do this with two queries: one for
-        # the patch table lookup, and the prefetch_related for the
-        # projects table.
-        with self.assertNumQueries(2):
-            patch = Patch.objects.with_tag_counts(project=patch.project).get(
-                pk=patch.pk
-            )
+        tags = {tag.name: tag for tag in Tag.objects.all()}
+
+        # the counts are stored with the patch, so we should be able to do
+        # this with only the patch table lookup
+        with self.assertNumQueries(1):
+            patch = Patch.objects.only('tag_counts').get(pk=patch.pk)
 
             counts = (
-                getattr(patch, tagattrs['Acked-by']),
-                getattr(patch, tagattrs['Reviewed-by']),
-                getattr(patch, tagattrs['Tested-by']),
+                patch.get_tag_count(tags['Acked-by']),
+                patch.get_tag_count(tags['Reviewed-by']),
+                patch.get_tag_count(tags['Tested-by']),
             )
 
         self.assertEqual(counts, (acks, reviews, tests))
@@ -117,14 +117,28 @@ class BundleMboxTest(BundleTestBase):
     def test_empty_bundle(self):
         response = self.client.get(bundle_mbox_url(self.bundle))
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.content, b'')
+        self.assertEqual(b''.join(response.streaming_content), b'')
 
     def test_non_empty_bundle(self):
         self.bundle.append_patch(self.patches[0])
 
         response = self.client.get(bundle_mbox_url(self.bundle))
         self.assertEqual(response.status_code, 200)
-        self.assertNotEqual(response.content, b'')
+        self.assertNotEqual(b''.join(response.streaming_content), b'')
+
+    def test_ordered_bundle(self):
+        for patch in reversed(self.patches[:3]):
+            self.bundle.append_patch(patch)
+
+        response = self.client.get(bundle_mbox_url(self.bundle))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            '\n'.join(
+                view_utils.patch_to_mbox(p) for p in reversed(self.patches[:3])
+            ),
+            b''.join(response.streaming_content).decode(),
+        )
 
 
 class BundleUpdateTest(BundleTestBase):
@@ -9,12 +9,17 @@ import re
 import unittest
 
 from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
+from django.test import override_settings
 from django.urls import reverse
 from django.utils import timezone as tz_utils
 
+from patchwork.forms import MultiplePatchForm
+from patchwork.forms import PatchForm
 from patchwork.models import Check
 from patchwork.models import Patch
+from patchwork.models import PatchFile
 from patchwork.models import State
 from patchwork.tests.utils import create_check
 from patchwork.tests.utils import create_maintainer
@@ -23,6 +28,7 @@ from patchwork.tests.utils import create_patch_comment
 from patchwork.tests.utils import create_patches
 from patchwork.tests.utils import create_person
 from patchwork.tests.utils import create_project
+from patchwork.tests.utils import create_series
 from patchwork.tests.utils import create_state
 from patchwork.tests.utils import create_user
 from patchwork.tests.utils import read_patch
@@ -202,6 +208,43 @@ class PatchListFilteringTest(TestCase):
 
         self.assertEqual(response.status_code, 200)
 
+    def test_search(self):
+        """Validate searching the names and commit messages of patches."""
+        project = create_project()
+        patch = create_patch(project=project, content='Fix the frobnicator')
+        create_patch(project=project)
+        url = reverse('patch-list', args=[project.linkname])
+
+        response = self.client.get(url, {'q': 'frob'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([patch], list(response.context['page'].object_list))
+        self.assertEqual(1, response.context['page'].paginator.count)
+
+    def test_path(self):
+        """Validate filtering patches by the files they change."""
+        project = create_project()
+        patch = create_patch(project=project)
+        PatchFile.add([(patch, ['drivers/net/foo.c', 'include/foo.h'])])
+        other = create_patch(project=project)
+        PatchFile.add([(other, ['drivers/usb/foo.c'])])
+        url = reverse('patch-list', args=[project.linkname])
+
+        for path, patches in (
+            ('drivers/net', [patch]),
+            ('drivers/', [patch, other]),
+            ('*.h', [patch]),
+            ('net', []),
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(url, {'path': path})
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    sorted(p.id for p in patches),
+                    sorted(p.id for p in response.context['page'].object_list),
+                )
+
 
 class PatchViewTest(TestCase):
     def test_redirect(self):
@@ -280,6 +323,71 @@ class PatchViewTest(TestCase):
         response = self.client.get(requested_url)
         self.assertRedirects(response, redirect_url)
 
+    def test_mbox_series(self):
+        series = create_series()
+        patches = create_patches(2, series=series)
+        url = reverse(
+            'patch-mbox',
+            kwargs={
+                'project_id': patches[1].project.linkname,
+                'msgid': patches[1].encoded_msgid,
+            },
+        )
+
+        response = self.client.get(url, {'series': '*'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        mbox = b''.join(response.streaming_content).decode()
+        self.assertIn(patches[0].content, mbox)
+        self.assertIn(patches[1].content, mbox)
+
+        response = self.client.get(url, {'series': series.id + 1})
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(MBOX_CACHE_TIMEOUT=60)
+    def test_mbox_etag(self):
+        cache.clear()
+        patch = create_patch()
+        url = reverse(
+            'patch-mbox',
+            kwargs={
+                'project_id': patch.project.linkname,
+                'msgid': patch.encoded_msgid,
+            },
+        )
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        mbox = b''.join(response.streaming_content)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(etag, response['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            patch.content = 'Fix the frobnicator'
+            patch.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(etag, response['ETag'])
+        self.assertNotEqual(mbox, b''.join(response.streaming_content))
+
+    def test_mbox_no_etag(self):
+        patch = create_patch()
+        url = reverse(
+            'patch-mbox',
+            kwargs={
+                'project_id': patch.project.linkname,
+                'msgid': patch.encoded_msgid,
+            },
+        )
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
     def test_old_raw_url(self):
         patch = create_patch()
 
@@ -490,6 +598,27 @@ class PatchUpdateTest(TestCase):
         for patch in [Patch.objects.get(pk=p.pk) for p in self.patches]:
             self.assertEqual(patch.delegate, None)
 
+    def test_counts_kept(self):
+        """Ensure forms don't overwrite the counts of checks added since."""
+        state = create_state()
+        patch = Patch.objects.get(pk=self.patches[0].pk)
+        create_check(patch=self.patches[0], state=Check.STATE_FAIL)
+
+        form = MultiplePatchForm(
+            self.project, data={'archived': 'True', 'state': str(state.pk)}
+        )
+        self.assertTrue(form.is_valid())
+        form.save(patch)
+
+        form = PatchForm(data={'state': str(state.pk)}, instance=patch)
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        patch = Patch.objects.get(pk=patch.pk)
+        self.assertEqual(patch.state, state)
+        self.assertEqual(Check.STATE_FAIL, patch.check_state)
+        self.assertEqual(1, patch.checks_fail)
+
 
 class UTF8PatchViewTest(TestCase):
     def setUp(self):
@@ -513,7 +642,10 @@ class UTF8PatchViewTest(TestCase):
             )
         )
         self.assertEqual(response.status_code, 200)
-        self.assertTrue(self.patch.diff in response.content.decode('utf-8'))
+        self.assertTrue(
+            self.patch.diff
+            in b''.join(response.streaming_content).decode('utf-8')
+        )
 
     def test_raw_view(self):
         response = self.client.get(
@@ -407,6 +407,23 @@ class UserProfileTest(_UserTestCase):
         self.assertContains(response, 'You have 5')
         self.assertContains(response, reverse('user-todos'))
 
+    def test_user_todo_lists(self):
+        projects = [utils.create_project() for _ in range(3)]
+        for project, count in zip(projects, (2, 0, 1)):
+            for patch in utils.create_patches(count, project=project):
+                patch.delegate = self.user
+                patch.save()
+
+        response = self.client.get(reverse('user-todos'))
+
+        self.assertEqual(
+            [(projects[0], 2), (projects[2], 1)],
+            [
+                (todo['project'], todo['n_patches'])
+                for todo in response.context['todo_lists']
+            ],
+        )
+
     def test_user_profile_valid_post(self):
         user_profile = UserProfile.objects.get(user=self.user.id)
         old_ppp = user_profile.items_per_page
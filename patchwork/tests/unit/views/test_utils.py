@@ -9,16 +9,28 @@ import datetime
 import dateutil.parser
 import dateutil.tz
 import email
+from unittest import mock
 
+from django.core.cache import cache
+from django.db import connection
 from django.http import Http404
 from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone as tz_utils
 
+from patchwork.models import Cover
+from patchwork.models import Patch
+from patchwork.models import Person
+from patchwork.tests.utils import create_cover
+from patchwork.tests.utils import create_cover_comment
 from patchwork.tests.utils import create_patch
 from patchwork.tests.utils import create_patch_comment
+from patchwork.tests.utils import create_patches
 from patchwork.tests.utils import create_person
 from patchwork.tests.utils import create_project
 from patchwork.tests.utils import create_series
+from patchwork.tests.utils import create_state
 from patchwork.tests.utils import create_user
 from patchwork.views import utils
 
@@ -252,7 +264,7 @@ class MboxSeriesPatchTest(TestCase):
     def test_patch_with_wildcard_series(self):
         _, patch_a, patch_b = self._create_patches()
 
-        mbox = utils.series_patch_to_mbox(patch_b, '*')
+        mbox = ''.join(utils.series_patch_to_mbox(patch_b, '*'))
 
         self.assertIn(patch_a.content, mbox)
         self.assertIn(patch_b.content, mbox)
@@ -260,7 +272,7 @@ class MboxSeriesPatchTest(TestCase):
     def test_patch_with_numeric_series(self):
         series, patch_a, patch_b = self._create_patches()
 
-        mbox = utils.series_patch_to_mbox(patch_b, series.id)
+        mbox = ''.join(utils.series_patch_to_mbox(patch_b, series.id))
 
         self.assertIn(patch_a.content, mbox)
         self.assertIn(patch_b.content, mbox)
@@ -287,7 +299,247 @@ class MboxSeriesTest(TestCase):
         patch_a = create_patch(series=series)
         patch_b = create_patch(series=series)
 
-        mbox = utils.series_to_mbox(series)
+        mbox = ''.join(utils.series_to_mbox(series))
 
         self.assertIn(patch_a.content, mbox)
         self.assertIn(patch_b.content, mbox)
+
+    @mock.patch.object(utils, 'MBOX_BATCH_SIZE', 2)
+    def test_series_streamed(self):
+        """Validate patches are converted a batch at a time."""
+        series = create_series()
+        patches = create_patches(3, series=series)
+
+        with mock.patch.object(
+            utils, '_render_mbox', wraps=utils._render_mbox
+        ) as render_mbox:
+            mbox = iter(utils.series_to_mbox(series))
+            self.assertEqual(0, render_mbox.call_count)
+
+            first = next(mbox)
+            self.assertEqual(2, render_mbox.call_count)
+
+            rest = list(mbox)
+            self.assertEqual(3, render_mbox.call_count)
+
+        self.assertEqual(
+            '\n'.join(utils.patch_to_mbox(p) for p in patches),
+            first + ''.join(rest),
+        )
+
+    def test_series_queries(self):
+        """Validate the number of queries doesn't depend on the patches."""
+        series = create_series()
+        delegate = create_user()
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                ''.join(utils.series_to_mbox(series))
+            return len(queries)
+
+        patch = create_patch(series=series, delegate=delegate)
+        create_patch_comment(patch=patch)
+        expected = count_queries()
+
+        for _ in range(3):
+            patch = create_patch(
+                series=series, delegate=delegate, submitter=create_person()
+            )
+            create_patch_comment(patch=patch)
+            create_patch_comment(patch=patch)
+
+        self.assertEqual(expected, count_queries())
+
+
+class MboxBatchTest(TestCase):
+    def test_patches(self):
+        """Validate converting patches at once gives the same mboxes."""
+        patches = create_patches(3)
+        patches[1].delegate = create_user()
+        patches[1].save()
+        create_patch_comment(patch=patches[0], content='Acked-by: Foo <f@x>')
+        create_patch_comment(patch=patches[2], content='Tested-by: B <b@x>')
+
+        expected = [utils.patch_to_mbox(p) for p in patches]
+        patches = list(Patch.objects.filter(id__in=[p.id for p in patches]))
+
+        # submitters, projects, delegates and comments
+        with self.assertNumQueries(4):
+            mboxes = utils.submissions_to_mbox(patches)
+
+        self.assertEqual(expected, mboxes)
+        self.assertIn('Acked-by: Foo <f@x>', mboxes[0])
+        self.assertIn('Tested-by: B <b@x>', mboxes[2])
+
+    def test_covers(self):
+        """Validate converting cover letters at once gives the same mboxes."""
+        covers = [create_cover(), create_cover()]
+        create_cover_comment(cover=covers[1], content='Acked-by: Foo <f@x>')
+
+        expected = [utils.cover_to_mbox(c) for c in covers]
+        covers = list(Cover.objects.filter(id__in=[c.id for c in covers]))
+
+        # submitters, projects and comments
+        with self.assertNumQueries(3):
+            mboxes = utils.submissions_to_mbox(covers)
+
+        self.assertEqual(expected, mboxes)
+        self.assertIn('Acked-by: Foo <f@x>', mboxes[1])
+
+    def test_empty(self):
+        with self.assertNumQueries(0):
+            self.assertEqual([], utils.submissions_to_mbox([]))
+
+
+@override_settings(MBOX_CACHE_TIMEOUT=60)
+class MboxCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.series = create_series()
+        self.patches = create_patches(2, series=self.series)
+
+    def _get_mbox(self):
+        mbox = utils.series_to_mbox(self.series)
+        return mbox.etag, ''.join(mbox)
+
+    def test_cached(self):
+        """Validate mboxes are only converted once."""
+        etag, mbox = self._get_mbox()
+
+        with mock.patch.object(utils, '_render_mbox') as render_mbox:
+            self.assertEqual((etag, mbox), self._get_mbox())
+
+        render_mbox.assert_not_called()
+
+    @override_settings(MBOX_CACHE_TIMEOUT=0)
+    def test_not_cached(self):
+        """Validate mboxes aren't cached if disabled."""
+        mbox = utils.series_to_mbox(self.series)
+        self.assertIsNone(mbox.etag)
+        ''.join(mbox)
+
+        with mock.patch.object(
+            utils, '_render_mbox', wraps=utils._render_mbox
+        ) as render_mbox:
+            ''.join(utils.series_to_mbox(self.series))
+
+        self.assertEqual(2, render_mbox.call_count)
+
+    def test_patch_changed(self):
+        """Validate changes to patches are seen."""
+        etag, mbox = self._get_mbox()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patches[1].delegate = create_user(email='d@example.com')
+            self.patches[1].save()
+
+        new_etag, new_mbox = self._get_mbox()
+        self.assertNotEqual(etag, new_etag)
+        self.assertIn('X-Patchwork-Delegate: d@example.com', new_mbox)
+
+    def test_submitter_changed(self):
+        """Validate changes to the submitters of patches are seen."""
+        etag, mbox = self._get_mbox()
+
+        # people are updated in bulk when parsing mails, without signals
+        submitter = self.patches[0].submitter
+        Person.objects.filter(id=submitter.id).update(name='Jane Doe')
+
+        new_etag, new_mbox = self._get_mbox()
+        self.assertNotEqual(etag, new_etag)
+        self.assertIn('Jane Doe <%s>' % submitter.email, new_mbox)
+
+    def test_delegate_changed(self):
+        """Validate changes to the delegates of patches are seen."""
+        delegate = create_user(email='d@example.com')
+        self.patches[0].delegate = delegate
+        self.patches[0].save()
+        etag, mbox = self._get_mbox()
+
+        delegate.email = 'e@example.com'
+        delegate.save()
+
+        new_etag, new_mbox = self._get_mbox()
+        self.assertNotEqual(etag, new_etag)
+        self.assertIn('X-Patchwork-Delegate: e@example.com', new_mbox)
+
+    def test_project_changed(self):
+        """Validate changes to the projects of patches are seen."""
+        etag, mbox = self._get_mbox()
+
+        project = self.patches[0].project
+        project.listemail = 'other@example.com'
+        project.save()
+
+        self.assertNotEqual(etag, self._get_mbox()[0])
+
+    def test_comment_added(self):
+        """Validate new comments of patches are seen."""
+        etag, mbox = self._get_mbox()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_patch_comment(
+                patch=self.patches[0], content='Acked-by: Foo <f@x>'
+            )
+
+        new_etag, new_mbox = self._get_mbox()
+        self.assertNotEqual(etag, new_etag)
+        self.assertIn('Acked-by: Foo <f@x>', new_mbox)
+
+    def test_cover_comment_added(self):
+        """Validate new comments of cover letters are seen."""
+        cover = create_cover()
+        mbox = utils.Mbox(Cover, [cover.id])
+        etag = mbox.etag
+        ''.join(mbox)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_cover_comment(cover=cover, content='Acked-by: Foo <f@x>')
+
+        mbox = utils.Mbox(Cover, [cover.id])
+        self.assertNotEqual(etag, mbox.etag)
+        self.assertIn('Acked-by: Foo <f@x>', ''.join(mbox))
+
+    def test_state_changed(self):
+        """Validate patches changed in bulk are seen."""
+        etag, mbox = self._get_mbox()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Patch.bulk_set_state(self.patches[:1], create_state())
+
+        self.assertNotEqual(etag, self._get_mbox()[0])
+
+    def test_submissions(self):
+        """Validate submissions fetched already aren't fetched again."""
+        patch = Patch.objects.get(id=self.patches[0].id)
+        mbox = utils.Mbox(Patch, [patch.id], [patch])
+
+        with mock.patch.object(
+            utils, 'submissions_to_mbox', wraps=utils.submissions_to_mbox
+        ) as to_mbox:
+            ''.join(mbox)
+
+        to_mbox.assert_called_once()
+        self.assertIs(patch, to_mbox.call_args.args[0][0])
+
+    def test_series_changed(self):
+        """Validate patches added to a series are seen."""
+        etag, mbox = self._get_mbox()
+
+        patch = create_patch(series=self.series)
+
+        new_etag, new_mbox = self._get_mbox()
+        self.assertNotEqual(etag, new_etag)
+        self.assertIn(patch.content, new_mbox)
+
+    def test_uncommitted(self):
+        """Validate the cache is kept until changes are committed."""
+        etag, mbox = self._get_mbox()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.patches[0].content = 'Fix the frobnicator'
+            self.patches[0].save()
+
+            self.assertEqual(etag, self._get_mbox()[0])
+
+        self.assertEqual(1, len(callbacks))
@@ -10,6 +10,7 @@ from django.test import TestCase
 from django.test import override_settings
 from django.urls import reverse
 
+from patchwork.models import PatchFile
 from patchwork.tests import utils
 
 
@@ -207,6 +208,19 @@ class XMLRPCPatchTest(XMLRPCTest, XMLRPCFilterModelTestMixin):
         result = self.rpc.patch_get_by_hash(patch.hash)
         self.assertEqual(result['id'], patch.id)
 
+    def test_list_path(self):
+        patches = self.create_multiple(2)
+        PatchFile.add([(patches[0], ['drivers/net/foo.c'])])
+        PatchFile.add([(patches[1], ['drivers/usb/foo.c'])])
+
+        result = self.list_endpoint({'path': 'drivers/net/'})
+        self.assertEqual([patches[0].id], [x['id'] for x in result])
+
+        result = self.list_endpoint({'path': 'drivers/*/foo.c'})
+        self.assertEqual(
+            [p.id for p in patches], sorted(x['id'] for x in result)
+        )
+
 
 class XMLRPCPersonTest(XMLRPCTest, XMLRPCModelTestMixin):
     def setUp(self):
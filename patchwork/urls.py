@@ -223,6 +223,7 @@ if settings.ENABLE_REST_API:
     from patchwork.api import comment as api_comment_views  # noqa
     from patchwork.api import cover as api_cover_views  # noqa
     from patchwork.api import event as api_event_views  # noqa
+    from patchwork.api import hashes as api_hash_views  # noqa
     from patchwork.api import index as api_index_views  # noqa
     from patchwork.api import patch as api_patch_views  # noqa
     from patchwork.api import person as api_person_views  # noqa
@@ -345,6 +346,14 @@ if settings.ENABLE_REST_API:
         ),
     ]
 
+    api_1_4_patterns = [
+        path(
+            'patches/hashes/',
+            api_hash_views.HashLookup.as_view(),
+            name='api-patch-hash-lookup',
+        ),
+    ]
+
     urlpatterns += [
         re_path(
             r'^api/(?:(?P<version>(1.0|1.1|1.2|1.3|1.4))/)?',
@@ -357,6 +366,7 @@ if settings.ENABLE_REST_API:
         re_path(
             r'^api/(?:(?P<version>(1.3|1.4))/)?', include(api_1_3_patterns)
         ),
+        re_path(r'^api/(?:(?P<version>(1.4))/)?', include(api_1_4_patterns)),
         # token change
         path(
             'user/generate-token/',
@@ -5,9 +5,9 @@
 
 import json
 
+from django.conf import settings
 from django.contrib import messages
 from django.shortcuts import get_object_or_404
-from django.db.models import Prefetch
 
 from patchwork.filters import Filters
 from patchwork.forms import CreateBundleForm
@@ -15,9 +15,11 @@ from patchwork.forms import MultiplePatchForm
 from patchwork.models import Bundle
 from patchwork.models import BundlePatch
 from patchwork.models import Patch
+from patchwork.models import PatchCount
 from patchwork.models import Project
-from patchwork.models import Check
+from patchwork.paginator import KeysetPaginator
 from patchwork.paginator import Paginator
+from patchwork.paginator import get_count
 
 
 bundle_actions = ['create', 'add', 'remove']
@@ -91,21 +93,31 @@ class Order(object):
             return 'up'
         return 'down'
 
-    def apply(self, qs):
-        q = self.order_map[self.order]
-        if self.reversed:
-            q = '-' + q
-
-        orders = [q]
+    def columns(self):
+        """Get the fields to order by, and whether each is reversed."""
+        columns = [(self.order_map[self.order], self.reversed)]
 
         # if we're using a non-default order, add the default as a secondary
         # ordering. We reverse the default if the primary is reversed.
         (default_name, default_reverse) = self.default_order
         if self.order != default_name:
-            q = self.order_map[default_name]
-            if self.reversed ^ default_reverse:
-                q = '-' + q
-            orders.append(q)
+            columns.append(
+                (
+                    self.order_map[default_name],
+                    self.reversed ^ default_reverse,
+                )
+            )
+
+        # finally, order by ID, so the order is the same across pages
+        columns.append(('id', self.reversed))
+
+        return columns
+
+    def apply(self, qs):
+        orders = [
+            '-' + column if reverse else column
+            for column, reverse in self.columns()
+        ]
 
         return qs.order_by(*orders)
 
@@ -280,13 +292,30 @@ def generic_list(
         else:
             context['filters'].set_status(filterclass, setting)
 
+    count = None
     if patches is None:
         patches = Patch.objects.filter(project=project)
 
-    # annotate with tag counts
-    patches = patches.with_tag_counts(project)
+        # the patches of a project are counted as they change, so we needn't
+        # count them unless they're filtered on fields that aren't counted
+        count = PatchCount.total(project=project, **context['filters'].kwargs)
 
     patches = context['filters'].apply(patches)
+
+    # otherwise, counting the patches of a large project is costly, so we
+    # only count them if there aren't too many
+    if count is None:
+        if editable_order:
+            count = get_count(patches)
+        else:
+            count = get_count(patches, settings.LIST_COUNT_LIMIT)
+
+    # the tag counts need the project's use_tags field loaded for
+    # Project.tags(). Using prefetch_related means we'll share the one
+    # instance of Project, and share the project.tags cache between all
+    # patch.project references.
+    patches = patches.prefetch_related('project')
+
     if not editable_order:
         patches = order.apply(patches)
 
@@ -309,19 +338,18 @@ def generic_list(
         'name',
         'date',
         'msgid',
+        'tag_counts',
+        # the counts of checks are stored with the patch, so we needn't fetch
+        # the checks themselves
+        *Patch.CHECK_COUNT_FIELDS,
     )
 
-    # we also need checks and series
-    patches = patches.prefetch_related(
-        Prefetch(
-            'check_set',
-            queryset=Check.objects.only(
-                'context', 'user_id', 'patch_id', 'state', 'date'
-            ),
-        )
-    )
-
-    paginator = Paginator(request, patches)
+    # if there are too many patches to count, we can't number the pages, so
+    # we instead seek to the patches following those shown
+    if count is None:
+        paginator = KeysetPaginator(request, patches, order.columns())
+    else:
+        paginator = Paginator(request, patches, count)
 
     context.update(
         {
@@ -4,7 +4,6 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 from django.http import Http404
-from django.http import HttpResponse
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
@@ -13,7 +12,8 @@ from django.urls import reverse
 from patchwork.models import Cover
 from patchwork.models import Patch
 from patchwork.models import Project
-from patchwork.views.utils import cover_to_mbox
+from patchwork.views.utils import Mbox
+from patchwork.views.utils import mbox_response
 
 
 def cover_detail(request, project_id, msgid):
@@ -55,8 +55,7 @@ def cover_mbox(request, project_id, msgid):
     project = get_object_or_404(Project, linkname=project_id)
     cover = get_object_or_404(Cover, project_id=project.id, msgid=db_msgid)
 
-    response = HttpResponse(content_type='text/plain')
-    response.write(cover_to_mbox(cover))
+    response = mbox_response(request, Mbox(Cover, [cover.id], [cover]))
     response['Content-Disposition'] = 'attachment; filename=%s.mbox' % (
         cover.filename
     )
@@ -19,7 +19,8 @@ from patchwork.models import Patch
 from patchwork.models import Project
 from patchwork.views import generic_list
 from patchwork.views import set_bundle
-from patchwork.views.utils import patch_to_mbox
+from patchwork.views.utils import Mbox
+from patchwork.views.utils import mbox_response
 from patchwork.views.utils import series_patch_to_mbox
 
 
@@ -150,11 +151,14 @@ def patch_mbox(request, project_id, msgid):
     patch = get_object_or_404(Patch, project_id=project.id, msgid=db_msgid)
     series_id = request.GET.get('series')
 
-    response = HttpResponse(content_type='text/plain; charset=utf-8')
     if series_id:
-        response.write(series_patch_to_mbox(patch, series_id))
+        mbox = series_patch_to_mbox(patch, series_id)
     else:
-        response.write(patch_to_mbox(patch))
+        mbox = Mbox(Patch, [patch.id], [patch])
+
+    response = mbox_response(
+        request, mbox, content_type='text/plain; charset=utf-8'
+    )
     response['Content-Disposition'] = 'attachment; filename=%s.patch' % (
         patch.filename
     )
@@ -10,6 +10,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.sites.models import Site
 from django.conf import settings
 from django.core.mail import send_mail
+from django.db.models import Sum
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
@@ -22,6 +23,7 @@ from patchwork.forms import RegistrationForm
 from patchwork.forms import UserProfileForm
 from patchwork.models import EmailConfirmation
 from patchwork.models import EmailOptout
+from patchwork.models import PatchCount
 from patchwork.models import Person
 from patchwork.models import Project
 from patchwork.models import State
@@ -209,12 +211,23 @@ def unlink(request, person_id):
 def todo_lists(request):
     todo_lists = []
 
+    counts = dict(
+        PatchCount.objects.filter(
+            archived=False,
+            delegate=request.user,
+            state__action_required=True,
+        )
+        .values_list('project')
+        .annotate(Sum('count'))
+        .order_by()
+    )
+
     for project in Project.objects.all():
-        patches = request.user.profile.todo_patches(project=project)
-        if not patches.count():
+        n_patches = counts.get(project.id)
+        if not n_patches:
             continue
 
-        todo_lists.append({'project': project, 'n_patches': patches.count()})
+        todo_lists.append({'project': project, 'n_patches': n_patches})
 
     if len(todo_lists) == 1:
         return HttpResponseRedirect(
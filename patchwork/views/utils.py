@@ -11,11 +11,22 @@ from email.header import Header
 from email.mime.nonmultipart import MIMENonMultipart
 from email.parser import HeaderParser
 import email.utils
+import hashlib
+import itertools
 import re
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.db.models import prefetch_related_objects
 from django.http import Http404
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 
+from patchwork.mbox import MBOX_CACHE_VERSION
+from patchwork.mbox import get_mbox_key
+from patchwork.mbox import get_mbox_versions
 from patchwork.models import CoverComment
 from patchwork.models import Patch
 from patchwork.models import PatchComment
@@ -24,6 +35,11 @@ from patchwork.parser import split_from_header
 if settings.ENABLE_REST_API:
     from rest_framework.authtoken.models import Token
 
+# the number of patches converted at once when converting many patches
+MBOX_BATCH_SIZE = 100
+
+_postscript_re = re.compile('^-{2,3} ?$', re.MULTILINE)
+
 
 class PatchMbox(MIMENonMultipart):
     patch_charset = 'utf-8'
@@ -36,26 +52,20 @@ class PatchMbox(MIMENonMultipart):
         encode_7or8bit(self)
 
 
-def _submission_to_mbox(submission):
-    """Get an mbox representation of a single submission.
-
-    Handles both Patch and Cover objects.
-
-    Arguments:
-        submission: The Patch or Cover object to convert.
+def _render_mbox(submission):
+    """Get an mbox representation of a submission, with its related objects.
 
-    Returns:
-        A string for the mbox file.
+    This expects the related objects used to be fetched already, as done by
+    ``submissions_to_mbox``.
     """
     is_patch = isinstance(submission, Patch)
 
-    postscript_re = re.compile('^-{2,3} ?$', re.MULTILINE)
     body = ''
 
     if submission.content:
         body = submission.content.strip() + '\n'
 
-    parts = postscript_re.split(body, 1)
+    parts = _postscript_re.split(body, 1)
     if len(parts) == 2:
         (body, postscript) = parts
         body = body.strip() + '\n'
@@ -64,12 +74,8 @@ def _submission_to_mbox(submission):
         postscript = ''
 
     # TODO(stephenfin): Make this use the tags infrastructure
-    if is_patch:
-        for comment in PatchComment.objects.filter(patch=submission):
-            body += comment.patch_responses
-    else:
-        for comment in CoverComment.objects.filter(cover=submission):
-            body += comment.patch_responses
+    for comment in submission.comments.all():
+        body += comment.patch_responses
 
     if postscript:
         body += '---' + postscript + '\n'
@@ -126,10 +132,219 @@ def _submission_to_mbox(submission):
     return mail
 
 
+def submissions_to_mbox(submissions):
+    """Get mbox representations of several submissions.
+
+    The submitters, projects, delegates and comments of the submissions are
+    fetched using a fixed number of queries, however many submissions there
+    are.
+
+    Arguments:
+        submissions: A list of Patch or Cover objects to convert, which must
+            all be of the same type.
+
+    Returns:
+        A list of strings for the mbox file, one for each submission.
+    """
+    if not submissions:
+        return []
+
+    if isinstance(submissions[0], Patch):
+        lookups = [
+            'delegate',
+            Prefetch(
+                'comments',
+                queryset=PatchComment.objects.only('patch', 'content'),
+            ),
+        ]
+    else:
+        lookups = [
+            Prefetch(
+                'comments',
+                queryset=CoverComment.objects.only('cover', 'content'),
+            ),
+        ]
+
+    prefetch_related_objects(submissions, 'submitter', 'project', *lookups)
+
+    return [_render_mbox(submission) for submission in submissions]
+
+
+def _submission_to_mbox(submission):
+    """Get an mbox representation of a single submission.
+
+    Handles both Patch and Cover objects.
+
+    Arguments:
+        submission: The Patch or Cover object to convert.
+
+    Returns:
+        A string for the mbox file.
+    """
+    return submissions_to_mbox([submission])[0]
+
+
 patch_to_mbox = _submission_to_mbox
 cover_to_mbox = _submission_to_mbox
 
 
+def patches_to_mbox(patches):
+    """Get mbox representations of many patches, a batch at a time.
+
+    Arguments:
+        patches: An iterable of the Patch objects to convert, such as the
+            iterator of a queryset.
+
+    Returns:
+        A generator of strings for the mbox file, one for each patch.
+    """
+    patches = iter(patches)
+    while True:
+        batch = list(itertools.islice(patches, MBOX_BATCH_SIZE))
+        if not batch:
+            return
+
+        yield from submissions_to_mbox(batch)
+
+
+class Mbox(object):
+    """The mbox of one or more submissions, converted as it is read.
+
+    If ``MBOX_CACHE_TIMEOUT`` is set, the mbox of each submission is cached,
+    keyed by its ID and a version which changes whenever the submission, its
+    comments, or the people and project included in its mbox change. The
+    versions also give an ETag for the whole mbox.
+
+    Arguments:
+        model: The Patch or Cover model.
+        ids: The IDs of the submissions, in order.
+        submissions: Any of the submissions fetched already, which are
+            converted rather than fetching them again.
+    """
+
+    def __init__(self, model, ids, submissions=()):
+        self.model = model
+        self.ids = list(ids)
+        self.submissions = {
+            submission.id: submission for submission in submissions
+        }
+        self.versions = None
+        if settings.MBOX_CACHE_TIMEOUT:
+            self.versions = get_mbox_versions(model, self.ids)
+
+    @property
+    def etag(self):
+        if self.versions is None:
+            return None
+
+        key = '%d %s %s' % (
+            MBOX_CACHE_VERSION,
+            self.model._meta.model_name,
+            ' '.join(
+                '%d:%s' % (submission_id, self.versions[submission_id])
+                for submission_id in self.ids
+            ),
+        )
+        return quote_etag(hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _get_mboxes(self, ids):
+        keys = {}
+        mboxes = {}
+        if self.versions is not None:
+            keys = {
+                submission_id: get_mbox_key(
+                    self.model, submission_id, self.versions[submission_id]
+                )
+                for submission_id in ids
+            }
+            cached = cache.get_many(keys.values())
+            mboxes = {
+                submission_id: cached[key]
+                for submission_id, key in keys.items()
+                if key in cached
+            }
+
+        missing = [
+            submission_id
+            for submission_id in ids
+            if submission_id not in mboxes
+        ]
+        if missing:
+            submissions = [
+                self.submissions[submission_id]
+                for submission_id in missing
+                if submission_id in self.submissions
+            ]
+            fetch = [
+                submission_id
+                for submission_id in missing
+                if submission_id not in self.submissions
+            ]
+            if fetch:
+                submissions += self.model.objects.filter(id__in=fetch)
+            converted = dict(
+                zip(
+                    [submission.id for submission in submissions],
+                    submissions_to_mbox(submissions),
+                )
+            )
+            if keys:
+                cache.set_many(
+                    {
+                        keys[submission_id]: mbox
+                        for submission_id, mbox in converted.items()
+                    },
+                    settings.MBOX_CACHE_TIMEOUT,
+                )
+            mboxes.update(converted)
+
+        # submissions deleted in the meantime are skipped
+        return [
+            mboxes[submission_id]
+            for submission_id in ids
+            if submission_id in mboxes
+        ]
+
+    def __iter__(self):
+        first = True
+        for start in range(0, len(self.ids), MBOX_BATCH_SIZE):
+            batch = self.ids[start : start + MBOX_BATCH_SIZE]
+            for mbox in self._get_mboxes(batch):
+                if not first:
+                    yield '\n'
+                first = False
+                yield mbox
+
+
+def mbox_response(request, mbox, content_type='text/plain'):
+    """Get a response streaming an mbox.
+
+    If the mbox has an ETag and the client has the same mbox already, as
+    given by the ``If-None-Match`` header, a 304 response is returned instead.
+
+    Arguments:
+        request: The request for the mbox.
+        mbox: The Mbox to send.
+        content_type: The content type of the response.
+
+    Returns:
+        The response.
+    """
+    etag = mbox.etag
+
+    response = None
+    if etag:
+        response = get_conditional_response(request, etag=etag)
+
+    if response is None:
+        response = StreamingHttpResponse(mbox, content_type=content_type)
+
+    if etag:
+        response['ETag'] = etag
+
+    return response
+
+
 def bundle_to_mbox(bundle):
     """Get an mbox representation of a bundle.
 
@@ -137,9 +352,9 @@ def bundle_to_mbox(bundle):
         patch: The Bundle object to convert.
 
     Returns:
-        A string for the mbox file.
+        An Mbox for the mbox file.
     """
-    return '\n'.join([patch_to_mbox(p) for p in bundle.ordered_patches()])
+    return Mbox(Patch, bundle.ordered_patches().values_list('id', flat=True))
 
 
 def series_patch_to_mbox(patch, series_id):
@@ -151,7 +366,7 @@ def series_patch_to_mbox(patch, series_id):
             '*' if using the latest series.
 
     Returns:
-        A string for the mbox file.
+        An Mbox for the mbox file.
     """
     if series_id == '*':
         if not patch.series:
@@ -172,17 +387,12 @@ def series_patch_to_mbox(patch, series_id):
         if patch.series.id != series_id:
             raise Http404('Patch does not belong to series %d' % series_id)
 
-    mbox = []
-
     # get the series-ified patch
-    for dep in patch.series.patches.filter(number__lt=patch.number).order_by(
+    deps = patch.series.patches.filter(number__lt=patch.number).order_by(
         'number'
-    ):
-        mbox.append(patch_to_mbox(dep))
-
-    mbox.append(patch_to_mbox(patch))
+    )
 
-    return '\n'.join(mbox)
+    return Mbox(Patch, [*deps.values_list('id', flat=True), patch.id], [patch])
 
 
 def series_to_mbox(series):
@@ -192,14 +402,11 @@ def series_to_mbox(series):
         series: The Series object to convert.
 
     Returns:
-        A string for the mbox file.
+        An Mbox for the mbox file.
     """
-    mbox = []
-
-    for patch in series.patches.all().order_by('number'):
-        mbox.append(patch_to_mbox(patch))
-
-    return '\n'.join(mbox)
+    return Mbox(
+        Patch, series.patches.order_by('number').values_list('id', flat=True)
+    )
 
 
 def regenerate_token(user):
@@ -18,6 +18,7 @@ from xmlrpc.server import SimpleXMLRPCDispatcher
 
 from patchwork.models import Check
 from patchwork.models import Patch
+from patchwork.models import PatchFile
 from patchwork.models import Person
 from patchwork.models import Project
 from patchwork.models import State
@@ -484,8 +485,14 @@ def patch_list(filt=None):
 
      * max_count
 
-    With the exception of ``max_count``, the specified field of the
-    patches are compared to the search string using a provided
+    Patches can also be filtered by the files they change using a ``path``
+    filter, which is either a glob, such as ``drivers/net/*.c``, or the
+    start of the paths of the files, such as ``drivers/net/``.
+
+     * path
+
+    With the exception of ``max_count`` and ``path``, the specified field
+    of the patches are compared to the search string using a provided
     field lookup type, which can be one of:
 
      * iexact
@@ -545,6 +552,7 @@ def patch_list(filt=None):
         'hash',
         'msgid',
         'max_count',
+        'path',
     ]
 
     dfilter = {}
@@ -570,6 +578,10 @@ def patch_list(filt=None):
                 dfilter['state'] = State.objects.get(id=filt[key])
             elif parts[0] == 'max_count':
                 max_count = filt[key]
+            elif parts[0] == 'path':
+                dfilter['pk__in'] = PatchFile.match(filt[key]).values(
+                    'patch_id'
+                )
             else:
                 dfilter[key] = filt[key]
         except (Project.DoesNotExist, Person.DoesNotExist, State.DoesNotExist):
@@ -729,6 +741,7 @@ def patch_set(user, patch_id, params):
     if not patch.is_editable(user):
         raise Exception('No permissions to edit this patch')
 
+    fields = []
     for k, v in params.items():
         if k not in ok_params:
             continue
@@ -739,7 +752,9 @@ def patch_set(user, patch_id, params):
         else:
             setattr(patch, k, v)
 
-    patch.save()
+        fields.append(k)
+
+    patch.save(update_fields=fields)
 
     return True
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+#
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Compare the delegation rule matcher against a naive fnmatch loop.
+
+Run from the top-level directory:
+
+    python tools/benchmark-delegation-rules.py [--rules N] [--files N]
+"""
+
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import timeit
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'patchwork.settings.dev')
+
+import django  # noqa: E402
+
+django.setup()
+
+from patchwork.parser import DelegationMatcher  # noqa: E402
+
+DIRS = ['arch', 'drivers', 'fs', 'include', 'kernel', 'lib', 'mm', 'net']
+EXTS = ['c', 'h', 'S', 'rst', 'txt', 'yaml']
+
+
+def make_paths(count, rng):
+    paths = set()
+    while len(paths) < count:
+        depth = rng.randint(1, 4)
+        parts = [rng.choice(DIRS)]
+        parts += ['d%d' % rng.randint(0, 30) for _ in range(depth - 1)]
+        parts.append('f%d.%s' % (rng.randint(0, 200), rng.choice(EXTS)))
+        paths.add('/'.join(parts))
+    return sorted(paths)
+
+
+def make_rules(count, paths, rng):
+    patterns = set()
+    while len(patterns) < count:
+        path = rng.choice(paths)
+        kind = rng.randint(0, 3)
+        if kind == 0:  # exact file
+            pattern = path
+        elif kind == 1:  # directory
+            pattern = path.rsplit('/', 1)[0] + '/*'
+        elif kind == 2:  # file type in a directory
+            pattern = '%s/*.%s' % (path.split('/')[0], path.rsplit('.')[-1])
+        else:  # file name anywhere
+            pattern = '*/%s' % path.rsplit('/', 1)[-1]
+        patterns.add(pattern)
+
+    rules = [
+        types.SimpleNamespace(
+            path=pattern, user='user%d' % (i % 50), priority=rng.randint(0, 9)
+        )
+        for i, pattern in enumerate(sorted(patterns))
+    ]
+    rules.sort(key=lambda rule: (-rule.priority, rule.path))
+    return rules
+
+
+def match_loop(rules, filenames):
+    delegates = []
+    for filename in filenames:
+        delegate = None
+        for rule in rules:
+            if fnmatch.fnmatch(filename, rule.path):
+                delegate = rule.user
+                break
+        delegates.append(delegate)
+    return delegates
+
+
+def match_compiled(matcher, filenames):
+    return [matcher.match(filename) for filename in filenames]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rules', type=int, default=500)
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    paths = make_paths(args.files * 2, rng)
+    rules = make_rules(args.rules, paths, rng)
+    filenames = rng.sample(paths, args.files)
+
+    matcher = DelegationMatcher(rules)
+    if match_loop(rules, filenames) != match_compiled(matcher, filenames):
+        sys.exit('error: results differ')
+
+    def best(func):
+        return min(timeit.repeat(func, number=1, repeat=args.repeat))
+
+    loop = best(lambda: match_loop(rules, filenames))
+    build = best(lambda: DelegationMatcher(rules))
+    compiled = best(lambda: match_compiled(matcher, filenames))
+
+    print('%d rules, %d files' % (len(rules), len(filenames)))
+    print('fnmatch loop:     %8.2f ms' % (loop * 1000))
+    print('matcher (build):  %8.2f ms' % (build * 1000))
+    print('matcher (match):  %8.2f ms' % (compiled * 1000))
+    print('speedup:          %8.1fx' % (loop / compiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Compare the diff hasher against the original line splitting version.
+
+Run from the top-level directory:
+
+    python tools/benchmark-hasher.py [--files N] [--lines N]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from patchwork.hasher import git_patch_id  # noqa: E402
+from patchwork.hasher import hash_diff  # noqa: E402
+
+HUNK_RE = re.compile(r'^\@\@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? \@\@')
+FILENAME_RE = re.compile(r'^(---|\+\+\+) (\S+)')
+
+WORDS = ['int', 'return', 'if', 'else', 'foo', 'bar', '(void)', '{', '}', ';']
+
+
+def make_diff(files, lines, rng):
+    diff = []
+    for i in range(files):
+        diff += [
+            'diff --git a/dir/file%d.c b/dir/file%d.c' % (i, i),
+            'index 3d75d48..a57f4dd 100644',
+            '--- a/dir/file%d.c' % i,
+            '+++ b/dir/file%d.c' % i,
+        ]
+        for j in range(0, lines, 10):
+            removed = rng.randint(0, 3)
+            added = rng.randint(0, 3)
+            diff.append(
+                '@@ -%d,%d +%d,%d @@ static int func%d(void)'
+                % (j + 1, 6 + removed, j + 1, 6 + added, j)
+            )
+            body = [' '] * 3 + ['-'] * removed + ['+'] * added + [' '] * 3
+            for prefix in body:
+                words = rng.choices(WORDS, k=rng.randint(0, 8))
+                diff.append(prefix + '\t' + ' '.join(words))
+    return '\n'.join(diff) + '\n'
+
+
+def hash_diff_split(diff):
+    diff = diff.replace('\r', '')
+    diff = diff.strip() + '\n'
+
+    hashed = hashlib.sha1()
+
+    for line in diff.split('\n'):
+        if len(line) <= 0:
+            continue
+
+        hunk_match = HUNK_RE.match(line)
+        filename_match = FILENAME_RE.match(line)
+
+        if filename_match:
+            if filename_match.group(1) == '---':
+                filename = 'a/'
+            else:
+                filename = 'b/'
+            filename += '/'.join(filename_match.group(2).split('/')[1:])
+
+            line = filename_match.group(1) + ' ' + filename
+        elif hunk_match:
+            line_nos = [int(x) if x else 1 for x in hunk_match.groups()]
+            line = '@@ -%d +%d @@' % tuple(line_nos)
+        elif line[0] not in ['-', '+', ' ']:
+            continue
+
+        hashed.update((line + '\n').encode('utf-8'))
+
+    return hashed.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--lines', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    diff = make_diff(args.files, args.lines, rng)
+
+    if hash_diff_split(diff) != hash_diff(diff):
+        sys.exit('error: hashes differ')
+
+    def best(func):
+        return min(timeit.repeat(func, number=1, repeat=args.repeat))
+
+    split = best(lambda: hash_diff_split(diff))
+    streamed = best(lambda: hash_diff(diff))
+    patch_id = best(lambda: git_patch_id(diff))
+
+    print('%d files, %d lines' % (args.files, diff.count('\n')))
+    print('split hasher:     %8.2f ms' % (split * 1000))
+    print('stream hasher:    %8.2f ms' % (streamed * 1000))
+    print('git patch ID:     %8.2f ms' % (patch_id * 1000))
+    print('speedup:          %8.1fx' % (split / streamed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+#
+# Patchwork - automated patch tracking system
+# Copyright (C) 2026 Patchwork contributors
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+
+"""Compare the diff highlighter against the original substitution version.
+
+The largest diffs of the test data are highlighted, as is a large diff made
+by joining all of them. Run from the top-level directory:
+
+    python tools/benchmark-patchsyntax.py [--count N] [--scale N]
+"""
+
+import argparse
+import glob
+import mailbox
+import os
+import re
+import sys
+import timeit
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'patchwork.settings.dev')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.utils.html import escape  # noqa: E402
+
+from patchwork.parser import find_patch_content  # noqa: E402
+from patchwork.parser import parse_patch  # noqa: E402
+from patchwork.templatetags.syntax import highlight_patch  # noqa: E402
+from patchwork.templatetags.syntax import patchsyntax  # noqa: E402
+
+DATA_DIR = os.path.join(
+    os.path.dirname(__file__), '..', 'patchwork', 'tests', 'data'
+)
+
+PATCH_SPAN_RES = [
+    (re.compile(regex, re.M | re.I), cls)
+    for regex, cls in [
+        (r'^(Index:?|diff|\-\-\-|\+\+\+|\*\*\*) .*$', 'p_header'),
+        (r'^\+.*$', 'p_add'),
+        (r'^-.*$', 'p_del'),
+        (r'^!.*$', 'p_mod'),
+    ]
+]
+
+PATCH_CHUNK_RE = re.compile(
+    r'^(@@ \-\d+(?:,\d+)? \+\d+(?:,\d+)? @@)(.*)$', re.M | re.I
+)
+
+SPAN = '<span class="%s">%s</span>'
+
+
+def highlight_patch_regex(diff):
+    diff = escape(diff).replace('\r\n', '\n')
+
+    for regex, cls in PATCH_SPAN_RES:
+        diff = regex.sub(lambda x: SPAN % (cls, x.group(0)), diff)
+
+    diff = PATCH_CHUNK_RE.sub(
+        lambda x: ' '.join(
+            [
+                SPAN % ('p_chunk', x.group(1)),
+                SPAN % ('p_context', x.group(2)),
+            ],
+        ),
+        diff,
+    )
+
+    return diff
+
+
+def load_diffs():
+    diffs = []
+
+    for path in glob.glob(os.path.join(DATA_DIR, '*', '*.mbox')):
+        for mail in mailbox.mbox(path, create=False):
+            try:
+                diff, _ = find_patch_content(mail)
+            except Exception:  # the fuzz data includes broken mails
+                continue
+            if diff:
+                diffs.append(diff)
+
+    for path in glob.glob(os.path.join(DATA_DIR, 'patches', '*.patch')):
+        with open(path, encoding='utf-8') as f:
+            diff, _ = parse_patch(f.read())
+        if diff:
+            diffs.append(diff)
+
+    return sorted(set(diffs), key=len, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=5)
+    parser.add_argument('--scale', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    diffs = load_diffs()
+    for diff in diffs:
+        if highlight_patch_regex(diff) != highlight_patch(diff):
+            sys.exit('error: markup differs')
+
+    def best(func):
+        return min(timeit.repeat(func, number=1, repeat=args.repeat))
+
+    print('%d diffs, identical markup' % len(diffs))
+    print('%10s %10s %10s %10s' % ('bytes', 'regex', 'lines', 'speedup'))
+
+    joined = ''.join(diffs[: args.count]) * args.scale
+    for diff in diffs[: args.count] + [joined]:
+        regex = best(lambda: highlight_patch_regex(diff))
+        lines = best(lambda: highlight_patch(diff))
+        print(
+            '%10d %7.2f ms %7.2f ms %9.1fx'
+            % (len(diff), regex * 1000, lines * 1000, regex / lines)
+        )
+
+    cache.clear()
+    patch = types.SimpleNamespace(diff=joined)
+    patchsyntax(patch)
+    cached = best(lambda: patchsyntax(patch))
+    print('cached (%d bytes): %.2f ms' % (len(joined), cached * 1000))
+
+
+if __name__ == '__main__':
+    main()